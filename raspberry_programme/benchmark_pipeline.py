@@ -0,0 +1,211 @@
+"""
+Offline micro-benchmarks for the per-reading decision path.
+
+Every benchmark runs against a local Open-Meteo stand-in (no Internet) and,
+unless --model is given, a small RandomForest generated on the fly with the
+same 25 one-hot features as the real model. Results are written as JSON and
+can be compared against a stored baseline, so a change that slows down the
+per-reading path is caught on the bench instead of in the field.
+
+Usage:
+  python3 benchmark_pipeline.py --save-baseline benchmark_baseline.json
+  python3 benchmark_pipeline.py --baseline benchmark_baseline.json --output results.json
+  python3 benchmark_pipeline.py --model "model_AI/crop_water_requirement_model (1).pkl"
+
+Exit status is 1 when a benchmark is slower than its baseline by more than
+--tolerance (0.25 = 25% by default).
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from open_meteo_standin import OpenMeteoStandIn
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_PATH = os.path.join(SCRIPT_DIR, "model_AI", "import requests.py")
+
+GOVERNORATE = "ZAGHOUAN"
+CROP_TYPE = "TOMATO"
+
+
+def load_module(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generate_model(module, path: str, n_estimators: int = 20) -> str:
+    """Fit a small RandomForest over every input combination and save it to path."""
+    import itertools
+
+    import joblib
+    import numpy as np
+    from sklearn.ensemble import RandomForestRegressor
+
+    rows = list(itertools.product(
+        module.CROP_TYPES, module.SOIL_TYPES, module.REGIONS,
+        module.TEMPERATURE_BUCKETS, module.WEATHER_CONDITIONS,
+    ))
+    X = module.encode_features(rows)
+    rng = np.random.default_rng(0)
+    # Any deterministic target will do; only the evaluation cost matters here
+    y = X @ rng.uniform(0.5, 5.0, X.shape[1]) + rng.normal(0, 0.1, len(X))
+    model = RandomForestRegressor(n_estimators=n_estimators, min_samples_leaf=4, random_state=0)
+    model.fit(X, y)
+    joblib.dump(model, path)
+    return path
+
+
+def measure(func, repeat: int, min_time: float) -> dict:
+    """
+    Time func() like timeit.autorange: pick a loop count that takes at least
+    min_time, then repeat. Returns per-call microseconds.
+    """
+    func()  # warm-up (imports, caches, first connection)
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    return {
+        "best_us": round(min(samples), 3),
+        "median_us": round(statistics.median(samples), 3),
+        "loops": number,
+        "repeat": repeat,
+    }
+
+
+def build_benchmarks(server, irrigation, model_path: str) -> dict:
+    """Name -> zero-argument callable for every benchmark."""
+    farm = irrigation.TunisiaIrrigationSystem(GOVERNORATE, CROP_TYPE)  # weather fetched per call
+
+    cache = irrigation.enable_weather_cache(ttl_seconds=3600)
+    cached_farm = irrigation.get_farm(GOVERNORATE, CROP_TYPE)
+    cached_farm.generate_model_input(25.0, 45.0)  # registers the governorate
+    cache.refresh(cached_farm.governorate)
+
+    rows = [(CROP_TYPE, "DRY", "SEMI ARID", "20-30", "SUNNY")] * 32
+
+    return {
+        "calculate_pump_value": lambda: server.calculate_pump_value(150),
+        "classify_temperature": lambda: farm.classify_temperature(25.3),
+        "classify_soil_type_recommended": lambda: farm.classify_soil_type_recommended(35.0),
+        "generate_model_input[cached_weather]": lambda: cached_farm.generate_model_input(25.3, 35.0),
+        "generate_model_input[http_weather]": lambda: farm.generate_model_input(25.3, 35.0),
+        "predict_water_requirement": lambda: irrigation.predict_water_requirement(
+            model_path, CROP_TYPE, "DRY", "SEMI ARID", "20-30", "SUNNY"),
+        "predict_water_requirement_batch[32]": lambda: irrigation.predict_water_requirement_batch(model_path, rows),
+        "get_prediction_from_sensors": lambda: irrigation.get_prediction_from_sensors(
+            model_path, GOVERNORATE, CROP_TYPE, 25.0, 15.0),
+        # Same call, run with enable_prediction_table() active
+        "get_prediction_from_sensors[table]": lambda: irrigation.get_prediction_from_sensors(
+            model_path, GOVERNORATE, CROP_TYPE, 25.0, 15.0),
+    }
+
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp, OpenMeteoStandIn() as standin:
+        os.environ["OPEN_METEO_URL"] = standin.url
+        irrigation = load_module("irrigation_module", MODULE_PATH)
+        irrigation.OPEN_METEO_URL = standin.url
+
+        server = load_module("raspberry", os.path.join(SCRIPT_DIR, "raspberry.py"))
+
+        model_path = args.model or generate_model(irrigation, os.path.join(tmp, "model.pkl"))
+        benchmarks = build_benchmarks(server, irrigation, model_path)
+
+        results = {}
+        for name, func in benchmarks.items():
+            if args.filter and args.filter not in name:
+                continue
+            if name.endswith("[table]"):
+                irrigation.enable_prediction_table(model_path)
+            try:
+                results[name] = measure(func, args.repeat, args.min_time)
+            finally:
+                if name.endswith("[table]"):
+                    irrigation.disable_prediction_table()
+            print(f"{name:40s} {results[name]['best_us']:12.2f} us  (median {results[name]['median_us']:.2f})",
+                  file=sys.stderr)
+
+        weather_cache = irrigation.get_weather_cache()
+        if weather_cache is not None:
+            weather_cache.stop()
+
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "model": "generated" if args.model is None else os.path.basename(args.model),
+        "benchmarks": results,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Names of benchmarks whose best time regressed beyond the tolerance."""
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        reference = baseline.get("benchmarks", {}).get(name)
+        if reference is None:
+            print(f"{name:40s} no baseline", file=sys.stderr)
+            continue
+        ratio = current["best_us"] / reference["best_us"] if reference["best_us"] else 1.0
+        status = "REGRESSION" if ratio > 1.0 + tolerance else "ok"
+        print(f"{name:40s} {ratio:6.2f}x baseline  {status}", file=sys.stderr)
+        if status != "ok":
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline micro-benchmarks for the irrigation decision path.")
+    parser.add_argument("--model", default=None, help="Benchmark this model (.pkl, or .npz from export_model.py) instead of a generated one")
+    parser.add_argument("--output", default=None, help="Write the results JSON here")
+    parser.add_argument("--baseline", default=None, help="Compare against this results JSON")
+    parser.add_argument("--save-baseline", default=None, help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed slowdown vs. the baseline before failing (0.25 = 25%%)")
+    parser.add_argument("--repeat", type=int, default=5, help="Timing repeats per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Minimum seconds per repeat")
+    parser.add_argument("--filter", default=None, help="Only run benchmarks whose name contains this")
+    args = parser.parse_args()
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                f.write(text + "\n")
+    if not args.output and not args.save_baseline:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,17 +2,27 @@
 BLE scanner to verify the Windows advertisement from raspberry.py.
 
 It looks for devices whose local name starts with 'PiIrr-' and/or that
-carry Manufacturer Data with company ID 0xFFFF. It decodes the custom
-payload we broadcast:
+carry Manufacturer Data with company ID 0x1234 (what raspberry.py
+advertises) or 0xFFFF. It decodes both payloads we broadcast.
 
-struct '<HIB' (little-endian):
+Single zone, struct '<HIB' (little-endian, 7 bytes):
 - humidity: uint16 (0..65535)
 - pump_time_ms: uint32
 - pump_state: uint8 (0=OFF, 1=ON)
 
+Several zones, a 5-byte header followed by 7-byte zone records:
+- header: sequence uint8, zone_count uint16, index of the first record uint16
+- record: zone uint16, humidity uint16, pump_time_ms uint24 (ON when > 0)
+
+The Pi rotates through the zones when they don't all fit in one
+advertisement; the scanner reassembles the full zone table per device from
+the frames it sees and prints it whenever it is complete and changed.
+
 Run with the same virtual environment:
-  .venv\Scripts\python.exe ble_scan_verify.py
+  .venv\\Scripts\\python.exe ble_scan_verify.py
+  .venv\\Scripts\\python.exe ble_scan_verify.py --seconds 30
 """
+import argparse
 import asyncio
 import struct
 from typing import Optional
@@ -20,7 +30,11 @@ from typing import Optional
 from bleak import BleakScanner
 
 TARGET_NAME_PREFIX = "PiIrr-"
-MANUFACTURER_ID = 0xFFFF
+MANUFACTURER_IDS = (0x1234, 0xFFFF)
+
+LEGACY_PAYLOAD_SIZE = 7
+ZONE_HEADER = struct.Struct("<BHH")
+ZONE_RECORD_SIZE = 7
 
 
 def decode_payload(data: bytes) -> Optional[tuple[int, int, str]]:
@@ -32,47 +46,111 @@ def decode_payload(data: bytes) -> Optional[tuple[int, int, str]]:
         return None
 
 
+def decode_zone_frame(data: bytes) -> Optional[tuple[int, int, int, list[tuple[int, int, int]]]]:
+    """Decode a multi-zone frame -> (seq, zone_count, first_index, [(zone, humidity, pump_time_ms), ...])."""
+    if len(data) < ZONE_HEADER.size + ZONE_RECORD_SIZE or (len(data) - ZONE_HEADER.size) % ZONE_RECORD_SIZE:
+        return None
+    seq, zone_count, first = ZONE_HEADER.unpack_from(data)
+    records = []
+    for offset in range(ZONE_HEADER.size, len(data), ZONE_RECORD_SIZE):
+        zone, humidity = struct.unpack_from("<HH", data, offset)
+        pump_time_ms = int.from_bytes(data[offset + 4:offset + 7], "little")
+        records.append((zone, humidity, pump_time_ms))
+    return seq, zone_count, first, records
+
+
 def fmt_state(val: int) -> str:
     return "ON" if val == 1 else "OFF"
 
 
+class ZoneTable:
+    """Reassembles one device's zone table from rotating frames."""
+
+    def __init__(self):
+        self.zone_count = 0
+        self.rows = {}  # record index -> (zone, humidity, pump_time_ms)
+        self.last_seq = None
+        self.printed = None
+
+    def add(self, seq: int, zone_count: int, first: int, records: list) -> bool:
+        """Add a frame; True if it was new (sequence changed)."""
+        if seq == self.last_seq:
+            return False
+        self.last_seq = seq
+        if zone_count != self.zone_count:
+            # Zones were added or removed on the Pi: start over
+            self.zone_count = zone_count
+            self.rows = {}
+        for i, record in enumerate(records):
+            self.rows[first + i] = record
+        return True
+
+    def complete(self) -> bool:
+        return self.zone_count > 0 and all(i in self.rows for i in range(self.zone_count))
+
+    def table(self) -> list[tuple[int, int, int]]:
+        return [self.rows[i] for i in range(self.zone_count) if i in self.rows]
+
+
 async def scan_once(timeout: float = 10.0) -> None:
     print("Scanning for BLE advertisements...")
 
     seen = set()
+    last_payload = {}  # address -> last legacy payload printed
+    tables = {}        # address -> ZoneTable
 
     def callback(device, adv_data):
         name = adv_data.local_name or device.name or ""
         mfg = adv_data.manufacturer_data or {}
+        company_id = next((cid for cid in MANUFACTURER_IDS if cid in mfg), None)
 
         # Filter by name prefix or manufacturer id
-        if not (name.startswith(TARGET_NAME_PREFIX) or (MANUFACTURER_ID in mfg)):
+        if not (name.startswith(TARGET_NAME_PREFIX) or company_id is not None):
             return
 
-        key = (device.address, adv_data.local_name)
-        if key in seen:
+        payload = mfg.get(company_id) if company_id is not None else None
+        if device.address not in seen:
+            seen.add(device.address)
+            print("\nDevice:")
+            print(f"  Address : {device.address}")
+            print(f"  RSSI    : {adv_data.rssi}")
+            print(f"  Name    : {name}")
+            if not payload:
+                print("  No manufacturer payload with a known company ID found on this packet.")
+        if not payload:
             return
-        seen.add(key)
-
-        payload = mfg.get(MANUFACTURER_ID)
-        decoded = decode_payload(payload) if payload else None
 
-        print("\nDevice:")
-        print(f"  Address : {device.address}")
-        print(f"  RSSI    : {adv_data.rssi}")
-        print(f"  Name    : {name}")
-
-        if decoded:
-            humidity, pump_time_ms, pump_state = decoded
-            print("  Manufacturer ID 0xFFFF payload:")
+        if len(payload) == LEGACY_PAYLOAD_SIZE:
+            if last_payload.get(device.address) == payload:
+                return
+            last_payload[device.address] = payload
+            humidity, pump_time_ms, pump_state = decode_payload(payload)
+            print(f"  [{device.address}] Manufacturer ID 0x{company_id:04X} payload:")
             print(f"    humidity     : {humidity}")
             print(f"    pump_time_ms : {pump_time_ms}")
             print(f"    pump_state   : {fmt_state(pump_state)} ({pump_state})")
-        else:
-            if payload:
-                print(f"  Manufacturer ID 0xFFFF payload (raw hex): {payload.hex()}")
-            else:
-                print("  No manufacturer payload with 0xFFFF found on this packet.")
+            return
+
+        frame = decode_zone_frame(payload)
+        if frame is None:
+            if last_payload.get(device.address) != payload:
+                last_payload[device.address] = payload
+                print(f"  [{device.address}] Manufacturer ID 0x{company_id:04X} payload (raw hex): {payload.hex()}")
+            return
+
+        seq, zone_count, first, records = frame
+        table = tables.setdefault(device.address, ZoneTable())
+        if not table.add(seq, zone_count, first, records):
+            return
+        print(f"  [{device.address}] frame seq {seq}: records {first}..{first + len(records) - 1} "
+              f"of {zone_count} ({len(table.rows)}/{zone_count} known)")
+        rows = table.table()
+        if table.complete() and rows != table.printed:
+            table.printed = rows
+            print(f"  [{device.address}] zone table ({zone_count} zones):")
+            print("    zone   humidity  pump_time_ms  pump_state")
+            for zone, humidity, pump_time_ms in rows:
+                print(f"    {zone:<6} {humidity:<9} {pump_time_ms:<13} {fmt_state(1 if pump_time_ms > 0 else 0)}")
 
     scanner = BleakScanner(detection_callback=callback)
     async with scanner:
@@ -80,7 +158,12 @@ async def scan_once(timeout: float = 10.0) -> None:
 
     if not seen:
         print("\nNo matching advertisements seen. If you're advertising from the same laptop,\nWindows may not report its own advertisements to the scanner. Try scanning\nfrom your phone with nRF Connect or run this script on another device.")
+    for address, table in tables.items():
+        if not table.complete():
+            print(f"\n{address}: saw {len(table.rows)} of {table.zone_count} zones; scan longer to see the whole table.")
 
 
 if __name__ == "__main__":
-    asyncio.run(scan_once(12.0))
+    parser = argparse.ArgumentParser(description="Scan for and decode raspberry.py BLE advertisements.")
+    parser.add_argument("--seconds", type=float, default=12.0, help="How long to scan")
+    asyncio.run(scan_once(parser.parse_args().seconds))
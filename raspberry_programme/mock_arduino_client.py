@@ -1,29 +1,49 @@
 """
 Mock Arduino Client for testing the raspberry.py server on a local machine.
 
-This script simulates the behavior of the Arduino/ESP8266 by:
+Without options this script simulates the behavior of the Arduino/ESP8266 by:
 1. Connecting to the TCP server.
 2. Sending a simulated soil moisture value.
 3. Waiting for and printing the server's response (pump command).
 4. Repeating this process every 10 seconds.
+
+With --nodes it becomes a load generator: N simulated nodes, each on its own
+connection, report at a configurable rate. Per-reading latency is recorded in
+an HDR-style histogram and the run ends with a JSON report (p50/p99/p999,
+throughput, errors), e.g.:
+
+  python mock_arduino_client.py --nodes 200 --rate 2 --duration 30
+  python mock_arduino_client.py --nodes 50 --mode pipelined --depth 8 --json report.json
+  python mock_arduino_client.py --nodes 50 --mode binary --distribution normal --mean 350
 """
+import argparse
+import asyncio
+import json
+import random
 import socket
+import struct
+import sys
 import time
-import random
 
 # The server's address and port (must match raspberry.py)
 HOST = "127.0.0.1"
 PORT = 8000
 
-def run_mock_client():
+# Binary protocol v1 (see raspberry.py)
+BINARY_MAGIC = 0xA5
+BINARY_VERSION = 1
+_BINARY_FRAME = struct.Struct("<BBBHHHHHI")
+_BINARY_REPLY = struct.Struct("<BBHHI")
+
+def run_mock_client(host=HOST, port=PORT):
     """Connects to the server and sends simulated data."""
     print("--- Mock Arduino Client Started ---")
-    print(f"Attempting to connect to server at {HOST}:{PORT}...")
+    print(f"Attempting to connect to server at {host}:{port}...")
 
     while True:
         try:
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.connect((HOST, PORT))
+                s.connect((host, port))
                 print("\n[Connected to server]")
 
                 # Simulate a soil moisture value (e.g., a random value between 0 and 100)
@@ -41,10 +61,227 @@ def run_mock_client():
             print("Connection refused. Is the raspberry.py server running?")
         except Exception as e:
             print(f"An error occurred: {e}")
-        
+
         # Wait for a few seconds before sending the next reading
         print("---------------------------------")
         time.sleep(11)
 
+
+# ------------------------------ Load generator ------------------------------
+
+class LatencyHistogram:
+    """
+    HDR-style log-linear histogram of integer microsecond values.
+
+    Values below 128 us get their own bucket; above that every power of two
+    is split into 64 buckets, so any recorded value is known to within ~1.6%
+    while memory stays a few KB regardless of the number of samples.
+    """
+    SUB_BUCKETS = 64
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+
+    def _index(self, value: int) -> int:
+        if value < 2 * self.SUB_BUCKETS:
+            return value
+        magnitude = value.bit_length() - 7
+        sub = value >> magnitude  # 64..127
+        return 2 * self.SUB_BUCKETS + (magnitude - 1) * self.SUB_BUCKETS + (sub - self.SUB_BUCKETS)
+
+    def _upper_bound(self, index: int) -> int:
+        if index < 2 * self.SUB_BUCKETS:
+            return index
+        magnitude = (index - 2 * self.SUB_BUCKETS) // self.SUB_BUCKETS + 1
+        sub = (index - 2 * self.SUB_BUCKETS) % self.SUB_BUCKETS + self.SUB_BUCKETS
+        return ((sub + 1) << magnitude) - 1
+
+    def record(self, value_us: int) -> None:
+        value_us = max(0, int(value_us))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.sum += value_us
+        self.max = max(self.max, value_us)
+        self.min = value_us if self.min is None else min(self.min, value_us)
+
+    def percentile(self, pct: float) -> int:
+        """Upper bound of the bucket holding the pct-th percentile (0 if empty)."""
+        if not self.total:
+            return 0
+        target = max(1, int(round(self.total * pct / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._upper_bound(index), self.max)
+        return self.max
+
+    def summary_ms(self) -> dict:
+        return {
+            "count": self.total,
+            "min": (self.min or 0) / 1000.0,
+            "mean": round(self.sum / self.total / 1000.0, 3) if self.total else 0.0,
+            "p50": self.percentile(50) / 1000.0,
+            "p90": self.percentile(90) / 1000.0,
+            "p99": self.percentile(99) / 1000.0,
+            "p999": self.percentile(99.9) / 1000.0,
+            "max": self.max / 1000.0,
+        }
+
+
+def make_reading_source(args) -> "callable":
+    """Returns a function producing one raw moisture value (0..1023)."""
+    if args.distribution == "normal":
+        def source():
+            return int(random.gauss(args.mean, args.stddev))
+    elif args.distribution == "dry":
+        # Mostly dry soil, so the AI / pump path is exercised
+        def source():
+            return int(random.triangular(0, args.max, args.min))
+    else:
+        def source():
+            return random.randint(args.min, args.max)
+    return lambda: max(0, min(1023, source()))
+
+
+class LoadStats:
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.connect_failures = 0
+
+
+async def simulate_node(node_id: int, args, stats: LoadStats, deadline: float) -> None:
+    """One simulated node: connect, then report at args.rate readings/s until the deadline."""
+    next_reading = make_reading_source(args)
+    interval = 1.0 / args.rate
+    depth = args.depth if args.mode == "pipelined" else 1
+    seq = 0
+
+    # Spread connection starts over one interval so nodes don't report in lockstep
+    await asyncio.sleep(random.uniform(0, interval))
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(args.host, args.port), args.timeout)
+    except Exception:
+        stats.connect_failures += 1
+        return
+
+    loop = asyncio.get_running_loop()
+    scheduled = loop.time()
+    try:
+        while loop.time() < deadline:
+            values = [next_reading() for _ in range(depth)]
+            if args.mode == "binary":
+                payload = b"".join(
+                    _BINARY_FRAME.pack(BINARY_MAGIC, BINARY_VERSION, 0x01, node_id & 0xFFFF,
+                                       (seq + i) & 0xFFFF, v, v, v, int(time.monotonic() * 1000) & 0xFFFFFFFF)
+                    for i, v in enumerate(values)
+                )
+            else:
+                payload = "".join(f"{v}\n" for v in values).encode("utf-8")
+            seq += depth
+
+            writer.write(payload)
+            await writer.drain()
+            stats.sent += depth
+            for _ in range(depth):
+                if args.mode == "binary":
+                    reply = await asyncio.wait_for(reader.readexactly(_BINARY_REPLY.size), args.timeout)
+                    ok = reply[0] == BINARY_MAGIC
+                else:
+                    reply = await asyncio.wait_for(reader.readline(), args.timeout)
+                    ok = reply.endswith(b"\n") and reply.strip().isdigit()
+                if not ok:
+                    stats.errors += 1
+                    continue
+                stats.received += 1
+                # Measured from the scheduled send time, so a slow server also
+                # shows up as latency (no coordinated omission)
+                stats.latency.record((loop.time() - scheduled) * 1_000_000)
+
+            scheduled += interval * depth
+            delay = scheduled - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, OSError):
+        stats.errors += 1
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def run_load(args) -> dict:
+    stats = LoadStats()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + args.duration
+    await asyncio.gather(*(simulate_node(i + 1, args, stats, deadline) for i in range(args.nodes)))
+    elapsed = loop.time() - start
+    return {
+        "config": {
+            "host": args.host,
+            "port": args.port,
+            "nodes": args.nodes,
+            "rate_per_node": args.rate,
+            "mode": args.mode,
+            "depth": args.depth if args.mode == "pipelined" else 1,
+            "distribution": args.distribution,
+            "duration_s": args.duration,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "sent": stats.sent,
+        "received": stats.received,
+        "errors": stats.errors,
+        "connect_failures": stats.connect_failures,
+        "throughput_per_s": round(stats.received / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": stats.latency.summary_ms(),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Mock Arduino client and multi-node load generator for raspberry.py.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--nodes", type=int, default=None,
+                        help="Simulate N concurrent nodes (load mode). Without it, run the single mock client.")
+    parser.add_argument("--rate", type=float, default=1.0, help="Readings per second per node")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run the load")
+    parser.add_argument("--mode", choices=["text", "pipelined", "binary"], default="text",
+                        help="text: one reading per round trip; pipelined: --depth readings per write; binary: v1 frames")
+    parser.add_argument("--depth", type=int, default=4, help="Readings per write in pipelined mode")
+    parser.add_argument("--distribution", choices=["uniform", "normal", "dry"], default="uniform",
+                        help="How simulated moisture readings are drawn")
+    parser.add_argument("--min", type=int, default=0, help="Lowest reading (uniform/dry)")
+    parser.add_argument("--max", type=int, default=1023, help="Highest reading (uniform/dry)")
+    parser.add_argument("--mean", type=float, default=400.0, help="Mean reading (normal)")
+    parser.add_argument("--stddev", type=float, default=120.0, help="Reading standard deviation (normal)")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Seconds to wait for a connection or reply")
+    parser.add_argument("--json", default=None, help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    if args.nodes is None:
+        run_mock_client(args.host, args.port)
+        return 0
+
+    print(f"Simulating {args.nodes} nodes at {args.rate}/s each ({args.mode}) against {args.host}:{args.port} "
+          f"for {args.duration:.0f}s...", file=sys.stderr)
+    report = asyncio.run(run_load(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text + "\n")
+    return 0
+
 if __name__ == "__main__":
-    run_mock_client()
+    main()
@@ -0,0 +1,153 @@
+"""
+Export the trained scikit-learn model to a plain-array .npz file.
+
+The .npz is evaluated by ExportedModel in "import requests.py" with NumPy
+only: the server can run without scikit-learn (or pandas) installed, and the
+arrays are memory-mapped instead of unpickled.
+
+Usage:
+  python3 export_model.py "crop_water_requirement_model (1).pkl" crop_water_requirement_model.npz --verify
+  python3 raspberry.py --model-path model_AI/crop_water_requirement_model.npz
+
+--verify compares the exported model with the original on every input
+combination (crops x soils x regions x temperatures x weathers) and exits
+with status 1 unless all predictions are identical.
+
+Supported models: RandomForestRegressor, DecisionTreeRegressor and linear
+regressors with coef_/intercept_ (single output).
+"""
+import argparse
+import importlib.util
+import itertools
+import os
+import sys
+
+import numpy as np
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import requests.py")
+
+
+def load_irrigation_module():
+    spec = importlib.util.spec_from_file_location("irrigation_module", MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _one(value, dtype):
+    return np.array([value], dtype=dtype)
+
+
+def forest_arrays(estimators: list) -> dict:
+    """Flatten the trees of an ensemble into node arrays (leaves point to themselves)."""
+    roots, left, right, feature, threshold, value = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in estimators:
+        tree = estimator.tree_
+        if tree.n_outputs != 1 or tree.value.shape[2] != 1:
+            raise ValueError("Only single-output regression trees can be exported")
+        n = tree.node_count
+        idx = np.arange(n)
+        is_leaf = tree.children_left == -1
+        roots.append(offset)
+        left.append(np.where(is_leaf, idx, tree.children_left) + offset)
+        right.append(np.where(is_leaf, idx, tree.children_right) + offset)
+        feature.append(np.where(is_leaf, 0, tree.feature))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        value.append(tree.value[:, 0, 0])
+        max_depth = max(max_depth, int(tree.max_depth))
+        offset += n
+
+    index_dtype = np.int32 if offset < 2**31 else np.int64
+    return {
+        "kind": _one("forest", "U16"),
+        "roots": np.asarray(roots, dtype=index_dtype),
+        "left": np.concatenate(left).astype(index_dtype),
+        "right": np.concatenate(right).astype(index_dtype),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold).astype(np.float64),
+        "value": np.concatenate(value).astype(np.float64),
+        "max_depth": _one(max_depth, np.int32),
+    }
+
+
+def model_arrays(model) -> dict:
+    if hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in model.estimators_):
+        arrays = forest_arrays(list(model.estimators_))
+    elif hasattr(model, "tree_"):
+        arrays = forest_arrays([model])
+    elif hasattr(model, "coef_") and hasattr(model, "intercept_"):
+        coef = np.asarray(model.coef_, dtype=np.float64)
+        if coef.ndim != 1:
+            raise ValueError("Only single-output linear models can be exported")
+        arrays = {
+            "kind": _one("linear", "U16"),
+            "coef": coef,
+            "intercept": _one(float(np.ravel(model.intercept_)[0]), np.float64),
+        }
+    else:
+        raise ValueError(f"Don't know how to export a {type(model).__name__}")
+    arrays["n_features"] = _one(int(model.n_features_in_), np.int32)
+    return arrays
+
+
+def export(irrigation, source_path: str, output_path: str) -> dict:
+    model = irrigation._load_model_file(source_path)
+    arrays = model_arrays(model)
+    columns = list(getattr(model, "feature_names_in_", irrigation.FEATURE_COLUMNS))
+    if columns != irrigation.FEATURE_COLUMNS:
+        raise ValueError("The model's feature columns differ from FEATURE_COLUMNS; encode_features() would not match")
+    arrays["feature_columns"] = np.asarray(columns)
+    arrays["format_version"] = _one(irrigation.EXPORT_FORMAT_VERSION, np.int32)
+    # np.savez stores members uncompressed, which is what lets them be memory-mapped
+    np.savez(output_path, **arrays)
+    return arrays
+
+
+def verify(irrigation, source_path: str, output_path: str) -> bool:
+    """Compare both models on the full input grid; True if every prediction is identical."""
+    rows = list(itertools.product(
+        irrigation.CROP_TYPES, irrigation.SOIL_TYPES, irrigation.REGIONS,
+        irrigation.TEMPERATURE_BUCKETS, irrigation.WEATHER_CONDITIONS,
+    ))
+    features = irrigation.encode_features(rows)
+    expected = np.asarray(irrigation.predict_features(irrigation._load_model_file(source_path), features),
+                          dtype=np.float64)
+    actual = irrigation.ExportedModel.load(output_path).predict(features)
+
+    identical = int(np.sum(expected == actual))
+    max_diff = float(np.max(np.abs(expected - actual))) if len(rows) else 0.0
+    print(f"Verified {len(rows)} input combinations: {identical} identical, max abs difference {max_diff:.3g}")
+    return identical == len(rows)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export the irrigation model to a NumPy-only .npz file.")
+    parser.add_argument("source", help="Trained model (.pkl)")
+    parser.add_argument("output", nargs="?", default=None, help="Output .npz (default: next to the source)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Check that the export predicts exactly like the original on the full input grid")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.source)[0] + ".npz"
+    if not output.endswith(".npz"):
+        output += ".npz"
+
+    irrigation = load_irrigation_module()
+    arrays = export(irrigation, args.source, output)
+    size_kb = os.path.getsize(output) / 1024
+    if arrays["kind"][0] == "forest":
+        print(f"Exported {len(arrays['roots'])} trees, {len(arrays['value'])} nodes "
+              f"(max depth {arrays['max_depth'][0]}) to {output} ({size_kb:.0f} KB)")
+    else:
+        print(f"Exported linear model to {output} ({size_kb:.0f} KB)")
+
+    if args.verify and not verify(irrigation, args.source, output):
+        print("Exported model does NOT match the original.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
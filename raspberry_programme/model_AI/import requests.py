@@ -1,13 +1,89 @@
-import requests
-from datetime import datetime
-import pytz
-import pandas as pd
+from array import array
+from datetime import date, datetime
+import math
+import numpy as np
 import pickle
+import sqlite3
 import os
-try:
-    import joblib
-except ImportError:
-    joblib = None
+import hashlib
+import itertools
+import struct
+import zipfile
+import threading
+import time
+import warnings
+
+# requests, pytz and joblib are imported on first use (weather fetch, first
+# farm, first model load) so importing this module stays cheap on a Pi Zero.
+
+# Open-Meteo forecast endpoint (override to point at a local stand-in)
+OPEN_METEO_URL = os.environ.get("OPEN_METEO_URL", "https://api.open-meteo.com/v1/forecast")
+
+# Local time of every farm (and of the forecast hours)
+TUNISIA_TIMEZONE = "Africa/Tunis"
+
+# Hourly forecast fetched with every weather call (today + 2 days = 48-72h
+# ahead) and kept as arrays, see WeatherForecast
+FORECAST_DAYS = 3
+FORECAST_HOURLY_VARIABLES = [
+    "temperature_2m",
+    "relative_humidity_2m",
+    "precipitation",
+    "weather_code",
+    "wind_speed_10m",
+]
+
+# Optional callback(stage, seconds) told how long each prediction step took:
+# "weather", "model_load" and "predict". raspberry.py uses it for metrics.
+_stage_observer = None
+
+
+def set_stage_observer(observer):
+    """Register a callback(stage, seconds) for per-stage timings (None to remove)."""
+    global _stage_observer
+    _stage_observer = observer
+
+
+def _observe_stage(stage, started):
+    """Report the time since started (a time.perf_counter() value) for a stage."""
+    observer = _stage_observer
+    if observer is not None:
+        try:
+            observer(stage, time.perf_counter() - started)
+        except Exception:
+            pass
+
+
+class ManualClock:
+    """
+    Clock for TunisiaIrrigationSystem(clock=...) that returns whatever time
+    it was last set to, so recorded data can be replayed faster than real
+    time (see replay.py)
+    """
+    
+    def __init__(self, tz, when=None):
+        """
+        Args:
+            tz: Timezone of the returned datetimes
+            when: Initial time (datetime or epoch seconds, default now)
+        """
+        self.tz = tz
+        self.current = None
+        self.set(time.time() if when is None else when)
+    
+    def set(self, when):
+        """Move the clock to when (datetime or epoch seconds)"""
+        if isinstance(when, datetime):
+            self.current = when.astimezone(self.tz)
+        else:
+            self.current = datetime.fromtimestamp(float(when), self.tz)
+    
+    def advance(self, seconds):
+        self.set(self.current.timestamp() + seconds)
+    
+    def __call__(self):
+        return self.current
+
 
 class TunisiaIrrigationSystem:
     """
@@ -15,16 +91,24 @@ class TunisiaIrrigationSystem:
     Tailored for your specific model's input requirements
     """
     
-    def __init__(self, governorate="ZAGHOUAN", crop_type="TOMATO"):
+    def __init__(self, governorate="ZAGHOUAN", crop_type="TOMATO", weather_cache=None, clock=None):
         """
         Initialize for your Tunisian farm
         
         Args:
             governorate: Your governorate
             crop_type: What you're growing (manual input)
+            weather_cache: Optional WeatherCache; when set, weather is read
+                from its latest snapshot instead of calling the API
+            clock: Optional callable returning the current time as an aware
+                datetime (e.g. a ManualClock); defaults to the wall clock
         """
         self.governorate = governorate.upper()
         self.crop_type = crop_type.upper()
+        self.weather_cache = weather_cache
+        self.clock = clock
+        self.forecast = None        # Latest WeatherForecast
+        self.forecast_path = None   # Set by attach_forecast_snapshot()
         
         # Tunisia locations with MODEL-SPECIFIC regions
         self.locations = {
@@ -91,12 +175,19 @@ class TunisiaIrrigationSystem:
         )
         
         # Tunisia timezone
-        self.tz = pytz.timezone('Africa/Tunis')
+        import pytz
+        self.tz = pytz.timezone(TUNISIA_TIMEZONE)
         
         # Watering tracking
+        self._state_lock = threading.Lock()
+        self.state_store = None   # Set by attach_state_store()
+        self.zone_id = None
         self.last_watering = None
         self.daily_water_total = 0
-        self.last_reset_day = datetime.now(self.tz).day
+        self.last_reset_date = self.now().date()
+        
+        # Rolling moisture statistics per zone (None = the farm itself)
+        self.moisture_stats = {}
         
         # Soil moisture thresholds (for decisions, not model input)
         self.MOISTURE_CRITICAL = 15
@@ -148,42 +239,115 @@ class TunisiaIrrigationSystem:
     def get_tunisia_weather(self):
         """
         Get weather from Open-Meteo API for Tunisia
-        """
-        url = "https://api.open-meteo.com/v1/forecast"
-        params = {
-            "latitude": self.location["lat"],
-            "longitude": self.location["lon"],
-            "current": [
-                "temperature_2m",
-                "relative_humidity_2m",
-                "precipitation",
-                "weather_code",
-                "wind_speed_10m"
-            ],
-            "hourly": "precipitation",
-            "forecast_days": 1,
-            "timezone": "Africa/Tunis"
-        }
         
+        The same request brings the hourly forecast for FORECAST_DAYS days,
+        kept in self.forecast (and saved to self.forecast_path, if set).
+        When the API can't be reached, the current hour is answered from
+        the latest forecast, with its "forecast_age_seconds" (only fallback
+        answers have that key); None only if no forecast covers it.
+        """
         try:
-            response = requests.get(url, params=params, timeout=10)
+            response = get_http_session().get(
+                OPEN_METEO_URL, params=weather_request_params([self.location]), timeout=10
+            )
             response.raise_for_status()
-            data = response.json()
-            
-            current = data['current']
-            next_6h_rain = sum(data['hourly']['precipitation'][:6])
-            
-            return {
-                "temperature_api": current['temperature_2m'],  # Backup if Arduino fails
-                "humidity": current['relative_humidity_2m'],
-                "precipitation": current['precipitation'],
-                "precipitation_6h": next_6h_rain,
-                "weather_code": current['weather_code'],
-                "wind_speed": current['wind_speed_10m']
-            }
+            return self.weather_from_response(response.json())
         except Exception as e:
             print(f"⚠️ Weather API Error: {e}")
+            return self.offline_weather()
+    
+    def weather_from_response(self, data):
+        """
+        Weather dict from one location's Open-Meteo response; also keeps
+        its hourly forecast
+        """
+        current = data['current']
+        self.set_forecast(WeatherForecast.from_api(data))
+        # Next 6 hours from now (the hourly data starts at midnight)
+        next_6h_rain = self.rain_forecast(6)
+        
+        return {
+            "temperature_api": current['temperature_2m'],  # Backup if Arduino fails
+            "humidity": current['relative_humidity_2m'],
+            "precipitation": current['precipitation'],
+            "precipitation_6h": next_6h_rain if next_6h_rain is not None else 0,
+            "weather_code": current['weather_code'],
+            "wind_speed": current['wind_speed_10m']
+        }
+    
+    def offline_weather(self):
+        """Current hour from the latest forecast when the API can't be reached (None if not covered)"""
+        weather = self.forecast_weather()
+        if weather is not None:
+            print(f"   Using the forecast fetched {weather['forecast_age_seconds'] / 3600:.1f}h ago")
+        return weather
+    
+    def set_forecast(self, forecast, save=True):
+        """Keep a new forecast and write it to the on-disk snapshot, if any (and save)"""
+        self.forecast = forecast
+        if save and self.forecast_path:
+            try:
+                forecast.save(self.forecast_path)
+            except Exception as e:
+                print(f"⚠️ Could not save forecast snapshot {self.forecast_path}: {e}")
+    
+    def attach_forecast_snapshot(self, path):
+        """
+        Save every fetched forecast to path, and start from the one saved
+        there (if any) so a restart without network keeps the forecast
+        """
+        self.forecast_path = path
+        if self.forecast is None:
+            self.forecast = WeatherForecast.load(path)
+    
+    def forecast_weather(self, at=None):
+        """
+        Weather for the hour containing at (epoch seconds or datetime,
+        default now) from the latest forecast, in the same format as
+        get_tunisia_weather(); None if the forecast doesn't cover it
+        """
+        forecast = self.forecast
+        if forecast is None:
+            return None
+        now = self.now()
+        return forecast.weather_at(_epoch_seconds(now if at is None else at), now=_epoch_seconds(now))
+    
+    def forecast_condition(self, at=None):
+        """Model weather condition for any forecast hour (see classify_weather_condition)"""
+        return self.classify_weather_condition(self.forecast_weather(at))
+    
+    def rain_forecast(self, hours=6, at=None):
+        """Forecast rain (mm) over the hours after at (default now); None if unknown"""
+        forecast = self.forecast
+        if forecast is None:
             return None
+        return forecast.rain_between(_epoch_seconds(self.now() if at is None else at), hours)
+    
+    def get_weather_snapshot(self):
+        """
+        Latest weather for this farm, without blocking when a cache is set
+        
+        Returns:
+            (dict or None, float or None): (weather_data, age_seconds).
+            Without a cache the API is called and the age is 0 (or the
+            forecast's age when it had to answer instead).
+        """
+        started = time.perf_counter()
+        try:
+            if self.weather_cache is None:
+                weather = self.get_tunisia_weather()
+            else:
+                self.weather_cache.register(self.governorate, self.get_tunisia_weather)
+                weather, age = self.weather_cache.get(self.governorate)
+                if weather is not None:
+                    return weather, age
+                # Nothing fetched yet (e.g. restarted offline): use the saved forecast
+                weather = self.forecast_weather()
+            if weather is None:
+                return None, None
+            return weather, weather.get("forecast_age_seconds", 0.0)
+        finally:
+            _observe_stage("weather", started)
     
     def classify_weather_condition(self, weather_data):
         """
@@ -250,7 +414,7 @@ class TunisiaIrrigationSystem:
         else:
             return "WET"
     
-    def classify_soil_type_method3_historical(self, soil_moisture_history):
+    def classify_soil_type_method3_historical(self, soil_moisture_history=None, zone=None, drying_rate=None):
         """
         METHOD 3: BEHAVIORAL - Based on soil drying pattern
         
@@ -261,18 +425,26 @@ class TunisiaIrrigationSystem:
         Slow drying (> 50% after 24h) = Clay = "WET"
         
         Args:
-            soil_moisture_history: List of readings over 24h
+            soil_moisture_history: List of readings over 24h; when omitted,
+                the drop is the zone's rolling drying rate over 24h (needs
+                at least 6h of history)
+            zone: Zone whose statistics to use (None = this farm)
+            drying_rate: Drying rate (%/h) to use instead of the zone's
+                statistics, e.g. computed by another process
         
         Returns:
             str: One of "DRY", "HUMID", "WET"
         """
-        if len(soil_moisture_history) < 2:
+        if soil_moisture_history is None:
+            if drying_rate is None:
+                drying_rate = self.moisture_stats_for(zone).drying_rate_per_hour(min_span_hours=6.0)
+            if drying_rate is None:
+                return "HUMID"  # Default
+            moisture_drop = drying_rate * 24
+        elif len(soil_moisture_history) < 2:
             return "HUMID"  # Default
-        
-        initial = soil_moisture_history[0]
-        after_24h = soil_moisture_history[-1]
-        
-        moisture_drop = initial - after_24h
+        else:
+            moisture_drop = soil_moisture_history[0] - soil_moisture_history[-1]
         
         # Fast drainage
         if moisture_drop > 40:
@@ -343,30 +515,63 @@ class TunisiaIrrigationSystem:
         else:
             return base_soil_type
     
+    def classify_soil_type_measured(self, soil_moisture_percent, zone=None, drying_rate=None):
+        """
+        LIVE: Hybrid approach with the soil type measured in the field
+        
+        Same overrides as classify_soil_type_recommended(), but the base
+        type comes from METHOD 3 on the zone's rolling statistics (how fast
+        it dries) instead of the regional lookup. Until the zone has 6h of
+        history, METHOD 2 (current moisture) is used.
+        
+        Args:
+            soil_moisture_percent: Current sensor reading (0-100%)
+            zone: Zone whose statistics to use (None = this farm)
+            drying_rate: Drying rate (%/h) to use instead of the statistics
+        
+        Returns:
+            str: One of "DRY", "HUMID", "WET"
+        """
+        if drying_rate is None:
+            drying_rate = self.moisture_stats_for(zone).drying_rate_per_hour(min_span_hours=6.0)
+        if drying_rate is None:
+            return self.classify_soil_type_method2_sensor(soil_moisture_percent)
+        
+        if soil_moisture_percent > 70:
+            return "WET"  # Saturated regardless of soil type
+        elif soil_moisture_percent < 20:
+            return "DRY"  # Very dry regardless of base type
+        else:
+            return self.classify_soil_type_method3_historical(drying_rate=drying_rate)
+    
     # ========================================================================
     # MAIN MODEL INPUT GENERATION
     # ========================================================================
     
-    def generate_model_input(self, temp_from_arduino, soil_moisture_sensor):
+    def generate_model_input(self, temp_from_arduino, soil_moisture_sensor, zone=None, drying_rate=None):
         """
         Generate complete model input from your sensor data
         
         Args:
             temp_from_arduino: Temperature from Arduino sensor (°C)
             soil_moisture_sensor: Soil moisture from sensor (%)
+            zone: Zone the reading comes from (None = this farm); its
+                rolling statistics decide the soil type
+            drying_rate: The zone's drying rate (%/h), when the caller
+                keeps the statistics (e.g. in another process)
         
         Returns:
             dict: Ready for your model
         """
-        # Get weather data
-        weather = self.get_tunisia_weather()
+        # Get weather data (latest cached snapshot if a cache is set)
+        weather, weather_age = self.get_weather_snapshot()
         
         # Generate each input in MODEL format
         model_input = {
             "CROP_TYPE": self.crop_type,  # Manual input (you set)
             
-            "SOIL_TYPE": self.classify_soil_type_method2_sensor(
-                soil_moisture_sensor
+            "SOIL_TYPE": self.classify_soil_type_measured(
+                soil_moisture_sensor, zone, drying_rate
             ),  # One of: DRY, HUMID, WET
             
             "REGION": self.location["region"],  # One of: DESERT, SEMI ARID, SEMI HUMID, HUMID
@@ -387,8 +592,10 @@ class TunisiaIrrigationSystem:
             "humidity": weather['humidity'] if weather else 60,
             "rain_forecast_6h": weather['precipitation_6h'] if weather else 0,
             "wind_speed": weather['wind_speed'] if weather else 0,
+            "weather_age_seconds": weather_age,
             "season": self.get_current_season(),
-            "timestamp": datetime.now(self.tz)
+            "timestamp": self.now(),
+            "zone": zone
         }
         
         return model_input, context
@@ -417,9 +624,15 @@ class TunisiaIrrigationSystem:
     # HELPER FUNCTIONS
     # ========================================================================
     
+    def now(self):
+        """Current time in Tunisia, from the injected clock if there is one"""
+        if self.clock is not None:
+            return self.clock()
+        return datetime.now(self.tz)
+    
     def get_current_season(self):
         """Get current season in Tunisia"""
-        month = datetime.now(self.tz).month
+        month = self.now().month
         
         if month in [6, 7, 8, 9]:
             return "SUMMER"
@@ -430,6 +643,29 @@ class TunisiaIrrigationSystem:
         else:
             return "SPRING"
     
+    def moisture_stats_for(self, zone=None):
+        """Rolling moisture statistics of a zone (None = this farm), created on first use"""
+        stats = self.moisture_stats.get(zone)
+        if stats is None:
+            with self._state_lock:
+                stats = self.moisture_stats.setdefault(zone, SoilMoistureStats())
+        return stats
+    
+    def record_moisture(self, soil_moisture, timestamp=None, zone=None):
+        """
+        Add a moisture reading to the zone's rolling statistics
+        
+        Args:
+            soil_moisture: Sensor reading
+            timestamp: When it was taken (datetime or epoch seconds; defaults to now)
+            zone: Zone it came from (None = this farm)
+        """
+        if timestamp is None:
+            timestamp = self.now()
+        if isinstance(timestamp, datetime):
+            timestamp = timestamp.timestamp()
+        self.moisture_stats_for(zone).add(soil_moisture, timestamp)
+    
     # ========================================================================
     # WATERING DECISION LOGIC
     # ========================================================================
@@ -451,14 +687,16 @@ class TunisiaIrrigationSystem:
         season = context['season']
         rain_forecast = context['rain_forecast_6h']
         
-        # Reset daily counter at midnight
-        if tunisia_time.day != self.last_reset_day:
-            self.daily_water_total = 0
-            self.last_reset_day = tunisia_time.day
+        # Reset daily counter at midnight (under the same lock as
+        # record_watering, which other threads may be running)
+        with self._state_lock:
+            self.reset_daily_total_if_new_day(tunisia_time)
+            daily_water_total = self.daily_water_total
+            last_watering = self.last_watering
         
         # Rule 1: Daily limit reached
         season_max = self.season_limits[season]
-        if self.daily_water_total >= season_max:
+        if daily_water_total >= season_max:
             return False, 0, f"❌ Daily limit reached ({season_max}L)"
         
         # Rule 2: Rain expected
@@ -470,8 +708,8 @@ class TunisiaIrrigationSystem:
             return False, 0, f"❌ Soil saturated ({soil_moisture}%)"
         
         # Rule 4: Too soon since last watering
-        if self.last_watering:
-            hours_since = (tunisia_time - self.last_watering).total_seconds() / 3600
+        if last_watering:
+            hours_since = (tunisia_time - last_watering).total_seconds() / 3600
             if hours_since < 6:
                 return False, 0, f"❌ Watered {hours_since:.1f}h ago"
         
@@ -482,23 +720,87 @@ class TunisiaIrrigationSystem:
         
         # Rule 6: Critical dry - emergency
         if soil_moisture < self.MOISTURE_CRITICAL:
-            amount = min(model_water_requirement * 0.8, season_max - self.daily_water_total)
+            amount = min(model_water_requirement * 0.8, season_max - daily_water_total)
             return True, amount, f"🚨 CRITICAL ({soil_moisture}%)"
         
         # Rule 7: Dry soil - water needed
         if soil_moisture < self.MOISTURE_DRY_THRESHOLD:
-            amount = min(model_water_requirement * 0.7, season_max - self.daily_water_total)
+            amount = min(model_water_requirement * 0.7, season_max - daily_water_total)
             return True, amount, f"⚠️ Dry soil ({soil_moisture}%)"
         
-        # Rule 8: Preventive watering
+        # Rule 8: Preventive watering (high demand, or drying fast enough to
+        # be dry within 6h according to the zone's rolling statistics)
         if soil_moisture < self.MOISTURE_ADEQUATE:
             if model_water_requirement > 7:
-                amount = min(model_water_requirement * 0.3, season_max - self.daily_water_total)
+                amount = min(model_water_requirement * 0.3, season_max - daily_water_total)
                 return True, amount, "✅ Preventive watering"
+            drying_rate = self.moisture_stats_for(context.get('zone')).drying_rate_per_hour()
+            if drying_rate and drying_rate > 0:
+                hours_to_dry = (soil_moisture - self.MOISTURE_DRY_THRESHOLD) / drying_rate
+                if hours_to_dry < 6:
+                    amount = min(model_water_requirement * 0.3, season_max - daily_water_total)
+                    return True, amount, f"✅ Preventive watering (dry in {hours_to_dry:.1f}h)"
         
         # Rule 9: All good
         return False, 0, f"✅ Soil OK ({soil_moisture}%)"
     
+    def reset_daily_total_if_new_day(self, tunisia_time):
+        """Reset the daily water counter when the date changes (caller holds self._state_lock)"""
+        if tunisia_time.date() != self.last_reset_date:
+            self.daily_water_total = 0
+            self.last_reset_date = tunisia_time.date()
+            self._persist_state()
+    
+    def record_watering(self, amount, timestamp=None):
+        """
+        Account for water actually delivered to this farm
+        
+        Args:
+            amount: Liters delivered
+            timestamp: When it was delivered (defaults to now, Tunisia time)
+        """
+        if timestamp is None:
+            timestamp = self.now()
+        with self._state_lock:
+            self.reset_daily_total_if_new_day(timestamp)
+            self.last_watering = timestamp
+            self.daily_water_total += amount
+            self._persist_state()
+    
+    # ========================================================================
+    # STATE PERSISTENCE (optional, see WateringStateStore)
+    # ========================================================================
+    
+    def attach_state_store(self, store, zone_id):
+        """
+        Persist this farm's watering state under zone_id, restoring any
+        state saved before a restart
+        
+        Args:
+            store: WateringStateStore
+            zone_id: Key of this zone in the store
+        """
+        self.state_store = store
+        self.zone_id = zone_id
+        state = store.load(zone_id)
+        if state is not None:
+            self.daily_water_total = state["daily_water_total"]
+            self.last_reset_date = state["last_reset_date"]
+            self.last_watering = state["last_watering"]
+            # The saved total belongs to a day that is over: start from 0
+            with self._state_lock:
+                self.reset_daily_total_if_new_day(self.now())
+    
+    def _persist_state(self):
+        """Queue the current watering state for the next group commit"""
+        if self.state_store is None:
+            return
+        self.state_store.save(self.zone_id, {
+            "daily_water_total": self.daily_water_total,
+            "last_watering": self.last_watering,
+            "last_reset_date": self.last_reset_date,
+        })
+    
     # ========================================================================
     # MAIN CYCLE
     # ========================================================================
@@ -516,11 +818,13 @@ class TunisiaIrrigationSystem:
         """
         print("\n" + "="*70)
         print(f"🇹🇳 Smart Irrigation System - {self.governorate} (زغوان)")
-        print(f"⏰ Time: {datetime.now(self.tz).strftime('%Y-%m-%d %H:%M:%S')}")
+        print(f"⏰ Time: {self.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"🌱 Crop: {self.crop_type}")
         print("="*70)
         
-        # Generate model input
+        # Generate model input (the soil type reads the rolling statistics)
+        self.record_moisture(soil_moisture_sensor)
+        stats = self.moisture_stats_for()
         model_input, context = self.generate_model_input(
             temp_arduino,
             soil_moisture_sensor
@@ -533,6 +837,9 @@ class TunisiaIrrigationSystem:
         print(f"   💨 Humidity: {context['humidity']}%")
         print(f"   🌧️  Rain forecast (6h): {context['rain_forecast_6h']}mm")
         print(f"   💨 Wind: {context['wind_speed']} m/s")
+        drying_rate = stats.drying_rate_per_hour()
+        if drying_rate is not None:
+            print(f"   📉 Drying rate: {drying_rate:.2f}%/h (24h min {stats.minimum():.1f}%, max {stats.maximum():.1f}%)")
         
         # Display model input
         print(f"\n🤖 Model Input:")
@@ -562,8 +869,7 @@ class TunisiaIrrigationSystem:
             print(f"💦 WATERING: {amount:.2f} liters")
             print(f"📈 Daily total: {self.daily_water_total + amount:.2f}L / {self.season_limits[context['season']]}L")
             
-            self.last_watering = context['timestamp']
-            self.daily_water_total += amount
+            self.record_watering(amount, context['timestamp'])
             
             # TODO: Activate pump
             # self.activate_pump(amount)
@@ -574,6 +880,851 @@ class TunisiaIrrigationSystem:
             return False, 0
 
 
+# ============================================================================
+# WEATHER API (pooled HTTP session, one request for many locations)
+# ============================================================================
+
+_http_sessions = threading.local()
+
+
+def get_http_session():
+    """
+    requests.Session for API calls made from the calling thread, so
+    connections are kept alive and reused instead of opening a new one
+    per request (a Session is not thread-safe, so each thread has its own)
+    """
+    session = getattr(_http_sessions, "session", None)
+    if session is None:
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _http_sessions.session = session
+    return session
+
+
+def weather_request_params(locations):
+    """
+    Open-Meteo query for the current weather and hourly forecast of one
+    or more locations (several give comma-separated coordinates and a
+    list of results, in the same order)
+    """
+    return {
+        "latitude": ",".join(str(location["lat"]) for location in locations),
+        "longitude": ",".join(str(location["lon"]) for location in locations),
+        "current": [
+            "temperature_2m",
+            "relative_humidity_2m",
+            "precipitation",
+            "weather_code",
+            "wind_speed_10m"
+        ],
+        "hourly": FORECAST_HOURLY_VARIABLES,
+        "forecast_days": FORECAST_DAYS,
+        "timezone": TUNISIA_TIMEZONE
+    }
+
+
+def fetch_weather_batch(governorates):
+    """
+    Fetch the weather of several governorates with a single multi-coordinate
+    request and share it with every registry farm in each of them
+    
+    Args:
+        governorates: Governorate names (farms must exist in the registry)
+    
+    Returns:
+        dict: governorate -> weather dict (or None) for every governorate
+        that has a farm; on a failed request each one falls back to its
+        latest forecast, like get_tunisia_weather(), marked with its
+        "forecast_age_seconds" so WeatherCache retries it soon.
+    """
+    farms_by_governorate = {}
+    for (governorate, _crop_type, _zone), farm in get_farms().items():
+        farms_by_governorate.setdefault(governorate, []).append(farm)
+    governorates = [g.upper() for g in governorates if g.upper() in farms_by_governorate]
+    if not governorates:
+        return {}
+    leaders = [farms_by_governorate[g][0] for g in governorates]
+    
+    try:
+        response = get_http_session().get(
+            OPEN_METEO_URL,
+            params=weather_request_params([farm.location for farm in leaders]),
+            timeout=10,
+        )
+        response.raise_for_status()
+        payloads = response.json()
+        if isinstance(payloads, dict):
+            payloads = [payloads]  # A single location is returned as an object
+        if len(payloads) != len(governorates):
+            raise ValueError(f"expected {len(governorates)} locations, got {len(payloads)}")
+    except Exception as e:
+        print(f"⚠️ Weather API Error: {e}")
+        return {g: farm.offline_weather() for g, farm in zip(governorates, leaders)}
+    
+    results = {}
+    for governorate, leader, data in zip(governorates, leaders, payloads):
+        try:
+            results[governorate] = leader.weather_from_response(data)
+        except Exception as e:
+            print(f"⚠️ Weather API Error ({governorate}): {e}")
+            results[governorate] = leader.offline_weather()
+        # Other crops in the same governorate share the forecast
+        if leader.forecast is not None:
+            for farm in farms_by_governorate[governorate][1:]:
+                # Zones of a governorate share its snapshot file: written once, by the leader
+                farm.set_forecast(leader.forecast, save=farm.forecast_path != leader.forecast_path)
+    return results
+
+
+# ============================================================================
+# HOURLY WEATHER FORECAST (arrays, on-disk snapshot for offline use)
+# ============================================================================
+
+def _epoch_seconds(at):
+    """datetime, epoch seconds or None (now) -> epoch seconds"""
+    if at is None:
+        return time.time()
+    if isinstance(at, datetime):
+        return at.timestamp()
+    return float(at)
+
+
+class WeatherForecast:
+    """
+    Hourly Open-Meteo forecast held as NumPy arrays
+    
+    Any hour it covers is answered locally: weather_at() returns the same
+    dict as get_tunisia_weather() and rain_between() sums precipitation
+    from a cumulative array, so both are O(1) with no network involved.
+    """
+    
+    def __init__(self, start, values, fetched_at=None):
+        """
+        Args:
+            start: Epoch seconds of the first hour
+            values: FORECAST_HOURLY_VARIABLES name -> one value per hour
+            fetched_at: When the forecast was fetched (epoch seconds, default now)
+        """
+        self.start = int(start)
+        self.values = {
+            name: np.nan_to_num(np.asarray(values[name], dtype=np.float64))
+            for name in FORECAST_HOURLY_VARIABLES
+        }
+        self.hours = len(self.values["precipitation"])
+        self.fetched_at = time.time() if fetched_at is None else float(fetched_at)
+        self._rain_cumsum = np.concatenate(([0.0], np.cumsum(self.values["precipitation"])))
+    
+    @classmethod
+    def from_api(cls, data):
+        """Build from an Open-Meteo response with an "hourly" block"""
+        hourly = data["hourly"]
+        local = np.array(hourly["time"], dtype="datetime64[m]").astype("datetime64[s]").astype(np.int64)
+        epoch = local - int(data.get("utc_offset_seconds", 0))
+        if len(epoch) == 0 or np.any(np.diff(epoch) != 3600):
+            raise ValueError("Expected a non-empty hourly forecast")
+        missing = np.full(len(epoch), np.nan)
+        values = {
+            name: np.asarray(hourly[name], dtype=np.float64) if name in hourly else missing
+            for name in FORECAST_HOURLY_VARIABLES
+        }
+        return cls(epoch[0], values)
+    
+    @property
+    def end(self):
+        """Epoch seconds just after the last forecast hour"""
+        return self.start + 3600 * self.hours
+    
+    def hour_index(self, t):
+        """Index of the hour containing t, or None outside the forecast"""
+        if t < self.start or t >= self.end:
+            return None
+        return int((t - self.start) // 3600)
+    
+    def rain_between(self, t, hours=6):
+        """Forecast precipitation (mm) from the hour containing t over the next hours"""
+        i = self.hour_index(t)
+        if i is None:
+            return None
+        return float(self._rain_cumsum[min(i + hours, self.hours)] - self._rain_cumsum[i])
+    
+    def weather_at(self, t, now=None):
+        """
+        Weather dict for the hour containing t (see get_tunisia_weather()),
+        or None; its "forecast_age_seconds" is measured at now (epoch
+        seconds, default the wall clock)
+        """
+        i = self.hour_index(t)
+        if i is None:
+            return None
+        v = self.values
+        return {
+            "temperature_api": float(v["temperature_2m"][i]),
+            "humidity": float(v["relative_humidity_2m"][i]),
+            "precipitation": float(v["precipitation"][i]),
+            "precipitation_6h": self.rain_between(t, 6),
+            "weather_code": int(v["weather_code"][i]),
+            "wind_speed": float(v["wind_speed_10m"][i]),
+            "forecast_age_seconds": max(0.0, _epoch_seconds(now) - self.fetched_at),
+        }
+    
+    def save(self, path):
+        """Write the forecast to path (atomically: readers never see half a file)"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, start=np.int64(self.start), fetched_at=np.float64(self.fetched_at), **self.values)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path):
+        """Read a saved forecast; None if the file is missing or unreadable"""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                return cls(
+                    int(data["start"]),
+                    {name: data[name] for name in FORECAST_HOURLY_VARIABLES},
+                    fetched_at=float(data["fetched_at"]),
+                )
+        except Exception as e:
+            print(f"⚠️ Could not read forecast snapshot {path}: {e}")
+            return None
+
+
+# Directory of per-governorate forecast snapshots (enable_forecast_snapshots())
+_forecast_dir = None
+
+
+def enable_forecast_snapshots(directory):
+    """
+    Save each farm's forecast under directory and restore it on start, so
+    a restart or a network outage keeps using the latest forecast instead
+    of defaults.
+    """
+    global _forecast_dir
+    os.makedirs(directory, exist_ok=True)
+    _forecast_dir = directory
+    for (governorate, _crop_type, _zone), farm in get_farms().items():
+        farm.attach_forecast_snapshot(forecast_snapshot_path(governorate))
+
+
+def forecast_snapshot_path(governorate):
+    """Snapshot file of a governorate's forecast (None when snapshots are off)"""
+    if _forecast_dir is None:
+        return None
+    return os.path.join(_forecast_dir, f"forecast-{governorate.upper()}.npz")
+
+
+# ============================================================================
+# ROLLING SOIL MOISTURE STATISTICS (streaming, O(1) per sample)
+# ============================================================================
+
+class _MonotonicQueue:
+    """
+    Sequence numbers of window samples whose values are monotonic (rising
+    for a min queue, falling for a max queue), kept in a fixed-size ring;
+    the front is the window's min (or max).
+    """
+    
+    def __init__(self, capacity, values, keep_min):
+        self.capacity = capacity
+        self.values = values    # The stats' value ring, indexed by seq % capacity
+        self.keep_min = keep_min
+        self.seqs = array("q", bytes(8 * capacity))
+        self.head = 0
+        self.tail = 0
+    
+    def _value(self, pos):
+        return self.values[self.seqs[pos % self.capacity] % self.capacity]
+    
+    def push(self, seq, value):
+        while self.tail > self.head:
+            back = self._value(self.tail - 1)
+            if (back < value) if self.keep_min else (back > value):
+                break
+            self.tail -= 1
+        self.seqs[self.tail % self.capacity] = seq
+        self.tail += 1
+    
+    def expire(self, oldest_seq):
+        while self.tail > self.head and self.seqs[self.head % self.capacity] < oldest_seq:
+            self.head += 1
+    
+    def front(self):
+        return self._value(self.head) if self.tail > self.head else None
+
+
+class SoilMoistureStats:
+    """
+    Rolling soil moisture statistics for one zone, updated in O(1) per sample
+    
+    Keeps the samples of the last window_seconds in fixed-size arrays
+    (capacity samples; a sample arriving less than window_seconds / capacity
+    after the last stored one only updates the EWMA and latest value), so
+    memory never grows. Min and max come from monotonic queues, mean from a
+    running sum, the drying rate from running least-squares sums, and the
+    EWMA uses a time constant so irregular reporting intervals are fine.
+    """
+    
+    def __init__(self, window_seconds=86400.0, capacity=1440, ewma_seconds=3600.0):
+        """
+        Args:
+            window_seconds: Length of the rolling window (24h by default)
+            capacity: Maximum number of samples kept in the window
+            ewma_seconds: Time constant of the exponential moving average
+        """
+        self.window_seconds = float(window_seconds)
+        self.capacity = int(capacity)
+        self.ewma_seconds = float(ewma_seconds)
+        self.min_spacing = self.window_seconds / self.capacity
+        
+        self._times = array("d", bytes(8 * self.capacity))
+        self._values = array("d", bytes(8 * self.capacity))
+        self._head = 0      # seq of the oldest sample in the window
+        self._next = 0      # seq of the next sample
+        self._min = _MonotonicQueue(self.capacity, self._values, keep_min=True)
+        self._max = _MonotonicQueue(self.capacity, self._values, keep_min=False)
+        
+        # Running sums; times are hours since _origin to keep them small
+        self._origin = None
+        self._sum_x = self._sum_u = self._sum_uu = self._sum_ux = 0.0
+        
+        self.ewma = None
+        self.last_value = None
+        self.last_time = None
+        self.samples_seen = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def count(self):
+        """Samples currently in the window"""
+        with self._lock:
+            return self._size
+    
+    @property
+    def _size(self):
+        # Same as count, for callers already holding the lock
+        return self._next - self._head
+    
+    def _hours(self, t):
+        return (t - self._origin) / 3600.0
+    
+    def _add_sums(self, t, x, sign):
+        u = self._hours(t)
+        self._sum_x += sign * x
+        self._sum_u += sign * u
+        self._sum_uu += sign * u * u
+        self._sum_ux += sign * u * x
+    
+    def _rebase(self, origin):
+        """Move the time origin and recompute the sums (once per window at most)"""
+        self._origin = origin
+        self._sum_x = self._sum_u = self._sum_uu = self._sum_ux = 0.0
+        for seq in range(self._head, self._next):
+            i = seq % self.capacity
+            self._add_sums(self._times[i], self._values[i], 1)
+    
+    def _evict_oldest(self):
+        i = self._head % self.capacity
+        self._add_sums(self._times[i], self._values[i], -1)
+        self._head += 1
+    
+    def add(self, value, timestamp=None):
+        """
+        Add one sample
+        
+        Args:
+            value: Soil moisture reading
+            timestamp: Seconds since the epoch (defaults to now)
+        """
+        x = float(value)
+        t = time.time() if timestamp is None else float(timestamp)
+        with self._lock:
+            if self.last_time is not None and t < self.last_time:
+                t = self.last_time  # Out of order: treat as simultaneous
+            
+            if self.ewma is None:
+                self.ewma = x
+            else:
+                alpha = 1.0 - math.exp(-(t - self.last_time) / self.ewma_seconds)
+                self.ewma += alpha * (x - self.ewma)
+            self.last_value = x
+            self.last_time = t
+            self.samples_seen += 1
+            
+            if self._size and t - self._times[(self._next - 1) % self.capacity] < self.min_spacing:
+                return
+            
+            # Slide the window: drop samples that are too old, then make room
+            while self._size and t - self._times[self._head % self.capacity] > self.window_seconds:
+                self._evict_oldest()
+            if self._size == self.capacity:
+                self._evict_oldest()
+            self._min.expire(self._head)
+            self._max.expire(self._head)
+            
+            if self._origin is None or t - self._origin > 2 * self.window_seconds:
+                self._rebase(self._times[self._head % self.capacity] if self._size else t)
+            
+            seq = self._next
+            i = seq % self.capacity
+            self._times[i] = t
+            self._values[i] = x
+            self._next += 1
+            self._add_sums(t, x, 1)
+            self._min.push(seq, x)
+            self._max.push(seq, x)
+    
+    def minimum(self):
+        with self._lock:
+            return self._min.front()
+    
+    def maximum(self):
+        with self._lock:
+            return self._max.front()
+    
+    def mean(self):
+        with self._lock:
+            return self._sum_x / self._size if self._size else None
+    
+    def span_hours(self):
+        """Hours between the oldest and newest sample in the window"""
+        with self._lock:
+            if not self._size:
+                return 0.0
+            oldest = self._times[self._head % self.capacity]
+            newest = self._times[(self._next - 1) % self.capacity]
+            return (newest - oldest) / 3600.0
+    
+    def slope_per_hour(self, min_span_hours=1.0):
+        """
+        Least-squares trend of the window in moisture units per hour
+        (negative while the soil dries), or None with too little history
+        """
+        if self.span_hours() < min_span_hours:
+            return None
+        with self._lock:
+            n = self._size
+            denominator = n * self._sum_uu - self._sum_u * self._sum_u
+            if n < 3 or denominator <= 1e-12:
+                return None
+            return (n * self._sum_ux - self._sum_u * self._sum_x) / denominator
+    
+    def drying_rate_per_hour(self, min_span_hours=1.0):
+        """How fast moisture is dropping (positive while drying), or None"""
+        slope = self.slope_per_hour(min_span_hours)
+        return None if slope is None else -slope
+    
+    def snapshot(self):
+        """All statistics as a dict (for logging and decision context)"""
+        return {
+            "count": self.count,
+            "min": self.minimum(),
+            "max": self.maximum(),
+            "mean": self.mean(),
+            "ewma": self.ewma,
+            "last": self.last_value,
+            "slope_per_hour": self.slope_per_hour(),
+            "span_hours": self.span_hours(),
+        }
+
+
+# ============================================================================
+# WEATHER CACHE (background refresh, never blocks a sensor reading)
+# ============================================================================
+
+class WeatherCache:
+    """
+    TTL cache of weather snapshots keyed by governorate
+    
+    A daemon thread refreshes every registered governorate once its snapshot
+    is older than ttl_seconds. Readers always get the latest snapshot
+    immediately, together with its age, even while a refresh is running or
+    the network is down. With a batch_fetcher, all governorates that are
+    due together are refreshed with one call.
+    """
+    
+    def __init__(self, ttl_seconds=600, retry_seconds=30, batch_fetcher=None):
+        """
+        Args:
+            ttl_seconds: Refresh a snapshot once it is this old
+            retry_seconds: Wait this long before retrying a failed fetch
+            batch_fetcher: Optional callable(governorates) returning
+                {governorate: weather dict or None}, e.g. fetch_weather_batch
+        """
+        self.ttl_seconds = ttl_seconds
+        self.retry_seconds = retry_seconds
+        self.batch_fetcher = batch_fetcher
+        
+        self._lock = threading.Lock()
+        self._fetchers = {}     # governorate -> callable returning weather dict or None
+        self._snapshots = {}    # governorate -> (weather dict, time.time() of fetch)
+        self._next_fetch = {}   # governorate -> time.monotonic() of next attempt
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def register(self, governorate, fetcher):
+        """Start tracking a governorate; its first fetch happens right away in the background"""
+        with self._lock:
+            if governorate in self._fetchers:
+                return
+            self._fetchers[governorate] = fetcher
+            self._next_fetch[governorate] = 0.0
+        self._wake.set()
+    
+    def get(self, governorate):
+        """
+        Latest snapshot for a governorate
+        
+        Returns:
+            (dict or None, float or None): (weather_data, age_seconds),
+            (None, None) if nothing was fetched yet.
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(governorate)
+        if snapshot is None:
+            return None, None
+        weather, fetched_at = snapshot
+        return weather, max(0.0, time.time() - fetched_at)
+    
+    def age(self, governorate):
+        """Age of the governorate's snapshot in seconds (None if never fetched)"""
+        return self.get(governorate)[1]
+    
+    def refresh(self, governorate):
+        """Fetch one governorate now (blocking) and store the snapshot (see _store)"""
+        with self._lock:
+            fetcher = self._fetchers.get(governorate)
+        if fetcher is None:
+            return None
+        weather = fetcher()
+        self._store({governorate: weather})
+        return weather
+    
+    def refresh_many(self, governorates):
+        """Fetch several governorates now with one batch_fetcher call (blocking)"""
+        results = self.batch_fetcher(governorates)
+        self._store({g: results.get(g) for g in governorates})
+        return results
+    
+    def _store(self, results):
+        """
+        Keep the successful snapshots and schedule the next attempt for each governorate
+        
+        A weather dict with "forecast_age_seconds" was answered from an old
+        forecast because the fetch failed: it is kept with the forecast's
+        real age (unless a newer snapshot exists) and retried after
+        retry_seconds, like a failure.
+        """
+        now = time.monotonic()
+        wall_now = time.time()
+        with self._lock:
+            for governorate, weather in results.items():
+                if weather is None:
+                    self._next_fetch[governorate] = now + self.retry_seconds
+                elif "forecast_age_seconds" in weather:
+                    fetched_at = wall_now - weather["forecast_age_seconds"]
+                    previous = self._snapshots.get(governorate)
+                    if previous is None or previous[1] <= fetched_at:
+                        self._snapshots[governorate] = (weather, fetched_at)
+                    self._next_fetch[governorate] = now + self.retry_seconds
+                else:
+                    self._snapshots[governorate] = (weather, wall_now)
+                    self._next_fetch[governorate] = now + self.ttl_seconds
+    
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            with self._lock:
+                due = [g for g, t in self._next_fetch.items() if t <= now]
+            if len(due) > 1 and self.batch_fetcher is not None:
+                try:
+                    self.refresh_many(due)
+                except Exception as e:
+                    print(f"⚠️ Batched weather refresh failed: {e}")
+                    self._store(dict.fromkeys(due))
+                due = []
+            for governorate in due:
+                if self._stop.is_set():
+                    break
+                self.refresh(governorate)
+            with self._lock:
+                next_due = min(self._next_fetch.values(), default=now + self.ttl_seconds)
+            self._wake.wait(timeout=max(0.1, next_due - time.monotonic()))
+            self._wake.clear()
+    
+    def start(self):
+        """Start the background refresh thread (idempotent)"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="weather-cache", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Stop the background refresh thread"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+# Shared cache used by black_box() once enable_weather_cache() is called
+_weather_cache = None
+
+
+def enable_weather_cache(ttl_seconds=600):
+    """
+    Serve weather from a background-refreshed cache instead of calling the
+    API on every reading.
+    
+    Returns:
+        WeatherCache: The running shared cache.
+    """
+    global _weather_cache
+    if _weather_cache is None:
+        _weather_cache = WeatherCache(ttl_seconds=ttl_seconds, batch_fetcher=fetch_weather_batch)
+    else:
+        _weather_cache.ttl_seconds = ttl_seconds
+    _weather_cache.start()
+    for farm in get_farms().values():
+        farm.weather_cache = _weather_cache
+    return _weather_cache
+
+
+def get_weather_cache():
+    """The shared WeatherCache, or None when weather is fetched per reading."""
+    return _weather_cache
+
+
+# ============================================================================
+# DURABLE WATERING STATE (SQLite WAL, group-committed off the request path)
+# ============================================================================
+
+class WateringStateStore:
+    """
+    Per-zone watering state (daily_water_total, last_watering,
+    last_reset_date) in a WAL-mode SQLite database
+    
+    save() only records the latest state in memory; a background thread
+    writes everything that changed in one transaction every
+    commit_interval seconds, so readings never wait for an fsync. States
+    whose commit fails stay queued and are retried with the next one.
+    """
+    
+    def __init__(self, db_path, commit_interval=2.0):
+        """
+        Args:
+            db_path: SQLite database file (created if missing)
+            commit_interval: Seconds between group commits
+        """
+        self.db_path = db_path
+        self.commit_interval = commit_interval
+        self.commits = 0
+        self.rows_written = 0
+        
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints, no fsync per commit
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS watering_state ("
+            " zone TEXT PRIMARY KEY,"
+            " daily_water_total REAL NOT NULL,"
+            " last_watering TEXT,"
+            " last_reset_date TEXT,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+        
+        self._pending = {}      # zone -> latest state, coalesced between commits
+        self._pending_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="watering-state", daemon=True)
+        self._thread.start()
+    
+    def load(self, zone):
+        """
+        Saved state of a zone
+        
+        Returns:
+            dict or None: daily_water_total, last_watering (aware datetime
+            or None) and last_reset_date (date or None), or None if the zone
+            is unknown.
+        """
+        with self._pending_lock:
+            if zone in self._pending:
+                return dict(self._pending[zone])
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT daily_water_total, last_watering, last_reset_date"
+                " FROM watering_state WHERE zone = ?",
+                (zone,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "daily_water_total": row[0],
+            "last_watering": datetime.fromisoformat(row[1]) if row[1] else None,
+            "last_reset_date": date.fromisoformat(row[2]) if row[2] else None,
+        }
+    
+    def save(self, zone, state):
+        """Queue a zone's state for the next group commit (non-blocking)"""
+        with self._pending_lock:
+            self._pending[zone] = dict(state)
+    
+    def flush(self):
+        """
+        Write all queued states now, in one transaction
+        
+        If the commit fails the states are queued again (unless a newer
+        state of the same zone was saved meanwhile) and the error is raised.
+        """
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = time.time()
+        rows = [
+            (
+                zone,
+                state["daily_water_total"],
+                state["last_watering"].isoformat() if state["last_watering"] else None,
+                state["last_reset_date"].isoformat() if state["last_reset_date"] else None,
+                now,
+            )
+            for zone, state in pending.items()
+        ]
+        try:
+            with self._db_lock:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO watering_state"
+                        " (zone, daily_water_total, last_watering, last_reset_date, updated_at)"
+                        " VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT(zone) DO UPDATE SET"
+                        " daily_water_total = excluded.daily_water_total,"
+                        " last_watering = excluded.last_watering,"
+                        " last_reset_date = excluded.last_reset_date,"
+                        " updated_at = excluded.updated_at",
+                        rows,
+                    )
+        except Exception:
+            with self._pending_lock:
+                for zone, state in pending.items():
+                    self._pending.setdefault(zone, state)
+            raise
+        self.commits += 1
+        self.rows_written += len(rows)
+    
+    def _run(self):
+        while not self._stop.wait(self.commit_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Could not save watering state: {e}")
+    
+    def close(self):
+        """Stop the commit thread, write what is left and close the database"""
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+
+# Shared store used by the farm registry once enable_state_store() is called
+_state_store = None
+
+
+def enable_state_store(db_path, commit_interval=2.0):
+    """
+    Persist every registry farm's watering state in db_path and restore it
+    for farms created from now on (and the ones that already exist).
+    
+    Returns:
+        WateringStateStore: The shared store.
+    """
+    global _state_store
+    if _state_store is None:
+        _state_store = WateringStateStore(db_path, commit_interval=commit_interval)
+    for key, farm in get_farms().items():
+        if farm.state_store is None:
+            farm.attach_state_store(_state_store, zone_id_for(*key))
+    return _state_store
+
+
+def get_state_store():
+    """The shared WateringStateStore, or None when state is memory-only."""
+    return _state_store
+
+
+# ============================================================================
+# FARM REGISTRY (one long-lived TunisiaIrrigationSystem per farm)
+# ============================================================================
+
+# (governorate, crop_type, zone) -> TunisiaIrrigationSystem
+_farms = {}
+_farms_lock = threading.Lock()
+
+
+def get_farm(governorate, crop_type, zone=None):
+    """
+    Return the shared TunisiaIrrigationSystem for a zone, creating it once.
+    
+    Keeping the instance alive avoids rebuilding its tables and timezone on
+    every reading, and keeps daily_water_total / last_watering accumulating.
+    Each zone (sensor node) has its own instance, so its daily limit and
+    last watering are its own.
+    
+    Args:
+        governorate (str): Governorate name (e.g. "ZAGHOUAN")
+        crop_type (str): Crop name (e.g. "TOMATO")
+        zone (int, optional): Zone / node ID (None = the farm as a whole)
+    
+    Returns:
+        TunisiaIrrigationSystem: The farm for this (governorate, crop_type, zone).
+    """
+    key = (governorate.upper(), crop_type.upper(), zone)
+    farm = _farms.get(key)
+    if farm is not None:
+        return farm
+    with _farms_lock:
+        farm = _farms.get(key)
+        if farm is None:
+            farm = TunisiaIrrigationSystem(
+                governorate=key[0],
+                crop_type=key[1],
+                weather_cache=_weather_cache,
+            )
+            if _state_store is not None:
+                farm.attach_state_store(_state_store, zone_id_for(*key))
+            if _forecast_dir is not None:
+                farm.attach_forecast_snapshot(forecast_snapshot_path(key[0]))
+            _farms[key] = farm
+    return farm
+
+
+def zone_id_for(governorate, crop_type, zone=None):
+    """Key under which a registry farm's watering state is persisted ("ZAGHOUAN/TOMATO/3")."""
+    if zone is None:
+        return f"{governorate.upper()}/{crop_type.upper()}"
+    return f"{governorate.upper()}/{crop_type.upper()}/{zone}"
+
+
+def get_farms():
+    """All farms created so far, keyed by (governorate, crop_type, zone)."""
+    with _farms_lock:
+        return dict(_farms)
+
+
 # ============================================================================
 # USAGE EXAMPLE
 # ============================================================================
@@ -605,7 +1756,7 @@ if __name__ == "__main__":
     main()
 
 
-def black_box(governorate, crop_type, temp_from_arduino, soil_moisture_sensor):
+def black_box(governorate, crop_type, temp_from_arduino, soil_moisture_sensor, zone=None, drying_rate=None):
     """
     Black-box wrapper that uses the TunisiaIrrigationSystem to produce the
     model-ready outputs in a single call.
@@ -615,6 +1766,8 @@ def black_box(governorate, crop_type, temp_from_arduino, soil_moisture_sensor):
         crop_type (str): Crop name (e.g. "TOMATO")
         temp_from_arduino (float): Temperature in °C from Arduino
         soil_moisture_sensor (float): Soil moisture percent (0-100)
+        zone (int, optional): Zone of the reading (see generate_model_input)
+        drying_rate (float, optional): The zone's drying rate (%/h)
 
     Returns:
         tuple: (soil_type, region, temperature_bucket, weather_condition)
@@ -624,10 +1777,11 @@ def black_box(governorate, crop_type, temp_from_arduino, soil_moisture_sensor):
             - weather_condition: one of "NORMAL", "SUNNY", "WINDY", "RAINY"
     """
 
-    farm = TunisiaIrrigationSystem(governorate=governorate, crop_type=crop_type)
+    farm = get_farm(governorate, crop_type, zone)
 
-    # Use existing code path to build the model input (will also call weather API)
-    model_input, _ = farm.generate_model_input(temp_from_arduino, soil_moisture_sensor)
+    # Use existing code path to build the model input (weather comes from the
+    # shared cache when enabled, otherwise the API is called)
+    model_input, _ = farm.generate_model_input(temp_from_arduino, soil_moisture_sensor, zone, drying_rate)
 
     soil_type = model_input.get('SOIL_TYPE')
     region = model_input.get('REGION')
@@ -637,65 +1791,567 @@ def black_box(governorate, crop_type, temp_from_arduino, soil_moisture_sensor):
     return soil_type, region, temperature_bucket, weather_condition
 
 
-def predict_water_requirement(model_path, crop_type, soil_type, region, temperature, weather_condition):
+# ============================================================================
+# NUMPY-ONLY MODEL EVALUATOR (models exported by export_model.py)
+# ============================================================================
+
+EXPORT_FORMAT_VERSION = 1
+
+
+def _mmap_npz(npz_path):
+    """
+    Memory-map every array of an uncompressed .npz file.
+
+    numpy.load() cannot memory-map .npz members, but np.savez stores them
+    uncompressed, so each .npy member sits at a fixed offset in the file.
+
+    Args:
+        npz_path (str): Path to a .npz written with np.savez (not savez_compressed)
+
+    Returns:
+        dict: member name (without .npy) -> read-only numpy.memmap
     """
-    Loads the model, preprocesses inputs using one-hot encoding, and predicts water requirement.
+    arrays = {}
+    with zipfile.ZipFile(npz_path) as archive, open(npz_path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{npz_path}: {info.filename} is compressed, re-export without compression")
+            # Local file header: the name and extra field lengths can differ
+            # from the central directory, so read them from the header itself
+            f.seek(info.header_offset)
+            header = f.read(30)
+            if header[:4] != b'PK\x03\x04':
+                raise ValueError(f"{npz_path}: bad local header for {info.filename}")
+            name_length, extra_length = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            arrays[name] = np.memmap(
+                npz_path,
+                dtype=dtype,
+                mode='r',
+                offset=f.tell(),
+                shape=shape,
+                order='F' if fortran_order else 'C',
+            )
+    return arrays
+
+
+class ExportedModel:
     """
-    if not os.path.exists(model_path):
-        raise FileNotFoundError(f"Model file not found at: {model_path}")
+    A model exported to plain arrays, evaluated with NumPy only (no sklearn).
+
+    kind "forest": the nodes of every tree in flat arrays. Leaves point to
+    themselves with a +inf threshold, so all rows walk max_depth steps with
+    no masking. Tree outputs are added in estimator order and then divided
+    by the number of trees, exactly like RandomForestRegressor.predict, so
+    predictions are identical to the original model.
+
+    kind "linear": coef and intercept, predict = X @ coef + intercept.
+    """
+
+    def __init__(self, arrays):
+        """
+        Args:
+            arrays (dict): Arrays as written by export_model.py
+        """
+        # Plain ndarray views of the memmaps: same pages, no subclass overhead
+        arrays = {name: np.asarray(array) for name, array in arrays.items()}
+        version = int(arrays['format_version'][0])
+        if version != EXPORT_FORMAT_VERSION:
+            raise ValueError(f"Unsupported exported model version {version}")
+        self.kind = str(arrays['kind'][0])
+        self.n_features_in_ = int(arrays['n_features'][0])
+        self.feature_columns = [str(c) for c in arrays['feature_columns']]
+        if self.kind == 'forest':
+            self.roots = arrays['roots']
+            self.left = arrays['left']
+            self.right = arrays['right']
+            self.feature = arrays['feature']
+            self.threshold = arrays['threshold']
+            self.value = arrays['value']
+            self.max_depth = int(arrays['max_depth'][0])
+        elif self.kind == 'linear':
+            self.coef = arrays['coef']
+            self.intercept = float(arrays['intercept'][0])
+        else:
+            raise ValueError(f"Unknown exported model kind {self.kind!r}")
+
+    @classmethod
+    def load(cls, npz_path):
+        """Memory-map an exported .npz and return the model."""
+        return cls(_mmap_npz(npz_path))
+
+    def predict(self, X):
+        """
+        Args:
+            X: Feature matrix of shape (n_rows, n_features), FEATURE_COLUMNS order
+
+        Returns:
+            numpy.ndarray: float64 predictions, one per row
+        """
+        # sklearn trees compare float32 features against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got shape {X.shape}")
+        if self.kind == 'linear':
+            return X.astype(np.float64) @ self.coef + self.intercept
+
+        rows = np.arange(len(X))[:, None]
+        nodes = np.repeat(self.roots[None, :], len(X), axis=0)
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        leaf_values = self.value[nodes]
+        total = np.zeros(len(X), dtype=np.float64)
+        for tree in range(leaf_values.shape[1]):
+            total += leaf_values[:, tree]
+        return total / leaf_values.shape[1]
+
+
+# ============================================================================
+# MODEL CACHE (load once, reload only when the model file changes)
+# ============================================================================
+
+# model_path -> {"model", "signature", "sha256", "loaded_at"}
+_model_cache = {}
+_model_cache_lock = threading.Lock()
+_model_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "reloads": 0,
+    "last_load_seconds": 0.0,
+    "total_load_seconds": 0.0,
+}
+
+
+def _file_signature(model_path):
+    """Cheap change detector for the model file: (mtime_ns, size)."""
+    st = os.stat(model_path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _file_sha256(model_path):
+    """Content hash, only computed when the signature changes."""
+    digest = hashlib.sha256()
+    with open(model_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
 
-    # Load the model using joblib or pickle
-    model = None
+
+def _load_model_file(model_path):
+    """
+    Load the model from disk: exported .npz files are memory-mapped and
+    evaluated with NumPy only, anything else goes through joblib, falling
+    back to pickle.
+    """
+    if model_path.lower().endswith('.npz'):
+        return ExportedModel.load(model_path)
     try:
+        try:
+            import joblib
+        except ImportError:
+            joblib = None
         if joblib:
-            model = joblib.load(model_path)
-        else:
-            with open(model_path, 'rb') as f:
-                model = pickle.load(f)
-    except Exception as e:
+            return joblib.load(model_path)
+        with open(model_path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
         try:
             with open(model_path, 'rb') as f:
-                model = pickle.load(f)
+                return pickle.load(f)
         except Exception as pickle_e:
             raise RuntimeError(f"Failed to load model with both joblib and pickle. Error: {pickle_e}")
 
-    # Create a sample input DataFrame with all columns initialized to 0
-    sample_input = pd.DataFrame({
-        'CROP TYPE_BEAN': [0], 'CROP TYPE_CABBAGE': [0], 'CROP TYPE_CITRUS': [0],
-        'CROP TYPE_COTTON': [0], 'CROP TYPE_MAIZE': [0], 'CROP TYPE_MELON': [0],
-        'CROP TYPE_MUSTARD': [0], 'CROP TYPE_ONION': [0], 'CROP TYPE_POTATO': [0],
-        'CROP TYPE_RICE': [0], 'CROP TYPE_SOYABEAN': [0], 'CROP TYPE_SUGARCANE': [0],
-        'CROP TYPE_TOMATO': [0], 'CROP TYPE_WHEAT': [0], 'SOIL TYPE_HUMID': [0],
-        'SOIL TYPE_WET': [0], 'REGION_HUMID': [0], 'REGION_SEMI ARID': [0],
-        'REGION_SEMI HUMID': [0], 'TEMPERATURE_20-30': [0], 'TEMPERATURE_30-40': [0],
-        'TEMPERATURE_40-50': [0], 'WEATHER CONDITION_RAINY': [0],
-        'WEATHER CONDITION_SUNNY': [0], 'WEATHER CONDITION_WINDY': [0],
-    })
-
-    # One-hot encode the inputs
-    crop_col = f'CROP TYPE_{crop_type.upper()}'
-    if crop_col in sample_input.columns:
-        sample_input[crop_col] = 1
-
-    soil_col = f'SOIL TYPE_{soil_type.upper()}'
-    if soil_col in sample_input.columns:
-        sample_input[soil_col] = 1
-
-    region_col = f'REGION_{region.upper()}'
-    if region_col in sample_input.columns:
-        sample_input[region_col] = 1
-
-    temp_col = f'TEMPERATURE_{temperature}'
-    if temp_col in sample_input.columns:
-        sample_input[temp_col] = 1
-
-    weather_col = f'WEATHER CONDITION_{weather_condition.upper()}'
-    if weather_col in sample_input.columns:
-        sample_input[weather_col] = 1
-
-    # Make the prediction
-    prediction = model.predict(sample_input)
-    return prediction[0]
+
+def load_model(model_path):
+    """
+    Return the resident model for model_path, loading it on first use.
+
+    The file is stat()ed on every call. If its mtime or size changed, the
+    content hash is compared with the cached one and the model is only
+    unpickled again when the content really differs.
+
+    Args:
+        model_path (str): The full path to the .pkl model file, or an
+            .npz exported by export_model.py.
+
+    Returns:
+        The loaded model object.
+    """
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found at: {model_path}")
+
+    with _model_cache_lock:
+        signature = _file_signature(model_path)
+        entry = _model_cache.get(model_path)
+
+        if entry is not None and entry["signature"] == signature:
+            _model_cache_stats["hits"] += 1
+            return entry["model"]
+
+        sha256 = _file_sha256(model_path)
+        if entry is not None and entry["sha256"] == sha256:
+            # Touched or copied over with identical content: keep the model
+            entry["signature"] = signature
+            _model_cache_stats["hits"] += 1
+            return entry["model"]
+
+        _model_cache_stats["misses"] += 1
+        if entry is not None:
+            _model_cache_stats["reloads"] += 1
+
+        start = time.perf_counter()
+        model = _load_model_file(model_path)
+        elapsed = time.perf_counter() - start
+
+        _model_cache_stats["last_load_seconds"] = elapsed
+        _model_cache_stats["total_load_seconds"] += elapsed
+        _model_cache[model_path] = {
+            "model": model,
+            "signature": signature,
+            "sha256": sha256,
+            "loaded_at": time.time(),
+        }
+        return model
+
+
+def get_model_cache_stats():
+    """
+    Snapshot of the model cache counters.
+
+    Returns:
+        dict: hits, misses, reloads, last/total load time in seconds and
+        the list of resident model paths with their load timestamps.
+    """
+    with _model_cache_lock:
+        stats = dict(_model_cache_stats)
+        stats["resident"] = {
+            path: {"sha256": entry["sha256"], "loaded_at": entry["loaded_at"]}
+            for path, entry in _model_cache.items()
+        }
+    return stats
+
+
+def clear_model_cache():
+    """Drop every resident model; the next prediction reloads from disk."""
+    with _model_cache_lock:
+        _model_cache.clear()
+
+
+# ============================================================================
+# FEATURE ENCODING (one-hot, DataFrame-free)
+# ============================================================================
+
+# Categorical values the model was trained on. The first soil, region,
+# temperature and weather values are the dropped one-hot baselines.
+CROP_TYPES = [
+    "BEAN", "CABBAGE", "CITRUS", "COTTON", "MAIZE", "MELON", "MUSTARD",
+    "ONION", "POTATO", "RICE", "SOYABEAN", "SUGARCANE", "TOMATO", "WHEAT",
+]
+SOIL_TYPES = ["DRY", "HUMID", "WET"]
+REGIONS = ["DESERT", "SEMI ARID", "SEMI HUMID", "HUMID"]
+TEMPERATURE_BUCKETS = ["10-20", "20-30", "30-40", "40-50"]
+WEATHER_CONDITIONS = ["NORMAL", "SUNNY", "WINDY", "RAINY"]
+
+# Column order expected by the model (same order as during training)
+FEATURE_COLUMNS = [
+    'CROP TYPE_BEAN', 'CROP TYPE_CABBAGE', 'CROP TYPE_CITRUS',
+    'CROP TYPE_COTTON', 'CROP TYPE_MAIZE', 'CROP TYPE_MELON',
+    'CROP TYPE_MUSTARD', 'CROP TYPE_ONION', 'CROP TYPE_POTATO',
+    'CROP TYPE_RICE', 'CROP TYPE_SOYABEAN', 'CROP TYPE_SUGARCANE',
+    'CROP TYPE_TOMATO', 'CROP TYPE_WHEAT', 'SOIL TYPE_HUMID',
+    'SOIL TYPE_WET', 'REGION_HUMID', 'REGION_SEMI ARID',
+    'REGION_SEMI HUMID', 'TEMPERATURE_20-30', 'TEMPERATURE_30-40',
+    'TEMPERATURE_40-50', 'WEATHER CONDITION_RAINY',
+    'WEATHER CONDITION_SUNNY', 'WEATHER CONDITION_WINDY',
+]
+_FEATURE_INDEX = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+# Per input field: value -> column index (baselines have no column)
+_FIELD_COLUMNS = tuple(
+    {
+        value: _FEATURE_INDEX[f"{prefix}_{value}"]
+        for value in values
+        if f"{prefix}_{value}" in _FEATURE_INDEX
+    }
+    for prefix, values in (
+        ("CROP TYPE", CROP_TYPES),
+        ("SOIL TYPE", SOIL_TYPES),
+        ("REGION", REGIONS),
+        ("TEMPERATURE", TEMPERATURE_BUCKETS),
+        ("WEATHER CONDITION", WEATHER_CONDITIONS),
+    )
+)
+
+
+def encode_features(rows):
+    """
+    One-hot encode model inputs into a preallocated feature matrix.
+
+    Args:
+        rows: Iterable of (crop_type, soil_type, region, temperature,
+            weather_condition) tuples, as returned by black_box() plus the crop.
+
+    Returns:
+        numpy.ndarray: float32 matrix of shape (len(rows), 25), columns in
+        FEATURE_COLUMNS order. Unknown values leave their field all-zero,
+        like the baseline category.
+    """
+    rows = list(rows)
+    matrix = np.zeros((len(rows), len(FEATURE_COLUMNS)), dtype=np.float32)
+    row_idx = []
+    col_idx = []
+    for i, row in enumerate(rows):
+        for columns, value in zip(_FIELD_COLUMNS, row):
+            j = columns.get(str(value).upper())
+            if j is not None:
+                row_idx.append(i)
+                col_idx.append(j)
+    matrix[row_idx, col_idx] = 1.0
+    return matrix
+
+
+def predict_features(model, features):
+    """
+    model.predict() on an encoded feature matrix.
+
+    The model was fitted on a DataFrame; plain arrays are fine since the
+    column order above is fixed, so sklearn's feature-name warning is
+    silenced for this call only.
+    """
+    with warnings.catch_warnings():
+        warnings.filterwarnings(
+            "ignore",
+            message="X does not have valid feature names",
+            category=UserWarning,
+        )
+        return model.predict(features)
+
+
+def predict_water_requirement_batch(model_path, rows):
+    """
+    Predict the water requirement for many inputs with one model.predict call.
+
+    Args:
+        model_path (str): The full path to the .pkl model file.
+        rows: Iterable of (crop_type, soil_type, region, temperature,
+            weather_condition) tuples.
+
+    Returns:
+        numpy.ndarray: One predicted water requirement per row.
+    """
+    started = time.perf_counter()
+    model = load_model(model_path)
+    _observe_stage("model_load", started)
+    features = encode_features(rows)
+    if len(features) == 0:
+        return np.zeros(0)
+    started = time.perf_counter()
+    predictions = predict_features(model, features)
+    _observe_stage("predict", started)
+    return predictions
+
+
+def predict_water_requirement(model_path, crop_type, soil_type, region, temperature, weather_condition):
+    """
+    Gets the resident model, one-hot encodes the inputs and predicts water requirement.
+    """
+    predictions = predict_water_requirement_batch(
+        model_path,
+        [(crop_type, soil_type, region, temperature, weather_condition)],
+    )
+    return predictions[0]
+
+
+# ============================================================================
+# PRECOMPUTED PREDICTION TABLE (optional)
+# ============================================================================
+
+# All model inputs are categorical, so the whole input space is a small grid
+# (crops x soils x regions x temperatures x weathers). Evaluating it once
+# turns every later prediction into an array lookup.
+_TABLE_AXES = (CROP_TYPES, SOIL_TYPES, REGIONS, TEMPERATURE_BUCKETS, WEATHER_CONDITIONS)
+_TABLE_POSITIONS = tuple({value: i for i, value in enumerate(axis)} for axis in _TABLE_AXES)
+
+# Lookups check whether the model file changed at most this often (seconds);
+# a new model is picked up within this time
+PREDICTION_TABLE_CHECK_SECONDS = 5.0
+
+# Active table state; "table" stays None until enable_prediction_table()
+_prediction_table = {"model_path": None, "table_path": None, "sha256": None, "table": None, "checked_at": 0.0}
+_prediction_table_lock = threading.Lock()
+
+
+def _model_sha256(model_path):
+    """Content hash of the resident model (reloads it first if the file changed)."""
+    load_model(model_path)
+    with _model_cache_lock:
+        return _model_cache[model_path]["sha256"]
+
+
+def build_prediction_table(model_path):
+    """
+    Evaluate the model over the full categorical input grid.
+
+    Args:
+        model_path (str): The full path to the .pkl model file.
+
+    Returns:
+        numpy.ndarray: Predictions of shape (14, 3, 4, 4, 4), indexed in the
+        order of CROP_TYPES, SOIL_TYPES, REGIONS, TEMPERATURE_BUCKETS and
+        WEATHER_CONDITIONS.
+    """
+    rows = itertools.product(*_TABLE_AXES)
+    predictions = predict_water_requirement_batch(model_path, rows)
+    return np.asarray(predictions, dtype=np.float64).reshape([len(axis) for axis in _TABLE_AXES])
+
+
+def save_prediction_table(table_path, table, sha256):
+    """Write a prediction table and the hash of the model it was built from."""
+    with open(table_path, 'wb') as f:
+        np.savez(f, table=table, sha256=np.array(sha256))
+
+
+def load_prediction_table(table_path, sha256):
+    """
+    Read a saved prediction table.
+
+    Returns:
+        numpy.ndarray or None: The table, or None if the file is missing,
+        unreadable or was built from a different model.
+    """
+    if not table_path or not os.path.exists(table_path):
+        return None
+    try:
+        with np.load(table_path) as data:
+            if str(data["sha256"]) != sha256:
+                return None
+            table = data["table"]
+    except Exception as e:
+        print(f"⚠️ Could not read prediction table {table_path}: {e}")
+        return None
+    if table.shape != tuple(len(axis) for axis in _TABLE_AXES):
+        return None
+    return table
+
+
+def _refresh_prediction_table(model_path, table_path):
+    """(Re)build or load the table for the current model. Caller holds the lock."""
+    sha256 = _model_sha256(model_path)
+    table = load_prediction_table(table_path, sha256)
+    if table is None:
+        table = build_prediction_table(model_path)
+        if table_path:
+            save_prediction_table(table_path, table, sha256)
+    _prediction_table.update(
+        model_path=model_path, table_path=table_path, sha256=sha256, table=table,
+        checked_at=time.monotonic(),
+    )
+
+
+def enable_prediction_table(model_path, table_path=None):
+    """
+    Turn on table lookups for get_prediction_from_sensors().
+
+    The table is loaded from table_path when it matches the current model,
+    otherwise the model is evaluated over the whole grid (and the result
+    saved to table_path, if given).
+
+    Args:
+        model_path (str): The full path to the .pkl model file.
+        table_path (str, optional): Where to load/save the .npz table.
+    """
+    with _prediction_table_lock:
+        _refresh_prediction_table(model_path, table_path)
+
+
+def prediction_table_snapshot():
+    """
+    The enabled prediction table, to hand to use_prediction_table() in
+    another process.
+
+    Returns:
+        tuple or None: (model_path, table, sha256), or None if no table is
+        enabled.
+    """
+    with _prediction_table_lock:
+        if _prediction_table["table"] is None:
+            return None
+        return _prediction_table["model_path"], _prediction_table["table"], _prediction_table["sha256"]
+
+
+def use_prediction_table(model_path, table, sha256):
+    """
+    Turn on table lookups with a table built elsewhere (e.g. by the server
+    before it starts its inference workers): the model is not evaluated
+    over the grid and nothing is written to disk.
+
+    Args:
+        model_path (str): The full path to the .pkl model file.
+        table (numpy.ndarray): Table from build_prediction_table().
+        sha256 (str): Hash of the model the table was built from.
+
+    Raises:
+        ValueError: If the table has the wrong shape or was built from a
+        different model than the one at model_path.
+    """
+    table = np.asarray(table, dtype=np.float64)
+    if table.shape != tuple(len(axis) for axis in _TABLE_AXES):
+        raise ValueError(f"prediction table has shape {table.shape}")
+    if _model_sha256(model_path) != sha256:
+        raise ValueError("prediction table was built from a different model")
+    with _prediction_table_lock:
+        _prediction_table.update(
+            model_path=model_path, table_path=None, sha256=sha256, table=table,
+            checked_at=time.monotonic(),
+        )
+
+
+def disable_prediction_table():
+    """Go back to calling the model on every prediction."""
+    with _prediction_table_lock:
+        _prediction_table.update(model_path=None, table_path=None, sha256=None, table=None, checked_at=0.0)
+
+
+def lookup_prediction(model_path, crop_type, soil_type, region, temperature, weather_condition):
+    """
+    Look the prediction up in the precomputed table.
+
+    Every PREDICTION_TABLE_CHECK_SECONDS the model file is checked, and the
+    table rebuilt first if the model changed since it was made; other
+    lookups do not touch the file.
+
+    Returns:
+        float or None: The prediction, or None if the table is not enabled
+        for model_path or an input is outside the model's categories.
+    """
+    with _prediction_table_lock:
+        if _prediction_table["table"] is None or _prediction_table["model_path"] != model_path:
+            return None
+        try:
+            index = tuple(
+                positions[str(value).upper()]
+                for positions, value in zip(
+                    _TABLE_POSITIONS,
+                    (crop_type, soil_type, region, temperature, weather_condition),
+                )
+            )
+        except KeyError:
+            return None
+        now = time.monotonic()
+        if now - _prediction_table["checked_at"] >= PREDICTION_TABLE_CHECK_SECONDS:
+            _prediction_table["checked_at"] = now
+            if _model_sha256(model_path) != _prediction_table["sha256"]:
+                _refresh_prediction_table(model_path, _prediction_table["table_path"])
+        return _prediction_table["table"][index]
 
 
 def get_prediction_from_sensors(model_path, governorate, crop_type, temp_from_arduino, soil_moisture_sensor):
@@ -718,7 +2374,18 @@ def get_prediction_from_sensors(model_path, governorate, crop_type, temp_from_ar
         governorate, crop_type, temp_from_arduino, soil_moisture_sensor
     )
 
-    # Step 2: Use the generated features to get the water requirement prediction.
+    # Step 2: Use the precomputed table when enabled, else run the model.
+    water_requirement = lookup_prediction(
+        model_path,
+        crop_type,
+        soil_type,
+        region,
+        temperature,
+        weather_condition
+    )
+    if water_requirement is not None:
+        return water_requirement
+
     water_requirement = predict_water_requirement(
         model_path,
         crop_type,
@@ -730,6 +2397,43 @@ def get_prediction_from_sensors(model_path, governorate, crop_type, temp_from_ar
 
     return water_requirement
 
+
+def get_predictions_from_sensors_batch(model_path, rows):
+    """
+    Batch version of get_prediction_from_sensors().
+
+    Every row is converted with black_box(); rows found in the precomputed
+    table (when enabled) are answered from it, and all the others are
+    scored together with a single model.predict call.
+
+    Args:
+        model_path (str): The full path to the .pkl model file.
+        rows: Iterable of (governorate, crop_type, temp_from_arduino,
+            soil_moisture_sensor) tuples, optionally followed by the zone
+            and its drying rate (see black_box()).
+
+    Returns:
+        list[float]: One predicted water requirement per row, in order.
+    """
+    results = []
+    to_predict = []     # (position in results, model input row)
+    for governorate, crop_type, temp_from_arduino, soil_moisture_sensor, *zone in rows:
+        features = (crop_type,) + black_box(
+            governorate, crop_type, temp_from_arduino, soil_moisture_sensor, *zone
+        )
+        value = lookup_prediction(model_path, *features)
+        if value is None:
+            to_predict.append((len(results), features))
+        results.append(value)
+
+    if to_predict:
+        predictions = predict_water_requirement_batch(model_path, [f for _, f in to_predict])
+        for (position, _), value in zip(to_predict, predictions):
+            results[position] = value
+
+    return [float(value) for value in results]
+
+
 def calculate_pump_activation_time(water_volume_liters, pump_flow_rate_lpm=4.0):
     """
     Calculates the required pump activation time in milliseconds to deliver a specific volume of water.
@@ -0,0 +1,240 @@
+"""
+DS18B20 1-Wire temperature probes for raspberry.py (standard library only).
+
+Every '28-*' device under the 1-Wire sysfs directory is discovered and read
+concurrently by a background thread, so one slow probe (a conversion takes
+about 750 ms) never delays the others and nothing else waits on sysfs.
+Readings are kept per probe ID with the time they were taken; a probe can be
+mapped to a zone (the node id reporting from that bed) and temperature(zone)
+answers from memory, ignoring readings older than max_age_seconds.
+
+When the bus master supports it (therm_bulk_read, Linux 5.10+), one
+conversion is triggered for all probes at once and the results are read
+from each probe's 'temperature' file; otherwise each probe's 'w1_slave' is
+read in its own worker thread.
+
+The base directory is configurable, so a fake sysfs tree works too:
+
+  fake/28-000000000001/w1_slave   (two lines, as written by the kernel)
+  python3 raspberry.py --w1-dir fake --probe-zone 28-000000000001=3
+"""
+import concurrent.futures
+import glob
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_BASE_DIR = "/sys/bus/w1/devices"
+DS18B20_FAMILY = "28"
+
+# One successful read; read_at is time.monotonic(), timestamp is time.time()
+ProbeReading = namedtuple("ProbeReading", ["probe_id", "temperature_c", "read_at", "timestamp"])
+
+
+def discover_probes(base_dir: str = DEFAULT_BASE_DIR) -> dict[str, str]:
+    """Probe ID -> device directory for every DS18B20 under base_dir."""
+    probes = {}
+    for path in sorted(glob.glob(os.path.join(base_dir, DS18B20_FAMILY + "-*"))):
+        if os.path.isdir(path):
+            probes[os.path.basename(path)] = path
+    return probes
+
+
+def parse_w1_slave(text: str) -> float | None:
+    """Temperature in °C from w1_slave contents, or None if the CRC check failed."""
+    lines = text.splitlines()
+    if len(lines) < 2 or "YES" not in lines[0]:
+        return None
+    temp_pos = lines[1].find("t=")
+    if temp_pos == -1:
+        return None
+    return float(lines[1][temp_pos + 2:]) / 1000.0
+
+
+def read_probe(device_dir: str) -> float | None:
+    """Blocking read of one probe (waits for its conversion)."""
+    with open(os.path.join(device_dir, "w1_slave")) as f:
+        return parse_w1_slave(f.read())
+
+
+def parse_zone_map(pairs: list[str]) -> dict[str, int]:
+    """['28-0000abcd=3', ...] -> {'28-0000abcd': 3, ...}"""
+    zone_map = {}
+    for pair in pairs:
+        probe_id, sep, zone = pair.partition("=")
+        if not sep or not probe_id.strip():
+            raise ValueError(f"Expected PROBE_ID=ZONE, got {pair!r}")
+        zone_map[probe_id.strip()] = int(zone)
+    return zone_map
+
+
+class ProbeReader:
+    """
+    Reads every probe every interval_seconds in a background thread and
+    keeps the latest reading per probe.
+    """
+
+    def __init__(self, base_dir: str = DEFAULT_BASE_DIR, zone_map: dict[str, int] | None = None,
+                 interval_seconds: float = 30.0, max_age_seconds: float = 300.0, max_workers: int = 8):
+        self.base_dir = base_dir
+        self.zone_map = dict(zone_map or {})
+        self.interval_seconds = interval_seconds
+        self.max_age_seconds = max_age_seconds
+        self.max_workers = max_workers
+        self.probes = {}    # probe id -> device directory
+        self.readings = {}  # probe id -> ProbeReading
+        self.cycles = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+
+    def discover(self) -> dict[str, str]:
+        probes = discover_probes(self.base_dir)
+        added = set(probes) - set(self.probes)
+        removed = set(self.probes) - set(probes)
+        if added:
+            logging.info("1-Wire probes found: %s", ", ".join(sorted(added)))
+        if removed:
+            logging.warning("1-Wire probes gone: %s", ", ".join(sorted(removed)))
+        unmapped = sorted(set(self.zone_map) - set(probes))
+        if unmapped and (added or removed or not self.cycles):
+            logging.warning("Mapped 1-Wire probes not present: %s", ", ".join(unmapped))
+        self.probes = probes
+        return probes
+
+    # ---- Reading ----
+
+    def _bulk_read_path(self) -> str | None:
+        path = os.path.join(self.base_dir, "w1_bus_master1", "therm_bulk_read")
+        return path if os.path.exists(path) else None
+
+    def _bulk_convert(self, path: str) -> bool:
+        """Start one conversion on every probe and wait for it; False if unsupported."""
+        try:
+            with open(path, "w") as f:
+                f.write("trigger\n")
+            deadline = time.monotonic() + 2.0
+            while time.monotonic() < deadline:
+                with open(path) as f:
+                    if f.read().strip() != "-1":  # -1 = still converting
+                        return True
+                if self._stop.wait(0.05):
+                    return False
+        except OSError as e:
+            logging.debug("therm_bulk_read not usable: %s", e)
+        return False
+
+    @staticmethod
+    def _read_converted(device_dir: str) -> float | None:
+        with open(os.path.join(device_dir, "temperature")) as f:
+            return int(f.read().strip()) / 1000.0
+
+    def read_all(self) -> dict[str, ProbeReading]:
+        """Read every probe concurrently; returns (and stores) the new readings."""
+        probes = dict(self.probes)
+        if not probes:
+            return {}
+        read = read_probe
+        bulk_path = self._bulk_read_path()
+        if bulk_path is not None and self._bulk_convert(bulk_path):
+            read = self._read_converted
+        if self._executor is None:
+            # Sized for max_workers rather than the probes present now, so a
+            # probe plugged in later is still read in parallel; threads are
+            # only started as reads are submitted.
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, self.max_workers), thread_name_prefix="w1-read")
+
+        futures = {probe_id: self._executor.submit(read, path) for probe_id, path in probes.items()}
+        readings = {}
+        for probe_id, future in futures.items():
+            try:
+                temp_c = future.result()
+            except (OSError, ValueError) as e:
+                logging.warning("Could not read 1-Wire probe %s: %s", probe_id, e)
+                temp_c = None
+            if temp_c is None:
+                logging.warning("Failed to read probe %s. Keeping last known value.", probe_id)
+                continue
+            readings[probe_id] = ProbeReading(probe_id, temp_c, time.monotonic(), time.time())
+            logging.debug("Probe %s: %.2f°C", probe_id, temp_c)
+        with self._lock:
+            self.readings.update(readings)
+        self.cycles += 1
+        return readings
+
+    # ---- Lookups (never touch sysfs) ----
+
+    def fresh_readings(self) -> list[ProbeReading]:
+        now = time.monotonic()
+        with self._lock:
+            readings = list(self.readings.values())
+        if self.max_age_seconds <= 0:
+            return readings
+        return [r for r in readings if now - r.read_at <= self.max_age_seconds]
+
+    def temperature(self, zone: int | None = None) -> float | None:
+        """
+        Mean of the fresh readings of the probes mapped to zone. A zone
+        without a probe of its own (or zone None) gets the mean of every
+        fresh probe. None if no probe has a fresh reading.
+        """
+        readings = self.fresh_readings()
+        if zone is not None:
+            own = [r.temperature_c for r in readings if self.zone_map.get(r.probe_id) == zone]
+            if own:
+                return sum(own) / len(own)
+        values = [r.temperature_c for r in readings]
+        return sum(values) / len(values) if values else None
+
+    def status(self) -> dict[str, dict]:
+        """Probe id -> {'zone', 'temperature_c', 'age_seconds'} for logging."""
+        now = time.monotonic()
+        with self._lock:
+            readings = dict(self.readings)
+        return {
+            probe_id: {
+                "zone": self.zone_map.get(probe_id),
+                "temperature_c": readings[probe_id].temperature_c if probe_id in readings else None,
+                "age_seconds": round(now - readings[probe_id].read_at, 1) if probe_id in readings else None,
+            }
+            for probe_id in sorted(set(self.probes) | set(readings))
+        }
+
+    def log(self) -> None:
+        """Log each probe's zone, last temperature and age (stale ones as a warning)."""
+        for probe_id, info in self.status().items():
+            age = info["age_seconds"]
+            stale = age is None or (self.max_age_seconds > 0 and age > self.max_age_seconds)
+            logging.log(
+                logging.WARNING if stale else logging.INFO,
+                "Probe %s (zone %s): %s, %s",
+                probe_id,
+                "all" if info["zone"] is None else info["zone"],
+                "no reading" if info["temperature_c"] is None else f"{info['temperature_c']:.2f}°C",
+                "never read" if age is None else f"{age:.0f}s old" + (" (stale)" if stale else ""),
+            )
+
+    # ---- Background thread ----
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            self.discover()
+            self.read_all()
+            self._stop.wait(max(0.0, self.interval_seconds - (time.monotonic() - started)))
+
+    def start(self) -> "ProbeReader":
+        self._thread = threading.Thread(target=self._run, name="w1-probes", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,208 @@
+"""
+Local stand-in for the Open-Meteo forecast API.
+
+It answers GET /v1/forecast with the same JSON shape the real API returns
+for the fields the irrigation module asks for, so the weather code can be
+exercised without Internet access (on the bench, or on a Pi in the field).
+
+Point the AI module at it with the OPEN_METEO_URL environment variable:
+  python3 open_meteo_standin.py --port 8081 --delay 2
+  OPEN_METEO_URL=http://127.0.0.1:8081/v1/forecast python3 raspberry.py -v
+
+It can also be started from Python (e.g. from a benchmark):
+  with OpenMeteoStandIn(delay_seconds=0.5) as standin:
+      os.environ["OPEN_METEO_URL"] = standin.url
+"""
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Tunisia is UTC+1 all year (no daylight saving)
+TUNIS_UTC_OFFSET_SECONDS = 3600
+
+# Values returned for every location and hour unless overridden
+DEFAULT_WEATHER = {
+    "temperature_2m": 24.0,
+    "relative_humidity_2m": 55,
+    "precipitation": 0.0,
+    "weather_code": 0,
+    "wind_speed_10m": 3.0,
+}
+
+
+def _query_list(query: dict, key: str) -> list[str]:
+    """Open-Meteo accepts both repeated keys and comma-separated lists."""
+    values = []
+    for raw in query.get(key, []):
+        values.extend(v for v in raw.split(",") if v)
+    return values
+
+
+class OpenMeteoStandIn:
+    """A tiny threaded HTTP server that fakes the Open-Meteo forecast API."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 weather: dict | None = None, delay_seconds: float = 0.0,
+                 fail: bool = False):
+        """
+        Args:
+            host, port: Where to listen (port 0 picks a free port).
+            weather: Overrides for DEFAULT_WEATHER.
+            delay_seconds: Artificial latency added to every response.
+            fail: Answer every request with HTTP 503.
+        """
+        self.weather = dict(DEFAULT_WEATHER, **(weather or {}))
+        self.delay_seconds = delay_seconds
+        self.fail = fail
+        self.request_count = 0
+        self.connection_count = 0  # Fewer than request_count when clients reuse connections
+        self.locations_requested = 0
+        self._count_lock = threading.Lock()
+
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, like the real API (every response has a Content-Length)
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with standin._count_lock:
+                    standin.connection_count += 1
+
+            def do_GET(self):
+                standin._handle(self)
+
+            def log_message(self, fmt, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/forecast"
+
+    def _location_payload(self, lat: float, lon: float, query: dict) -> dict:
+        forecast_days = int(query.get("forecast_days", ["1"])[0])
+        tz = timezone(timedelta(seconds=TUNIS_UTC_OFFSET_SECONDS))
+        start = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+        hours = 24 * forecast_days
+
+        payload = {
+            "latitude": lat,
+            "longitude": lon,
+            "timezone": "Africa/Tunis",
+            "utc_offset_seconds": TUNIS_UTC_OFFSET_SECONDS,
+        }
+        current = _query_list(query, "current")
+        if current:
+            payload["current"] = {"time": datetime.now(tz).strftime("%Y-%m-%dT%H:%M")}
+            payload["current"].update({k: self.weather.get(k, 0) for k in current})
+        hourly = _query_list(query, "hourly")
+        if hourly:
+            payload["hourly"] = {
+                "time": [(start + timedelta(hours=h)).strftime("%Y-%m-%dT%H:%M") for h in range(hours)]
+            }
+            payload["hourly"].update({k: [self.weather.get(k, 0)] * hours for k in hourly})
+        return payload
+
+    def _handle(self, request: BaseHTTPRequestHandler) -> None:
+        with self._count_lock:
+            self.request_count += 1
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+
+        parsed = urlparse(request.path)
+        if parsed.path != "/v1/forecast":
+            request.send_error(404)
+            return
+        if self.fail:
+            request.send_error(503, "Stand-in configured to fail")
+            return
+
+        query = parse_qs(parsed.query)
+        try:
+            lats = [float(v) for v in _query_list(query, "latitude")]
+            lons = [float(v) for v in _query_list(query, "longitude")]
+        except ValueError:
+            request.send_error(400, "Invalid latitude/longitude")
+            return
+        if not lats or len(lats) != len(lons):
+            request.send_error(400, "latitude and longitude must have the same length")
+            return
+
+        with self._count_lock:
+            self.locations_requested += len(lats)
+        payloads = [self._location_payload(lat, lon, query) for lat, lon in zip(lats, lons)]
+        # Like the real API: a single location is an object, several are a list
+        body = json.dumps(payloads[0] if len(payloads) == 1 else payloads).encode("utf-8")
+        request.send_response(200)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self) -> "OpenMeteoStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "OpenMeteoStandIn":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Open-Meteo forecast API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before each response")
+    parser.add_argument("--fail", action="store_true", help="Answer every request with HTTP 503")
+    parser.add_argument("--precipitation", type=float, default=DEFAULT_WEATHER["precipitation"])
+    parser.add_argument("--wind", type=float, default=DEFAULT_WEATHER["wind_speed_10m"])
+    parser.add_argument("--weather-code", type=int, default=DEFAULT_WEATHER["weather_code"])
+    args = parser.parse_args()
+
+    standin = OpenMeteoStandIn(
+        args.host,
+        args.port,
+        weather={
+            "precipitation": args.precipitation,
+            "wind_speed_10m": args.wind,
+            "weather_code": args.weather_code,
+        },
+        delay_seconds=args.delay,
+        fail=args.fail,
+    )
+    standin.start()
+    print(f"Open-Meteo stand-in listening on {standin.url}")
+    print("Press Ctrl+C to exit.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.stop()
+        print(f"Served {standin.request_count} requests ({standin.locations_requested} locations) "
+              f"over {standin.connection_count} connections.")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Request-path profiling for raspberry.py (standard library only).
+
+Two collectors, both limited to a time window and/or a number of requests:
+
+- "cprofile": deterministic cProfile of every profiled request; writes a
+  .pstats file (python3 -m pstats FILE, snakeviz, flameprof, ...).
+- "sampling": a background thread samples the stacks of threads that are
+  busy with a request every few milliseconds; writes collapsed stacks
+  ("frame;frame;frame count" lines) for flamegraph.pl or speedscope.
+
+Sampling adds almost no overhead to the request itself, so it is the one to
+use under real load; cProfile gives exact call counts but slows every call.
+"""
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+MODES = ("cprofile", "sampling")
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of registered threads at a fixed interval."""
+
+    def __init__(self, interval_seconds: float = 0.005):
+        self.interval_seconds = interval_seconds
+        self.stacks = Counter()
+        self.samples = 0
+        self._lock = threading.Lock()
+        self._busy = {}  # thread id -> nesting depth
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enter(self) -> None:
+        tid = threading.get_ident()
+        with self._lock:
+            self._busy[tid] = self._busy.get(tid, 0) + 1
+
+    def exit(self) -> None:
+        tid = threading.get_ident()
+        with self._lock:
+            depth = self._busy.get(tid, 0) - 1
+            if depth > 0:
+                self._busy[tid] = depth
+            else:
+                self._busy.pop(tid, None)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            with self._lock:
+                busy = list(self._busy)
+            if not busy:
+                continue
+            frames = sys._current_frames()
+            for tid in busy:
+                frame = frames.get(tid)
+                if frame is not None:
+                    self.stacks[self._collapse(frame)] += 1
+                    self.samples += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfiler:
+    """
+    Profiles calls made through call() until duration_seconds have passed
+    or max_requests calls were profiled (whichever comes first), then writes
+    the output file. After that, call() just runs the function.
+    """
+
+    def __init__(self, mode: str, output_path: str, duration_seconds: float = 60.0,
+                 max_requests: int = 0, interval_seconds: float = 0.005):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.output_path = output_path
+        self.duration_seconds = duration_seconds
+        self.max_requests = max_requests
+        self.requests = 0
+        self.skipped = 0
+        self.active = False
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._written = False
+        self._started_at = 0.0
+        self._timer = None
+        self._local = threading.local()
+        self._profiles = []
+        self._sampler = SamplingProfiler(interval_seconds) if mode == "sampling" else None
+
+    def start(self) -> "RequestProfiler":
+        self._started_at = time.monotonic()
+        self.active = True
+        if self._sampler is not None:
+            self._sampler.start()
+        if self.duration_seconds > 0:
+            self._timer = threading.Timer(self.duration_seconds, self.finish)
+            self._timer.daemon = True
+            self._timer.start()
+        logging.info("Profiling (%s) started: %s", self.mode, self._limits())
+        return self
+
+    def _limits(self) -> str:
+        limits = []
+        if self.duration_seconds > 0:
+            limits.append(f"{self.duration_seconds:.0f}s")
+        if self.max_requests > 0:
+            limits.append(f"{self.max_requests} requests")
+        return " or ".join(limits) or "until shutdown"
+
+    def _thread_profile(self) -> cProfile.Profile:
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def call(self, func, *args):
+        """Run func(*args), profiled while the profiling window is open."""
+        with self._lock:
+            if not self.active:
+                return func(*args)
+            self._in_flight += 1
+        try:
+            if self._sampler is not None:
+                self._sampler.enter()
+                try:
+                    return func(*args)
+                finally:
+                    self._sampler.exit()
+            try:
+                profile = self._thread_profile()
+                profile.enable()
+            except ValueError:
+                # Another profiler is already active (e.g. a nested call)
+                self.skipped += 1
+                return func(*args)
+            try:
+                return func(*args)
+            finally:
+                profile.disable()
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self.requests += 1
+                limit_reached = self.max_requests > 0 and self.requests >= self.max_requests
+            if limit_reached:
+                self.finish()
+            else:
+                self._write_if_done()
+
+    def finish(self) -> None:
+        """Close the profiling window; output is written once in-flight requests finish."""
+        with self._lock:
+            self.active = False
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._sampler is not None:
+            self._sampler.stop()
+        self._write_if_done()
+
+    def _write_if_done(self) -> None:
+        with self._lock:
+            if self.active or self._in_flight or self._written:
+                return
+            self._written = True
+            profiles = list(self._profiles)
+        elapsed = time.monotonic() - self._started_at
+        try:
+            if self._sampler is not None:
+                self._sampler.write(self.output_path)
+                logging.warning(
+                    "Profiling done: %d requests, %d samples in %.1fs -> %s (collapsed stacks; "
+                    "render with flamegraph.pl or speedscope)",
+                    self.requests, self._sampler.samples, elapsed, self.output_path,
+                )
+            elif profiles:
+                stats = pstats.Stats(profiles[0])
+                for profile in profiles[1:]:
+                    stats.add(profile)
+                stats.dump_stats(self.output_path)
+                logging.warning(
+                    "Profiling done: %d requests in %.1fs -> %s (view with python3 -m pstats %s)",
+                    self.requests, elapsed, self.output_path, self.output_path,
+                )
+            else:
+                logging.warning("Profiling done: no requests were profiled in %.1fs", elapsed)
+        except OSError as e:
+            logging.error("Could not write profile to %s: %s", self.output_path, e)
+
+
+def default_output_path(mode: str) -> str:
+    """profile-YYYYmmdd-HHMMSS.pstats (cprofile) or .collapsed (sampling)."""
+    suffix = "pstats" if mode == "cprofile" else "collapsed"
+    return time.strftime(f"profile-%Y%m%d-%H%M%S.{suffix}")
@@ -20,13 +20,19 @@ import logging
 import socket
 import threading
 import time
-import glob
 import os
 import importlib.util
 import asyncio
 import uuid
 import sys
 import struct
+import concurrent.futures
+import multiprocessing
+import contextlib
+from typing import NamedTuple
+
+# Start of the optional-dependency imports below; reported as a startup phase
+_IMPORTS_STARTED_AT = time.perf_counter()
 
 # Optional BLE (server) support — guarded import so script still runs when unavailable
 BLE_AVAILABLE = False
@@ -54,16 +60,35 @@ except Exception as _adv_e:
     BLE_ADV_IMPORT_ERROR = str(_adv_e)
     BLE_ADV_AVAILABLE = False
 
+# Optional reading history store (needs numpy); imported by main() only
+# when --store-dir is given, so fallback-only runs never load numpy
+reading_store = None
+
+# Prometheus-style metrics, request profiling and 1-Wire probes (standard library only)
+import metrics
+import onewire
+import profiling
+
 # --- AI Model Configuration ---
-# Path to your irrigation model module and the trained model file
-MODULE_PATH = r"c:\Users\User\OneDrive\Desktop\wie\raspberry_programme\model_maa\import requests.py"
-MODEL_PATH = r"c:\Users\User\OneDrive\Desktop\wie\raspberry_programme\model_maa\crop_water_requirement_model (1).pkl"
+# Path to your irrigation model module and the trained model file. Override
+# with --module-path/--model-path or the IRRIGATION_MODULE_PATH and
+# IRRIGATION_MODEL_PATH environment variables.
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_PATH = os.environ.get(
+    "IRRIGATION_MODULE_PATH", os.path.join(SCRIPT_DIR, "model_AI", "import requests.py"))
+MODEL_PATH = os.environ.get(
+    "IRRIGATION_MODEL_PATH", os.path.join(SCRIPT_DIR, "model_AI", "crop_water_requirement_model (1).pkl"))
 
 # Inputs for the model
 GOVERNORATE = "ZAGHOUAN"
 CROP_TYPE = "TOMATO"
 
-# --- Global variable to hold the latest temperature reading ---
+# --- Temperature ---
+# Every DS18B20 probe is read in the background by temperature_probes
+# (onewire.ProbeReader, set by main()); _current_temperature(zone) answers
+# from its latest readings. current_temperature_c is only used in SIMULATION
+# mode, when no probe was found.
+temperature_probes = None
 current_temperature_c = None
 temp_lock = threading.Lock()
 
@@ -75,6 +100,79 @@ ble_humidity = 0
 ble_pump_state = "OFF"
 ble_pump_time_ms = 0
 
+# BLE updates are change-driven: update_ble_state() sets ble_changed only when
+# a value actually changed, and the BLE thread publishes after waiting
+#   - BLE_COALESCE_SECONDS, so a burst of decisions becomes one update,
+#   - at least BLE_MIN_INTERVAL_SECONDS since the previous update.
+# BLE_MAX_INTERVAL_SECONDS > 0 re-notifies every value at least that often
+# even without changes (0 = only on change). Set from the command line.
+ble_changed = threading.Event()
+BLE_COALESCE_SECONDS = 0.1
+BLE_MIN_INTERVAL_SECONDS = 1.0
+BLE_MAX_INTERVAL_SECONDS = 0.0
+
+# Latest reading and pump command per zone (the node_id of binary frames;
+# text-protocol nodes share zone 0), advertised by the Windows publisher.
+# Zones not heard from for BLE_ZONE_EXPIRY_SECONDS are dropped (0 = never).
+ble_zones = {}  # zone id -> (humidity, pump_time_ms, time.monotonic() last seen)
+BLE_ZONE_EXPIRY_SECONDS = 600.0
+
+# Multi-zone advertisement: a 5-byte header (sequence u8, zone count u16,
+# index of the first record u16) followed by 7-byte zone records (zone u16,
+# humidity u16, pump_time_ms u24; pump is ON when pump_time_ms > 0). A legacy
+# advertisement has room for 24 bytes of manufacturer data, i.e. 2 zones;
+# with more zones the advertiser rotates through them every
+# BLE_ADV_ROTATE_SECONDS. A single zone is still advertised with the 7-byte
+# '<HIB' payload, and since 5 + 7n is never 7 a scanner can tell the formats
+# apart by length.
+BLE_ADV_MAX_PAYLOAD = 24
+BLE_ADV_ROTATE_SECONDS = 1.0
+BLE_LEGACY_PAYLOAD_SIZE = struct.calcsize("<HIB")
+_BLE_ZONE_HEADER = struct.Struct("<BHH")
+_BLE_ZONE_RECORD = struct.Struct("<HH")  # followed by the 3-byte pump time
+BLE_ZONE_RECORD_SIZE = _BLE_ZONE_RECORD.size + 3
+BLE_ZONES_PER_FRAME = (BLE_ADV_MAX_PAYLOAD - _BLE_ZONE_HEADER.size) // BLE_ZONE_RECORD_SIZE
+BLE_MAX_ZONES = 0xFFFF  # Largest count the header can carry
+
+
+def ble_zone_frame_count(zone_count: int) -> int:
+    """Number of advertisement frames needed to carry zone_count zones."""
+    return max(1, -(-zone_count // BLE_ZONES_PER_FRAME))
+
+
+def build_ble_zone_frame(zones: list[tuple[int, int, int]], frame_index: int, seq: int) -> bytes:
+    """
+    Encode one frame of the multi-zone payload. zones is the full table as
+    sorted (zone, humidity, pump_time_ms) tuples; frame_index selects which
+    BLE_ZONES_PER_FRAME records this frame carries.
+    """
+    if len(zones) > BLE_MAX_ZONES:
+        raise ValueError(f"Cannot advertise {len(zones)} zones (at most {BLE_MAX_ZONES})")
+    first = (frame_index % ble_zone_frame_count(len(zones))) * BLE_ZONES_PER_FRAME
+    parts = [_BLE_ZONE_HEADER.pack(seq & 0xFF, len(zones), first)]
+    for zone, humidity, pump_time_ms in zones[first:first + BLE_ZONES_PER_FRAME]:
+        parts.append(_BLE_ZONE_RECORD.pack(zone & 0xFFFF, int(humidity) & 0xFFFF))
+        parts.append(max(0, min(int(pump_time_ms), 0xFFFFFF)).to_bytes(3, "little"))
+    return b"".join(parts)
+
+
+def expire_ble_zones(now: float | None = None) -> list[int]:
+    """
+    Drop the zones not heard from for BLE_ZONE_EXPIRY_SECONDS, so dead nodes
+    stop being advertised. Call with ble_lock held; returns the dropped ids.
+    """
+    if BLE_ZONE_EXPIRY_SECONDS <= 0:
+        return []
+    now = time.monotonic() if now is None else now
+    expired = [zone for zone, (_, _, seen) in ble_zones.items() if now - seen > BLE_ZONE_EXPIRY_SECONDS]
+    for zone in expired:
+        del ble_zones[zone]
+    if expired:
+        logging.info("BLE zones expired (no reading for %.0fs): %s",
+                     BLE_ZONE_EXPIRY_SECONDS, ", ".join(map(str, sorted(expired))))
+    return expired
+
+
 # Define UUIDs for our custom BLE service and characteristics
 # Using standard Environmental Sensing service UUID for base
 IRRIGATION_SERVICE_UUID = uuid.UUID("0000181A-0000-1000-8000-00805f9b34fb")
@@ -85,6 +183,33 @@ PUMP_STATE_CHAR_UUID = uuid.UUID("00000003-2d8b-4b47-8791-22489487a93b") # Custo
 PUMP_TIME_CHAR_UUID = uuid.UUID("00000004-2d8b-4b47-8791-22489487a93b")  # Custom UUID for Pump Time (ms)
 
 
+def wait_for_ble_change(stop_event: threading.Event, last_publish: float,
+                        refresh_seconds: float = 0.0) -> str | None:
+    """
+    Block until the BLE state should be published again.
+
+    Returns "change" when a value changed (after coalescing and the minimum
+    interval), "refresh" when BLE_MAX_INTERVAL_SECONDS (or refresh_seconds,
+    if shorter and > 0) passed without a change, or None once stop_event is
+    set. Nothing wakes up in between.
+    """
+    intervals = [i for i in (BLE_MAX_INTERVAL_SECONDS, refresh_seconds) if i > 0]
+    while not stop_event.is_set():
+        timeout = None
+        if intervals:
+            timeout = max(0.0, last_publish + min(intervals) - time.monotonic())
+        if not ble_changed.wait(timeout):
+            return "refresh"
+        if stop_event.is_set():
+            break
+        delay = max(BLE_COALESCE_SECONDS, last_publish + BLE_MIN_INTERVAL_SECONDS - time.monotonic())
+        if delay > 0 and stop_event.wait(delay):
+            break
+        ble_changed.clear()
+        return "change"
+    return None
+
+
 # --- BLE Server Implementation ---
 if BLE_AVAILABLE:
     class IrrigationService(BleakGATTService):
@@ -135,43 +260,52 @@ if BLE_AVAILABLE:
         # Correctly initialize BleakServer with keyword arguments
         async with BleakServer(services=[service], advertisement_data={"local_name": server_name}) as server:
             logging.info(f"BLE Server '{server_name}' running with service {service.uuid}")
-            
-            while not stop_event.is_set():
+            loop = asyncio.get_running_loop()
+
+            # Plant type is read-only and never changes: write it once
+            with ble_lock:
+                plant_type_val = ble_plant_type
+            plant_type_char = service.get_characteristic(PLANT_TYPE_CHAR_UUID)
+            await server.write_gatt_char(plant_type_char.uuid, plant_type_val.encode('utf-8'))
+
+            published = {}      # characteristic UUID -> last bytes written
+            reason = "refresh"  # Publish every value once at startup
+            while reason is not None:
                 # Get the latest data in a thread-safe way
                 with ble_lock:
                     humidity_val = ble_humidity
                     pump_state_val = ble_pump_state
-                    plant_type_val = ble_plant_type
                     pump_time_val = ble_pump_time_ms
 
-                # Get characteristic handles
-                plant_type_char = service.get_characteristic(PLANT_TYPE_CHAR_UUID)
-                humidity_char = service.get_characteristic(HUMIDITY_CHAR_UUID)
-                pump_state_char = service.get_characteristic(PUMP_STATE_CHAR_UUID)
-                pump_time_char = service.get_characteristic(PUMP_TIME_CHAR_UUID)
-
-                # Update characteristic values. Bleak handles the sending.
                 # For standard characteristics, data format may be important.
                 # Humidity (uint16, 0.01% steps)
-                humidity_ble_format = int(humidity_val * 100).to_bytes(2, 'little')
-                
-                # Use the characteristic's write_value method to update
-                await server.write_gatt_char(plant_type_char.uuid, plant_type_val.encode('utf-8'))
-                await server.write_gatt_char(humidity_char.uuid, humidity_ble_format)
-                await server.write_gatt_char(pump_state_char.uuid, pump_state_val.encode('utf-8'))
-                await server.write_gatt_char(pump_time_char.uuid, str(pump_time_val).encode('utf-8'))
-                
-                # Notify subscribers of changes
-                if server.is_connected:
+                values = {
+                    HUMIDITY_CHAR_UUID: int(humidity_val * 100).to_bytes(2, 'little'),
+                    PUMP_STATE_CHAR_UUID: pump_state_val.encode('utf-8'),
+                    PUMP_TIME_CHAR_UUID: str(pump_time_val).encode('utf-8'),
+                }
+
+                # Write (and notify) only the characteristics whose value changed;
+                # a refresh re-notifies everything
+                changed = [
+                    char_uuid for char_uuid, value in values.items()
+                    if reason == "refresh" or published.get(char_uuid) != value
+                ]
+                for char_uuid in changed:
+                    char = service.get_characteristic(char_uuid)
+                    await server.write_gatt_char(char.uuid, values[char_uuid])
+                    published[char_uuid] = values[char_uuid]
+                if changed and server.is_connected:
                     try:
-                        await server.notify_gatt_char(humidity_char.uuid)
-                        await server.notify_gatt_char(pump_state_char.uuid)
-                        await server.notify_gatt_char(pump_time_char.uuid)
+                        for char_uuid in changed:
+                            await server.notify_gatt_char(service.get_characteristic(char_uuid).uuid)
                     except Exception as e:
                         logging.warning(f"Could not notify BLE client: {e}")
+                if changed:
+                    logging.debug("BLE %s: updated %d characteristic(s)", reason, len(changed))
 
-                # Wait before next update
-                await asyncio.sleep(2)
+                # Sleep until the decision path changes something (or a refresh is due)
+                reason = await loop.run_in_executor(None, wait_for_ble_change, stop_event, time.monotonic())
                 
             logging.info("BLE Server shutting down.")
 
@@ -186,14 +320,23 @@ if BLE_AVAILABLE:
         finally:
             loop.close()
 else:
-    def _ble_adv_build_payload() -> bytes:
-        """Build a compact manufacturer payload: [hum_lo, hum_hi, pump_time(4 bytes LE), state(1)]."""
+    def _ble_adv_build_payload(frame_index: int = 0, seq: int = 0) -> tuple[bytes, int]:
+        """
+        Build the manufacturer payload and return it with the number of frames
+        needed for every zone. With at most one zone this is the compact
+        [hum_lo, hum_hi, pump_time(4 bytes LE), state(1)] payload; otherwise
+        frame frame_index of the multi-zone encoding.
+        """
         with ble_lock:
-            hum = int(ble_humidity) & 0xFFFF
-            ptime = int(ble_pump_time_ms) & 0xFFFFFFFF
-            state = 1 if ble_pump_state == "ON" else 0
-            # Pack little-endian: H I B
-            return struct.pack('<HIB', hum, ptime, state)
+            expire_ble_zones()
+            zones = sorted((zone, hum, ptime) for zone, (hum, ptime, _) in ble_zones.items())
+            if len(zones) <= 1:
+                hum = int(ble_humidity) & 0xFFFF
+                ptime = int(ble_pump_time_ms) & 0xFFFFFFFF
+                state = 1 if ble_pump_state == "ON" else 0
+                # Pack little-endian: H I B
+                return struct.pack('<HIB', hum, ptime, state), 1
+        return build_ble_zone_frame(zones, frame_index, seq), ble_zone_frame_count(len(zones))
 
     def _ble_windows_advertiser_thread(stop_event: threading.Event):
         if not BLE_ADV_AVAILABLE or sys.platform != 'win32':
@@ -217,10 +360,27 @@ else:
             pass
 
         # Start with an initial payload
-        def _update_payload():
+        current_payload = [None]
+        frame = {"index": 0, "count": 1, "seq": 0}
+
+        def _update_payload(rotate: bool = False):
+            if rotate and frame["count"] > 1:
+                frame["index"] = (frame["index"] + 1) % frame["count"]
+            payload, frame["count"] = _ble_adv_build_payload(frame["index"], frame["seq"])
+            # The sequence byte only changes when the rest of the frame does
+            multi_zone = len(payload) != BLE_LEGACY_PAYLOAD_SIZE
+            previous = current_payload[0]
+            if previous is not None and multi_zone and len(previous) == len(payload):
+                if payload[1:] == previous[1:]:
+                    return
+            elif payload == previous:
+                return
+            if multi_zone:
+                frame["seq"] = (frame["seq"] + 1) & 0xFF
+                payload = bytes([frame["seq"]]) + payload[1:]
+            current_payload[0] = payload
             md_list = publisher.advertisement.manufacturer_data
             md_list.clear()
-            payload = _ble_adv_build_payload()
             writer = DataWriter()
             # write_bytes expects a bytes-like object
             writer.write_bytes(payload)
@@ -239,11 +399,20 @@ else:
                 time.sleep(1)
             return
 
-        # Periodically refresh payload with latest values
+        # Rebuild the payload only when the decision path changed something or,
+        # with more zones than fit in one advertisement, to rotate to the next
+        # frame; the publisher keeps advertising the current one in between
         try:
-            while not stop_event.is_set():
-                _update_payload()
-                time.sleep(2)
+            last_publish = time.monotonic()
+            while True:
+                # Multi-zone payloads are also rebuilt to drop expired zones
+                multi_zone = len(current_payload[0]) != BLE_LEGACY_PAYLOAD_SIZE
+                rotate_seconds = BLE_ADV_ROTATE_SECONDS if multi_zone else 0.0
+                reason = wait_for_ble_change(stop_event, last_publish, rotate_seconds)
+                if reason is None:
+                    break
+                _update_payload(rotate=reason == "refresh")
+                last_publish = time.monotonic()
         finally:
             try:
                 publisher.stop()
@@ -255,98 +424,74 @@ else:
     def ble_server_thread(stop_event: threading.Event):
         _ble_windows_advertiser_thread(stop_event)
 
-# Dynamically import the irrigation module
-try:
-    spec = importlib.util.spec_from_file_location("irrigation_module", MODULE_PATH)
-    irrigation_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(irrigation_module)
-    logging.info("Successfully loaded AI model module.")
-except FileNotFoundError:
-    logging.error("AI model module not found at %s", MODULE_PATH)
-    irrigation_module = None
-except Exception as e:
-    logging.error("Failed to load AI model module: %s", e)
-    irrigation_module = None
+def load_irrigation_module(module_path: str):
+    """Dynamically import the irrigation module; returns None if it can't be loaded."""
+    try:
+        spec = importlib.util.spec_from_file_location("irrigation_module", module_path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        logging.info("Successfully loaded AI model module.")
+        return module
+    except FileNotFoundError:
+        logging.error("AI model module not found at %s", module_path)
+    except Exception as e:
+        logging.error("Failed to load AI model module: %s", e)
+    return None
+
+# The irrigation module is loaded by warm_up_ai() in the background once the
+# TCP server is accepting; until then readings use the fallback rule
+irrigation_module = None
 
 
 # --- Configuration ---
 HOST = "127.0.0.1"  # IP for the Pi to listen on (localhost for testing)
 PORT = 8000          # Port for the Pi to listen on
 DRY_THRESHOLD = 400     # Start watering if sensor value is BELOW this.
+SENSOR_RAW_MAX = 1023   # analogRead() full scale: the wettest reading
 
 # --------------------------- Logging setup ---------------------------------
 def setup_logging(verbosity: int) -> None:
-    level = logging.INFO if verbosity > 0 else logging.WARNING
+    if verbosity > 1:
+        level = logging.DEBUG
+    elif verbosity > 0:
+        level = logging.INFO
+    else:
+        level = logging.WARNING
     logging.basicConfig(
         level=level,
         format="[%(asctime)s] %(levelname)s: %(message)s",
         datefmt="%H:%M:%S",
+        force=True,  # Module-level log calls may already have configured the root logger
     )
 
 # ------------------------ Server Logic -------------------------------------
 
-def find_temp_sensor() -> str | None:
-    """Finds the path to the 1-Wire sensor's data file."""
-    # On non-Linux systems, this path won't exist.
-    if not sys.platform.startswith('linux'):
+def find_temp_sensors(base_dir: str = onewire.DEFAULT_BASE_DIR) -> dict[str, str]:
+    """Finds every DS18B20 probe (probe id -> device directory)."""
+    # On non-Linux systems, the sysfs path won't exist (a fake tree given with --w1-dir still works)
+    if not sys.platform.startswith('linux') and base_dir == onewire.DEFAULT_BASE_DIR:
         logging.info("Not on Linux. Skipping real temperature sensor search.")
-        return None
-    try:
-        # The base directory for 1-Wire devices
-        base_dir = '/sys/bus/w1/devices/'
-        # Find the folder starting with '28-' which is the family code for DS18B20
-        device_folder = glob.glob(base_dir + '28*')[0]
-        return device_folder + '/w1_slave'
-    except IndexError:
+        return {}
+    probes = onewire.discover_probes(base_dir)
+    if not probes:
         logging.error("DS18B20 sensor not found. Check wiring and 1-Wire config.")
-        return None
+    return probes
 
-def read_temp(sensor_path: str) -> float | None:
-    """Reads the temperature from the sensor file."""
-    try:
-        with open(sensor_path, 'r') as f:
-            lines = f.readlines()
-        
-        # Check for a valid reading
-        if not lines or 'YES' not in lines[0]:
-            return None
-        
-        # Find the temperature line and extract the value
-        temp_pos = lines[1].find('t=')
-        if temp_pos != -1:
-            temp_string = lines[1][temp_pos + 2:]
-            temp_c = float(temp_string) / 1000.0
-            return temp_c
-    except (IOError, IndexError):
-        logging.warning("Could not read from sensor at %s", sensor_path)
-        return None
-
-def temperature_monitor_thread(sensor_path: str | None, interval_seconds: int = 30):
-    """A thread that periodically reads temperature and updates a global variable."""
+def temperature_monitor_thread(interval_seconds: int = 30):
+    """SIMULATION mode (no probe found): keeps a constant temperature in the global variable."""
     global current_temperature_c
-    logging.info("Starting temperature monitor thread.")
-    
-    # If no sensor is found, run in simulation mode
-    if sensor_path is None:
-        logging.warning("Running temperature monitor in SIMULATION mode.")
-        while True:
-            with temp_lock:
-                current_temperature_c = 25.0  # Simulate a constant 25°C
-            logging.debug("Updated global temperature (simulated): %.2f°C", 25.0)
-            time.sleep(interval_seconds)
-
-    # If a sensor is found, run in normal mode
+    logging.warning("Running temperature monitor in SIMULATION mode.")
     while True:
-        temp_c = read_temp(sensor_path)
-        if temp_c is not None:
-            with temp_lock:
-                current_temperature_c = temp_c
-            logging.debug("Updated global temperature: %.2f°C", temp_c)
-        else:
-            logging.warning("Failed to read temperature. Keeping last known value.")
-        # Wait for the next reading
+        with temp_lock:
+            current_temperature_c = 25.0  # Simulate a constant 25°C
+        logging.debug("Updated global temperature (simulated): %.2f°C", 25.0)
         time.sleep(interval_seconds)
 
+def moisture_percent(sensor_value: int) -> float:
+    """Raw sensor value (0..SENSOR_RAW_MAX, higher is wetter) as soil moisture percent."""
+    return max(0.0, min(100.0, sensor_value * 100.0 / SENSOR_RAW_MAX))
+
+
 def calculate_pump_value(sensor_value: int) -> int:
     """
     Calculates a pump command value (0-100) based on the sensor reading.
@@ -374,100 +519,974 @@ def calculate_pump_value(sensor_value: int) -> int:
     return max(0, min(100, pump_value))
 
 
+def update_ble_state(soil_moisture_sensor: int, pump_time_ms: int, zone: int | None = None) -> None:
+    """
+    Publish the latest reading and pump command to the BLE globals and the
+    zone table (wakes the BLE thread on change). zone is the reporting
+    node's id; None (text protocol) is zone 0.
+    """
+    global ble_humidity, ble_pump_state, ble_pump_time_ms
+    pump_state = "ON" if pump_time_ms > 0 else "OFF"
+    zone = 0 if zone is None else zone
+    with ble_lock:
+        zone_changed = ble_zones.get(zone, ())[:2] != (soil_moisture_sensor, pump_time_ms)
+        ble_zones[zone] = (soil_moisture_sensor, pump_time_ms, time.monotonic())
+        if (ble_humidity, ble_pump_state, ble_pump_time_ms) == (soil_moisture_sensor, pump_state, pump_time_ms):
+            if zone_changed:
+                ble_changed.set()
+            return
+        ble_humidity = soil_moisture_sensor
+        ble_pump_state = pump_state
+        ble_pump_time_ms = pump_time_ms
+    ble_changed.set()
+
+
+# ------------------------ Inference worker pool ----------------------------
+
+def _inference_worker(worker_id: int, module_path: str, model_path: str, options: dict,
+                      request_queue, result_queue) -> None:
+    """
+    Worker process: loads the AI module and model once, then serves
+    prediction requests from request_queue until it receives None.
+
+    The prediction table, if any, comes ready-built from the parent in
+    options["prediction_table"]. Stage timings (weather, model_load,
+    predict) are sent back with each result for the parent's metrics.
+    """
+    logging.basicConfig(level=options.get("log_level", logging.WARNING),
+                        format=f"[%(asctime)s] worker {worker_id} %(levelname)s: %(message)s",
+                        datefmt="%H:%M:%S")
+    observed = []  # (stage, seconds) not yet sent to the parent
+    module = load_irrigation_module(module_path)
+    error = None
+    if module is None:
+        error = f"could not load {module_path}"
+    else:
+        module.set_stage_observer(lambda stage, seconds: observed.append((stage, seconds)))
+        try:
+            module.load_model(model_path)
+            if options.get("forecast_dir"):
+                module.enable_forecast_snapshots(options["forecast_dir"])
+            if options.get("weather_ttl", 0) > 0:
+                module.enable_weather_cache(ttl_seconds=options["weather_ttl"])
+            if options.get("prediction_table") is not None:
+                try:
+                    module.use_prediction_table(*options["prediction_table"])
+                except ValueError as e:
+                    logging.warning("Not using the prediction table: %s", e)
+        except Exception as e:
+            error = repr(e)
+    result_queue.put(("ready", worker_id, os.getpid(), error))
+
+    while True:
+        item = request_queue.get()
+        if item is None:
+            break
+        request_id, rows = item
+        start = time.perf_counter()
+        values = None
+        try:
+            if error is not None:
+                raise RuntimeError(error)
+            values = module.get_predictions_from_sensors_batch(model_path, rows)
+            failure = None
+        except Exception as e:
+            failure = repr(e)
+        stages = observed[:]
+        del observed[:len(stages)]
+        result_queue.put(("result", worker_id, request_id, values, failure, time.perf_counter() - start, stages))
+
+
+class InferenceWorkerPool:
+    """
+    Runs get_prediction_from_sensors in separate processes so the model,
+    weather lookups and their GIL time stay away from the socket and BLE
+    threads. Requests and results travel over multiprocessing queues; each
+    request is a list of (governorate, crop_type, temperature, moisture %,
+    zone, drying rate) rows.
+    """
+
+    def __init__(self, workers: int, module_path: str, model_path: str, options: dict | None = None):
+        ctx = multiprocessing.get_context("spawn")  # Don't fork a process full of threads
+        self._requests = ctx.Queue()
+        self._results = ctx.Queue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self.worker_stats = {
+            i: {"pid": None, "ready": False, "requests": 0, "rows": 0, "errors": 0,
+                "total_seconds": 0.0, "last_seconds": 0.0}
+            for i in range(workers)
+        }
+        self._processes = [
+            ctx.Process(
+                target=_inference_worker,
+                args=(i, module_path, model_path, options or {}, self._requests, self._results),
+                name=f"inference-{i}",
+                daemon=True,
+            )
+            for i in range(workers)
+        ]
+        for process in self._processes:
+            process.start()
+        self._collector = threading.Thread(target=self._collect_results, name="inference-results", daemon=True)
+        self._collector.start()
+
+    def _collect_results(self) -> None:
+        while True:
+            message = self._results.get()
+            if message is None:
+                break
+            if message[0] == "ready":
+                _, worker_id, pid, error = message
+                with self._lock:
+                    self.worker_stats[worker_id].update(pid=pid, ready=error is None)
+                if error:
+                    logging.error("Inference worker %d failed to start: %s", worker_id, error)
+                else:
+                    logging.info("Inference worker %d ready (pid %d)", worker_id, pid)
+                continue
+            _, worker_id, request_id, values, error, elapsed, stages = message
+            for stage, seconds in stages:
+                observe_stage(stage, seconds)
+            with self._lock:
+                future, rows = self._pending.pop(request_id, (None, 0))
+                stats = self.worker_stats[worker_id]
+                stats["requests"] += 1
+                stats["rows"] += rows
+                stats["total_seconds"] += elapsed
+                stats["last_seconds"] = elapsed
+                if error:
+                    stats["errors"] += 1
+            if future is None or future.done():
+                continue
+            if error:
+                future.set_exception(RuntimeError(f"Inference worker {worker_id}: {error}"))
+            else:
+                future.set_result(values)
+
+    def submit(self, rows: list[tuple]) -> concurrent.futures.Future:
+        """Queue rows for prediction; the future resolves to one value per row."""
+        future = concurrent.futures.Future()
+        with self._lock:
+            request_id = self._next_id
+            self._next_id += 1
+            self._pending[request_id] = (future, len(rows))
+        self._requests.put((request_id, list(rows)))
+        return future
+
+    def predict(self, governorate: str, crop_type: str, temperature: float, moisture: float,
+                timeout: float | None = None) -> float:
+        """Blocking single prediction (the calling thread waits without holding the GIL)."""
+        return self.submit([(governorate, crop_type, temperature, moisture)]).result(timeout)[0]
+
+    def queue_depth(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        with self._lock:
+            workers = {}
+            for worker_id, s in self.worker_stats.items():
+                workers[worker_id] = dict(s)
+                workers[worker_id]["avg_ms"] = (
+                    1000 * s["total_seconds"] / s["requests"] if s["requests"] else 0.0
+                )
+            return {"workers": len(self._processes), "queue_depth": len(self._pending), "per_worker": workers}
+
+    def log(self) -> None:
+        snap = self.stats()
+        logging.info("Inference pool: %d workers, %d requests queued", snap["workers"], snap["queue_depth"])
+        for worker_id, w in snap["per_worker"].items():
+            logging.info(
+                "  worker %d (pid %s): %d requests, %d errors, avg %.1f ms, last %.1f ms",
+                worker_id, w["pid"], w["requests"], w["errors"], w["avg_ms"], 1000 * w["last_seconds"],
+            )
+
+    def close(self, timeout: float = 5.0) -> None:
+        for _ in self._processes:
+            self._requests.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
+        self._collector.join(timeout)
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future, _ in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference pool closed"))
+
+
+# Set by main() when --inference-workers > 0; None means predict in-process
+inference_pool: InferenceWorkerPool | None = None
+INFERENCE_TIMEOUT_SECONDS = 30.0
+
+
+def _predict_rows_inline(rows: list[tuple]) -> concurrent.futures.Future:
+    """Score rows in this process with one vectorized model call."""
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(irrigation_module.get_predictions_from_sensors_batch(MODEL_PATH, rows))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _predict_rows(rows: list[tuple]) -> concurrent.futures.Future:
+    """Score rows on the worker pool if there is one, else in-process."""
+    if inference_pool is not None:
+        return inference_pool.submit(rows)
+    return _predict_rows_inline(rows)
+
+
+# ------------------------ Micro-batching scheduler -------------------------
+
+class PredictionBatcher:
+    """
+    Collects predictions requested by concurrent connections for up to
+    window_ms (or until max_batch rows are waiting), scores them with one
+    vectorized call and fans the results back out to the waiting readers.
+    A larger window means bigger batches and more throughput, at the cost
+    of up to window_ms extra latency per reading.
+    """
+
+    def __init__(self, window_ms: float = 10.0, max_batch: int = 32):
+        self.window_seconds = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._cond = threading.Condition()
+        self._pending = []      # (row, future)
+        self._closed = False
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self._thread = threading.Thread(target=self._run, name="prediction-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, row: tuple) -> concurrent.futures.Future:
+        """Queue one row built by request_prediction()."""
+        future = concurrent.futures.Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Prediction batcher closed")
+            self._pending.append((row, future))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return future
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            # Hold the window open from the first queued row, or until full
+            deadline = time.monotonic() + self.window_seconds
+            while len(self._pending) < self.max_batch and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return  # Closed and drained
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            futures = [future for _, future in batch]
+            try:
+                result = _predict_rows([row for row, _ in batch])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            result.add_done_callback(lambda done, futures=futures: self._fan_out(done, futures))
+
+    @staticmethod
+    def _fan_out(done: concurrent.futures.Future, futures: list) -> None:
+        error = done.exception()
+        if error is not None:
+            for future in futures:
+                future.set_exception(error)
+            return
+        for future, value in zip(futures, done.result()):
+            future.set_result(value)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch": self.rows / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+        }
+
+    def log(self) -> None:
+        snap = self.stats()
+        logging.info(
+            "Prediction batcher: %d batches, %d rows (avg %.1f, max %d per batch)",
+            snap["batches"], snap["rows"], snap["avg_batch"], snap["largest_batch"],
+        )
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=5)
+
+
+# Set by main() when --batch-window-ms > 0
+prediction_batcher: PredictionBatcher | None = None
+
+
+def _zone_drying_rate(node_id: int | None) -> float | None:
+    """The zone's drying rate (%/h) from its rolling statistics, None until 6h of history."""
+    try:
+        stats = irrigation_module.get_farm(GOVERNORATE, CROP_TYPE, node_id).moisture_stats_for(node_id)
+        return stats.drying_rate_per_hour(min_span_hours=6.0)
+    except Exception as e:
+        logging.debug("No drying rate for zone %s: %s", node_id, e)
+        return None
+
+
+def request_prediction(temp_from_pi: float, soil_moisture_sensor: int,
+                       node_id: int | None = None) -> concurrent.futures.Future:
+    """
+    Start a water requirement prediction for one reading. Goes through the
+    micro-batcher when enabled, else straight to the pool / in-process model.
+    The row carries the moisture in percent and the zone's drying rate, which
+    the soil type is classified from (worker processes don't see the stats).
+    """
+    row = (GOVERNORATE, CROP_TYPE, temp_from_pi, moisture_percent(soil_moisture_sensor),
+           node_id, _zone_drying_rate(node_id))
+    if prediction_batcher is not None:
+        return prediction_batcher.submit(row)
+    result = concurrent.futures.Future()
+    rows_future = _predict_rows([row])
+
+    def _first(done: concurrent.futures.Future) -> None:
+        if done.exception() is not None:
+            result.set_exception(done.exception())
+        else:
+            result.set_result(done.result()[0])
+    rows_future.add_done_callback(_first)
+    return result
+
+
+def _current_temperature(zone: int | None = None) -> float | None:
+    """Latest fresh temperature for the zone (a node id), or None if there is none."""
+    if temperature_probes is not None:
+        return temperature_probes.temperature(zone)
+    with temp_lock:
+        return current_temperature_c
+
+
+# Set by main() when --store-dir is given; keeps the history of every decision
+decision_store = None
+
+
+def decide_pump_time(soil_moisture_sensor: int, prediction: concurrent.futures.Future | None = None,
+                     node_id: int | None = None) -> int:
+    """
+    Watering decision for one reading: AI model if available, else the simple rule.
+    This blocks on the model (and possibly the weather API), so the asyncio
+    engine runs it in an executor. Pass a prediction already started with
+    request_prediction() to avoid asking for it again.
+    """
+    pump_time_ms = 0  # Always define a default
+    used_ai = False
+    water_req = None
+    temp_from_pi = _current_temperature(node_id)
+    if irrigation_module:
+        if temp_from_pi is None:
+            logging.warning("Temperature data is not available. Falling back to simple rule.")
+        else:
+            try:
+                # 1. Get water requirement prediction from the model
+                started = time.perf_counter()
+                if prediction is None:
+                    prediction = request_prediction(temp_from_pi, soil_moisture_sensor, node_id)
+                waited = not prediction.done()  # Already awaited by the caller otherwise
+                water_req = prediction.result(timeout=INFERENCE_TIMEOUT_SECONDS)
+                if waited:
+                    observe_stage("inference", time.perf_counter() - started)
+                if inference_pool is None:
+                    cache_stats = irrigation_module.get_model_cache_stats()
+                    logging.debug(
+                        "Model cache: %d hits, %d misses, %d reloads, last load %.3fs",
+                        cache_stats["hits"],
+                        cache_stats["misses"],
+                        cache_stats["reloads"],
+                        cache_stats["last_load_seconds"],
+                    )
+                logging.info("AI model predicted water requirement: %s", water_req)
+
+                # 2. Apply the farm's watering rules (daily limit, interval since
+                # the last watering, rain, midday) to the prediction
+                farm = irrigation_module.get_farm(GOVERNORATE, CROP_TYPE, node_id)
+                moisture = moisture_percent(soil_moisture_sensor)
+                _, context = farm.generate_model_input(temp_from_pi, moisture, zone=node_id,
+                                                       drying_rate=_zone_drying_rate(node_id))
+                should_water, amount, reason = farm.decide_watering(float(water_req), moisture, context)
+                logging.info("Watering rules: %s", reason)
+
+                # 3. Pump only what the rules allow, and count that as delivered
+                pump_time_ms = int(irrigation_module.calculate_pump_activation_time(amount)) if should_water else 0
+                used_ai = True
+                if pump_time_ms > 0:
+                    farm.record_watering(amount, context["timestamp"])
+                    logging.debug("Daily water total for %s: %.2fL", farm.governorate, farm.daily_water_total)
+                logging.info("-> AI calculated pump command: %d ms", pump_time_ms)
+            except Exception as e:
+                errors_counter.inc(kind="prediction")
+                logging.error("An error occurred during AI model prediction: %s", e)
+    decisions_counter.inc(source="ai" if used_ai else "fallback")
+    if not used_ai:
+        # Fallback to the old logic if the model isn't loaded or usable
+        fallback_percent = calculate_pump_value(soil_moisture_sensor)
+        pump_time_ms = max(pump_time_ms, int(fallback_percent * 100))  # simple ms estimate
+        logging.info("Fallback pump command: %d ms (from %d%%)", pump_time_ms, fallback_percent)
+
+    # Keep the zone's rolling moisture statistics (24h min/max/mean, EWMA,
+    # drying rate), in percent like every reader of them
+    if irrigation_module:
+        try:
+            farm = irrigation_module.get_farm(GOVERNORATE, CROP_TYPE, node_id)
+            farm.record_moisture(moisture_percent(soil_moisture_sensor), zone=node_id)
+            stats = farm.moisture_stats_for(node_id)
+            logging.debug("Zone %s moisture: ewma %.1f%%, drying rate %s%%/h over %d samples",
+                          node_id, stats.ewma, stats.drying_rate_per_hour(), stats.count)
+        except Exception as e:
+            logging.warning("Could not update moisture statistics: %s", e)
+
+    # Update BLE characteristics with the new data
+    update_ble_state(soil_moisture_sensor, pump_time_ms, node_id)
+
+    # Keep the history of readings and decisions
+    if decision_store is not None:
+        try:
+            decision_store.append(
+                node_id,
+                soil_moisture_sensor,
+                temp_from_pi,
+                float(water_req) if used_ai else None,
+                pump_time_ms,
+                reading_store.DECISION_AI if used_ai else reading_store.DECISION_FALLBACK,
+            )
+        except Exception as e:
+            errors_counter.inc(kind="store")
+            logging.warning("Could not store decision: %s", e)
+    return pump_time_ms
+
+
+def decide_pump_times(readings: list["SensorReading"],
+                      predictions: list[concurrent.futures.Future | None] | None = None) -> list[int]:
+    """
+    Decide every reading of a pipelined batch, in order. All predictions are
+    requested up front so pipelined readings share a batch, unless the caller
+    already started them (see await_predictions()). A reading whose decision
+    fails gets 0 (no watering) so each reading still gets exactly one reply.
+    """
+    if predictions is None:
+        predictions = [None] * len(readings)
+        if irrigation_module and len(readings) > 1:
+            for i, reading in enumerate(readings):
+                temp_from_pi = _current_temperature(reading.node_id)
+                if temp_from_pi is not None:
+                    predictions[i] = request_prediction(temp_from_pi, reading.value, reading.node_id)
+
+    pump_times = []
+    for reading, prediction in zip(readings, predictions):
+        try:
+            pump_times.append(decide_pump_time(reading.value, prediction, reading.node_id))
+        except Exception:
+            errors_counter.inc(kind="decision")
+            logging.exception("Error deciding watering for reading %d", reading.value)
+            pump_times.append(0)
+    return pump_times
+
+
+# ------------------------ Reading framing ----------------------------------
+
+RECV_BUFFER_SIZE = 4096  # Bytes per recv(); may hold many pipelined readings
+LISTEN_BACKLOG = 1024    # Pending connections queued by both engines (the kernel may cap it)
+
+class ReadingFramer:
+    """
+    Splits the TCP byte stream into newline-terminated readings.
+
+    Feed it whatever recv() returned (bytes or a memoryview); it returns every
+    complete reading and keeps a partial one for the next call. '\r' and
+    surrounding whitespace are ignored so both print("350\n") and println()
+    senders work.
+    """
+    MAX_LINE_BYTES = 64  # A longer unterminated line is garbage; drop it
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.malformed = 0
+
+    def feed(self, data) -> list[int]:
+        buf = self._buffer
+        buf += data
+        readings = []
+        start = 0
+        while True:
+            end = buf.find(b"\n", start)
+            if end < 0:
+                break
+            line = buf[start:end].strip()
+            start = end + 1
+            if not line:
+                continue
+            try:
+                readings.append(int(line))
+            except ValueError:
+                self.malformed += 1
+                logging.warning("Discarding malformed reading: %r", bytes(line))
+        if start:
+            del buf[:start]
+        if len(buf) > self.MAX_LINE_BYTES:
+            self.malformed += 1
+            logging.warning("Discarding %d bytes without a newline", len(buf))
+            buf.clear()
+        return readings
+
+    @property
+    def buffered(self) -> int:
+        """Bytes of an incomplete reading waiting for the rest of it."""
+        return len(self._buffer)
+
+
+def format_replies(pump_times: list[int]) -> bytes:
+    """One newline-terminated pump command per reading, in reading order."""
+    return "".join(f"{pump_time_ms}\n" for pump_time_ms in pump_times).encode('utf-8')
+
+
+class SensorReading(NamedTuple):
+    """One reading from a node, whichever protocol it arrived with."""
+    value: int                          # Moisture value used for the decision
+    node_id: int | None = None          # Binary protocol only
+    seq: int | None = None              # Binary protocol only
+    probes: tuple[int, int, int] | None = None  # Raw A5, A4, A3 values
+    node_timestamp: int | None = None   # Node clock (e.g. millis()), if sent
+
+    def describe(self) -> str:
+        if self.node_id is None:
+            return str(self.value)
+        return f"{self.value} (node {self.node_id}, seq {self.seq}, probes {self.probes})"
+
+
+# Binary protocol, version 1 (all fields little-endian):
+#   frame: magic 0xA5 | version u8 | flags u8 | node_id u16 | seq u16 |
+#          probe A5 u16 | probe A4 u16 | probe A3 u16 | [node_time u32]
+#   reply: magic 0xA5 | version u8 | node_id u16 | seq u16 | pump_time_ms u32
+# node_time is present when flags bit 0 is set. The text protocol never
+# starts with 0xA5, so the first byte of a connection selects the protocol.
+BINARY_MAGIC = 0xA5
+BINARY_VERSION = 1
+BINARY_FLAG_TIMESTAMP = 0x01
+_BINARY_FRAME = struct.Struct("<BBBHHHHH")
+_BINARY_TIMESTAMP = struct.Struct("<I")
+_BINARY_REPLY = struct.Struct("<BBHHI")
+
+
+class BinaryFrameDecoder:
+    """
+    Decodes binary sensor frames from the TCP byte stream with struct,
+    reading fields straight out of the receive buffer.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.malformed = 0
+
+    def feed(self, data) -> list[SensorReading]:
+        buf = self._buffer
+        buf += data
+        readings = []
+        offset = 0
+        while len(buf) - offset >= _BINARY_FRAME.size:
+            if buf[offset] != BINARY_MAGIC:
+                # Lost sync: skip to the next magic byte
+                self.malformed += 1
+                next_magic = buf.find(BINARY_MAGIC, offset + 1)
+                offset = next_magic if next_magic >= 0 else len(buf)
+                continue
+            _, version, flags, node_id, seq, p1, p2, p3 = _BINARY_FRAME.unpack_from(buf, offset)
+            if version != BINARY_VERSION:
+                self.malformed += 1
+                logging.warning("Unsupported binary frame version %d from node %d", version, node_id)
+                offset += 1
+                continue
+            size = _BINARY_FRAME.size
+            if flags & BINARY_FLAG_TIMESTAMP:
+                size += _BINARY_TIMESTAMP.size
+            if len(buf) - offset < size:
+                break  # Wait for the rest of the frame
+            node_timestamp = None
+            if flags & BINARY_FLAG_TIMESTAMP:
+                (node_timestamp,) = _BINARY_TIMESTAMP.unpack_from(buf, offset + _BINARY_FRAME.size)
+            readings.append(SensorReading(
+                value=(p1 + p2 + p3) // 3,  # Same average the sketch sends in text mode
+                node_id=node_id,
+                seq=seq,
+                probes=(p1, p2, p3),
+                node_timestamp=node_timestamp,
+            ))
+            offset += size
+        if offset:
+            del buf[:offset]
+        return readings
+
+    @property
+    def buffered(self) -> int:
+        """Bytes of an incomplete frame waiting for the rest of it."""
+        return len(self._buffer)
+
+
+class SensorProtocol:
+    """
+    Per-connection protocol handling. The first byte received decides
+    between the text protocol and the binary one; replies use the same
+    protocol as the readings.
+    """
+
+    def __init__(self):
+        self.mode = None  # "text" or "binary" once negotiated
+        self._decoder = None
+
+    @property
+    def malformed(self) -> int:
+        return self._decoder.malformed if self._decoder else 0
+
+    @property
+    def buffered(self) -> int:
+        return self._decoder.buffered if self._decoder else 0
+
+    def feed(self, data) -> list[SensorReading]:
+        if self.mode is None:
+            if not len(data):
+                return []
+            if data[0] == BINARY_MAGIC:
+                self.mode = "binary"
+                self._decoder = BinaryFrameDecoder()
+            else:
+                self.mode = "text"
+                self._decoder = ReadingFramer()
+        if self.mode == "binary":
+            return self._decoder.feed(data)
+        return [SensorReading(value) for value in self._decoder.feed(data)]
+
+    def format_replies(self, readings: list[SensorReading], pump_times: list[int]) -> bytes:
+        if self.mode != "binary":
+            return format_replies(pump_times)
+        return b"".join(
+            _BINARY_REPLY.pack(
+                BINARY_MAGIC,
+                BINARY_VERSION,
+                reading.node_id,
+                reading.seq,
+                max(0, min(pump_time_ms, 0xFFFFFFFF)),
+            )
+            for reading, pump_time_ms in zip(readings, pump_times)
+        )
+
+
+# ------------------------ Connection statistics ----------------------------
+
+STATS_INTERVAL_SECONDS = 60  # How often the servers log connection statistics
+
+def log_periodic_stats() -> None:
+    """Log connection statistics (and inference pool and temperature probe statistics, if any)."""
+    server_stats.log()
+    if inference_pool is not None:
+        inference_pool.log()
+    if prediction_batcher is not None:
+        prediction_batcher.log()
+    if temperature_probes is not None:
+        temperature_probes.log()
+
+class ConnectionStats:
+    """Counters for a single client connection."""
+
+    def __init__(self, addr):
+        self.addr = addr
+        self.connected_at = time.monotonic()
+        self.readings = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def readings_per_second(self) -> float:
+        elapsed = time.monotonic() - self.connected_at
+        return self.readings / elapsed if elapsed > 0 else 0.0
+
+
+class ServerStats:
+    """Connection counters shared by both server engines (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}
+        self.total_connections = 0
+        self.closed_readings = 0
+
+    def open(self, addr) -> ConnectionStats:
+        conn_stats = ConnectionStats(addr)
+        with self._lock:
+            self._active[id(conn_stats)] = conn_stats
+            self.total_connections += 1
+        return conn_stats
+
+    def close(self, conn_stats: ConnectionStats) -> None:
+        with self._lock:
+            if self._active.pop(id(conn_stats), None) is not None:
+                self.closed_readings += conn_stats.readings
+        logging.info(
+            "Connection %s closed: %d readings in %.0fs (%.2f readings/s, %d bytes in, %d bytes out)",
+            conn_stats.addr,
+            conn_stats.readings,
+            time.monotonic() - conn_stats.connected_at,
+            conn_stats.readings_per_second(),
+            conn_stats.bytes_in,
+            conn_stats.bytes_out,
+        )
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            active = list(self._active.values())
+            total_connections = self.total_connections
+            closed_readings = self.closed_readings
+        return {
+            "active_connections": len(active),
+            "total_connections": total_connections,
+            "total_readings": closed_readings + sum(c.readings for c in active),
+            "per_connection": {
+                str(c.addr): {"readings": c.readings, "readings_per_second": round(c.readings_per_second(), 3)}
+                for c in active
+            },
+        }
+
+    def log(self) -> None:
+        snap = self.snapshot()
+        logging.info(
+            "Server stats: %d active connections, %d total, %d readings",
+            snap["active_connections"],
+            snap["total_connections"],
+            snap["total_readings"],
+        )
+        for addr, conn in snap["per_connection"].items():
+            logging.debug("  %s: %d readings (%.2f/s)", addr, conn["readings"], conn["readings_per_second"])
+
+server_stats = ServerStats()
+
+
+# ------------------------ Metrics ------------------------------------------
+
+metrics_registry = metrics.MetricsRegistry()
+stage_seconds = metrics_registry.histogram(
+    "irrigation_stage_seconds",
+    "Time spent in each stage of answering a reading",
+    ["stage"],
+)
+readings_counter = metrics_registry.counter(
+    "irrigation_readings_total", "Sensor readings received", ["protocol"])
+decisions_counter = metrics_registry.counter(
+    "irrigation_decisions_total", "Watering decisions by source (ai or fallback)", ["source"])
+errors_counter = metrics_registry.counter(
+    "irrigation_errors_total", "Errors by kind", ["kind"])
+metrics_registry.gauge(
+    "irrigation_active_connections", "Connected sensor nodes", function=lambda: server_stats.active_count())
+metrics_registry.gauge(
+    "irrigation_inference_queue_depth", "Predictions waiting for a worker process",
+    function=lambda: inference_pool.queue_depth() if inference_pool is not None else 0)
+
+
+# Per-thread stage breakdown of the request being decided (see run_request)
+_request_stages = threading.local()
+
+# Set by main(): --profile collector, and --slow-request-ms threshold in seconds
+request_profiler: profiling.RequestProfiler | None = None
+SLOW_REQUEST_SECONDS: float | None = None
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    """Record one stage timing (also used as the AI module's stage observer)."""
+    stage_seconds.observe(seconds, stage=stage)
+    breakdown = getattr(_request_stages, "breakdown", None)
+    if breakdown is not None:
+        breakdown[stage] = breakdown.get(stage, 0.0) + seconds
+
+
+def run_request(func, *args) -> tuple:
+    """
+    Run the decision step of a request: profiled while --profile is active,
+    and with the stages observed on this thread (inference, weather,
+    model_load, predict) collected. Returns (result, {stage: seconds}).
+    """
+    _request_stages.breakdown = breakdown = {}
+    try:
+        if request_profiler is not None:
+            return request_profiler.call(func, *args), breakdown
+        return func(*args), breakdown
+    finally:
+        _request_stages.breakdown = None
+
+
+class ReadingTimings:
+    """
+    Per-connection stage timer used by both server engines.
+
+    Stages: socket_read (first byte of a reading until the recv() that
+    completed it; 0 when it arrived in one segment), parse, decide, send,
+    and reply (first byte of a reading until its reply was sent). Waiting
+    for a node's next reading is not counted.
+    """
+
+    def __init__(self, protocol: "SensorProtocol", addr=None):
+        self.protocol = protocol
+        self.addr = addr
+        self._readings = 0
+        self._inner_stages = {}
+        self._first_byte_at = None
+        self._received_at = 0.0
+        self._parsed_at = 0.0
+        self._decided_at = 0.0
+        self._reading_started = 0.0
+        self._malformed = 0
+
+    def received(self) -> None:
+        self._received_at = time.perf_counter()
+        if self._first_byte_at is None:
+            self._first_byte_at = self._received_at
+
+    def parsed(self, readings: list) -> None:
+        self._parsed_at = time.perf_counter()
+        observe_stage("parse", self._parsed_at - self._received_at)
+        if self.protocol.malformed != self._malformed:
+            errors_counter.inc(self.protocol.malformed - self._malformed, kind="malformed")
+            self._malformed = self.protocol.malformed
+        if not readings:
+            return
+        self._readings = len(readings)
+        readings_counter.inc(len(readings), protocol=self.protocol.mode)
+        observe_stage("socket_read", self._received_at - self._first_byte_at)
+        self._reading_started = self._first_byte_at
+        # Bytes left over belong to a reading that started in this segment
+        self._first_byte_at = self._received_at if self.protocol.buffered else None
+
+    def decided(self, inner_stages: dict | None = None) -> None:
+        self._decided_at = time.perf_counter()
+        self._inner_stages = inner_stages or {}
+        observe_stage("decide", self._decided_at - self._parsed_at)
+
+    def sent(self) -> None:
+        sent_at = time.perf_counter()
+        observe_stage("send", sent_at - self._decided_at)
+        total = sent_at - self._reading_started
+        observe_stage("reply", total)
+        if SLOW_REQUEST_SECONDS is not None and total >= SLOW_REQUEST_SECONDS:
+            self._log_slow(total, sent_at)
+
+    def _log_slow(self, total: float, sent_at: float) -> None:
+        inner = ", ".join(f"{stage} {seconds * 1000:.1f}" for stage, seconds in self._inner_stages.items())
+        logging.warning(
+            "Slow reply to %s: %.1f ms for %d reading(s) "
+            "(socket_read %.1f, parse %.1f, decide %.1f%s, send %.1f ms)",
+            self.addr, total * 1000, self._readings,
+            (self._received_at - self._reading_started) * 1000,
+            (self._parsed_at - self._received_at) * 1000,
+            (self._decided_at - self._parsed_at) * 1000,
+            f" [{inner}]" if inner else "",
+            (sent_at - self._decided_at) * 1000,
+        )
+
+
+# ------------------------ Thread-per-client engine -------------------------
+
 def handle_client(conn: socket.socket, addr: tuple) -> None:
     """
     This function runs in a thread for each connected client.
     """
     logging.info("Client connected: %s", addr)
-    buffer = ""
+    conn_stats = server_stats.open(addr)
+    protocol = SensorProtocol()
+    timings = ReadingTimings(protocol, addr)
+    recv_buffer = bytearray(RECV_BUFFER_SIZE)
+    recv_view = memoryview(recv_buffer)
     try:
         while True:
-            # Read data from the Arduino
-            data = conn.recv(64)
-            if not data:
+            # Read data from the Arduino (reusing one buffer, no per-recv allocation)
+            nbytes = conn.recv_into(recv_buffer)
+            if not nbytes:
                 logging.warning("Client %s disconnected.", addr)
                 break
+            conn_stats.bytes_in += nbytes
+            timings.received()
 
-            # The Arduino sends raw numbers as strings, e.g., b'350'
-            buffer += data.decode('utf-8', errors='ignore')
-            
-            # Process buffer for complete numbers
-            try:
-                soil_moisture_sensor = int(buffer)
-                logging.info("<- Received soil moisture: %d from %s", soil_moisture_sensor, addr)
-                buffer = "" # Clear buffer after successful parse
-
-                # --- Watering Decision Logic (AI if available, else fallback) ---
-                pump_time_ms = 0  # Always define a default
-                used_ai = False
-                if irrigation_module:
-                    with temp_lock:
-                        temp_from_pi = current_temperature_c
-                    if temp_from_pi is None:
-                        logging.warning("Temperature data is not available. Falling back to simple rule.")
-                    else:
-                        try:
-                            # 1. Get water requirement prediction from the model
-                            water_req = irrigation_module.get_prediction_from_sensors(
-                                MODEL_PATH,
-                                GOVERNORATE,
-                                CROP_TYPE,
-                                temp_from_pi,
-                                soil_moisture_sensor
-                            )
-                            logging.info("AI model predicted water requirement: %s", water_req)
-
-                            # 2. Calculate the pump activation time based on the prediction
-                            pump_time_ms = int(irrigation_module.calculate_pump_activation_time(water_req))
-                            used_ai = True
-                            logging.info("-> AI calculated pump command: %d ms", pump_time_ms)
-                        except Exception as e:
-                            logging.error("An error occurred during AI model prediction: %s", e)
-                if not used_ai:
-                    # Fallback to the old logic if the model isn't loaded or usable
-                    fallback_percent = calculate_pump_value(soil_moisture_sensor)
-                    pump_time_ms = max(pump_time_ms, int(fallback_percent * 100))  # simple ms estimate
-                    logging.info("Fallback pump command: %d ms (from %d%%)", pump_time_ms, fallback_percent)
-
-                # Update BLE characteristics with the new data
-                with ble_lock:
-                    ble_humidity = soil_moisture_sensor
-                    ble_pump_state = "ON" if pump_time_ms > 0 else "OFF"
-                    ble_pump_time_ms = pump_time_ms
+            # The Arduino sends newline-terminated numbers (e.g. b'350\r\n')
+            # or binary frames; one recv may hold several readings, or only
+            # part of one
+            readings = protocol.feed(recv_view[:nbytes])
+            timings.parsed(readings)
+            if not readings:
+                continue
+            for reading in readings:
+                logging.info("<- Received soil moisture: %s from %s", reading.describe(), addr)
 
-                # Send the command back to the Arduino as a string with a newline
-                conn.sendall(f"{pump_time_ms}\n".encode('utf-8'))
+            # --- Watering Decision Logic (AI if available, else fallback) ---
+            pump_times, stages = run_request(decide_pump_times, readings)
+            timings.decided(stages)
 
-            except (ValueError, TypeError):
-                # Buffer doesn't contain a full number yet, wait for more data
-                logging.debug("Incomplete data in buffer: '%s'", buffer)
-                continue
-            except Exception:
-                logging.exception("Error processing data from %s", addr)
+            # Pipelined replies: one pump command per reading, sent together
+            reply = protocol.format_replies(readings, pump_times)
+            conn.sendall(reply)
+            timings.sent()
+            conn_stats.readings += len(readings)
+            conn_stats.bytes_out += len(reply)
 
     except ConnectionResetError:
         logging.warning("Connection reset by client %s", addr)
     except Exception:
+        errors_counter.inc(kind="connection")
         logging.exception("An error occurred with client %s", addr)
     finally:
         logging.info("Closing connection for %s", addr)
+        server_stats.close(conn_stats)
         conn.close()
 
 
-def run_tcp_server(host: str, port: int, stop_event: threading.Event):
+def run_tcp_server(host: str, port: int, stop_event: threading.Event,
+                   ready_event: threading.Event | None = None):
     """
     Starts the main TCP server and listens for incoming connections.
+    ready_event is set once the socket is accepting (or failed to open).
     """
     server_socket = None
     try:
         server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         server_socket.bind((host, port))
-        server_socket.listen(5)
+        server_socket.listen(LISTEN_BACKLOG)
         server_socket.settimeout(1.0) # Timeout to allow checking stop_event
         logging.info(f"TCP Server listening on {host}:{port}")
+        if ready_event is not None:
+            ready_event.set()
 
+        last_stats = time.monotonic()
         while not stop_event.is_set():
+            if time.monotonic() - last_stats >= STATS_INTERVAL_SECONDS:
+                log_periodic_stats()
+                last_stats = time.monotonic()
             try:
                 client_socket, addr = server_socket.accept()
                 client_handler = threading.Thread(target=handle_client, args=(client_socket, addr), daemon=True)
@@ -477,28 +1496,417 @@ def run_tcp_server(host: str, port: int, stop_event: threading.Event):
     except Exception as e:
         logging.error(f"An error occurred in TCP server: {e}")
     finally:
+        if ready_event is not None:
+            ready_event.set()
         if server_socket:
             server_socket.close()
         logging.info("TCP Server has shut down.")
 
+
+# ------------------------ asyncio engine -----------------------------------
+
+async def await_predictions(readings: list["SensorReading"]) -> list[concurrent.futures.Future | None] | None:
+    """
+    Start the predictions of a request on the micro-batcher (or worker pool)
+    and wait for them on the event loop, so no executor thread is held while
+    rows wait for their batch and every connection's rows can join it.
+    Returns done futures for decide_pump_times(), or None when predictions
+    would run in-process (blocking) and have to stay in the executor.
+    """
+    if not irrigation_module or (prediction_batcher is None and inference_pool is None):
+        return None
+    started = time.perf_counter()
+    predictions = [None] * len(readings)
+    for i, reading in enumerate(readings):
+        temp_from_pi = _current_temperature(reading.node_id)
+        if temp_from_pi is not None:
+            predictions[i] = request_prediction(temp_from_pi, reading.value, reading.node_id)
+    pending = [asyncio.wrap_future(p) for p in predictions if p is not None]
+    if not pending:
+        return predictions
+    await asyncio.wait(pending, timeout=INFERENCE_TIMEOUT_SECONDS)
+    observe_stage("inference", time.perf_counter() - started)
+    for i, prediction in enumerate(predictions):
+        if prediction is not None and not prediction.done():
+            # Give up on it like prediction.result(timeout=...) would
+            predictions[i] = timed_out = concurrent.futures.Future()
+            timed_out.set_exception(TimeoutError("Prediction timed out"))
+    return predictions
+
+
+async def handle_client_async(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                              executor: concurrent.futures.Executor) -> None:
+    """
+    Coroutine serving one client on the shared event loop. Predictions from
+    the batcher or worker pool are awaited here; the rest of the watering
+    decision runs in the executor so other connections keep flowing.
+    """
+    addr = writer.get_extra_info("peername")
+    logging.info("Client connected: %s", addr)
+    conn_stats = server_stats.open(addr)
+    loop = asyncio.get_running_loop()
+    protocol = SensorProtocol()
+    timings = ReadingTimings(protocol, addr)
+    try:
+        while True:
+            data = await reader.read(RECV_BUFFER_SIZE)
+            if not data:
+                logging.warning("Client %s disconnected.", addr)
+                break
+            conn_stats.bytes_in += len(data)
+            timings.received()
+
+            readings = protocol.feed(data)
+            timings.parsed(readings)
+            if not readings:
+                continue
+            for reading in readings:
+                logging.info("<- Received soil moisture: %s from %s", reading.describe(), addr)
+
+            started = time.perf_counter()
+            predictions = await await_predictions(readings)
+            inference_seconds = time.perf_counter() - started
+            pump_times, stages = await loop.run_in_executor(
+                executor, run_request, decide_pump_times, readings, predictions)
+            if predictions is not None:
+                stages["inference"] = stages.get("inference", 0.0) + inference_seconds
+            timings.decided(stages)
+
+            reply = protocol.format_replies(readings, pump_times)
+            writer.write(reply)
+            await writer.drain()
+            timings.sent()
+            conn_stats.readings += len(readings)
+            conn_stats.bytes_out += len(reply)
+    except ConnectionResetError:
+        logging.warning("Connection reset by client %s", addr)
+    except Exception:
+        errors_counter.inc(kind="connection")
+        logging.exception("An error occurred with client %s", addr)
+    finally:
+        logging.info("Closing connection for %s", addr)
+        server_stats.close(conn_stats)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def run_asyncio_tcp_server(host: str, port: int, stop_event: threading.Event,
+                                 inference_threads: int = 4,
+                                 ready_event: threading.Event | None = None) -> None:
+    """
+    Serves every Arduino connection on a single event loop. ready_event is
+    set once the socket is accepting (or failed to open).
+    """
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=inference_threads, thread_name_prefix="inference"
+    )
+    try:
+        server = await asyncio.start_server(
+            lambda r, w: handle_client_async(r, w, executor),
+            host,
+            port,
+            reuse_address=True,
+            backlog=LISTEN_BACKLOG,
+        )
+    except Exception as e:
+        logging.error(f"An error occurred in TCP server: {e}")
+        executor.shutdown(wait=False)
+        if ready_event is not None:
+            ready_event.set()
+        return
+
+    logging.info(f"TCP Server (asyncio) listening on {host}:{port}")
+    if ready_event is not None:
+        ready_event.set()
+    last_stats = time.monotonic()
+    try:
+        async with server:
+            while not stop_event.is_set():
+                await asyncio.sleep(1) # Wake up to check stop_event
+                if time.monotonic() - last_stats >= STATS_INTERVAL_SECONDS:
+                    log_periodic_stats()
+                    last_stats = time.monotonic()
+    finally:
+        executor.shutdown(wait=False)
+        logging.info("TCP Server has shut down.")
+
+
+def asyncio_tcp_server_thread(host: str, port: int, stop_event: threading.Event,
+                              inference_threads: int = 4,
+                              ready_event: threading.Event | None = None) -> None:
+    """
+    Wrapper to run the asyncio TCP server in its own thread.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(run_asyncio_tcp_server(host, port, stop_event, inference_threads, ready_event))
+    finally:
+        loop.close()
+
+# ------------------------ Startup ------------------------------------------
+
+class StartupReport:
+    """Wall-clock time of each startup phase, printed as one line when done."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.perf_counter()
+        self.phases = []
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases.append((phase, seconds))
+
+    @contextlib.contextmanager
+    def phase(self, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - started)
+
+    def log(self) -> None:
+        total = time.perf_counter() - self.started_at
+        breakdown = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in self.phases)
+        print(f"{self.name} in {total:.3f}s ({breakdown})")
+
+
+def warm_up_ai(args: argparse.Namespace) -> None:
+    """
+    Load the AI module, its heavy dependencies and the model in the
+    background, after the TCP server is already accepting. Readings are
+    answered with the fallback rule until irrigation_module is set at the
+    very end, so the AI path only ever sees a fully configured module.
+    """
+    global irrigation_module, inference_pool, prediction_batcher
+    report = StartupReport("AI warm-up")
+
+    with report.phase("import module"):
+        module = load_irrigation_module(MODULE_PATH)
+    if module is None:
+        logging.warning("AI module not available; using the fallback rule only.")
+        return
+    module.set_stage_observer(observe_stage)
+
+    # --- Forecast snapshot on disk, so a restart offline keeps the last forecast ---
+    if args.forecast_dir:
+        with report.phase("forecast snapshot"):
+            try:
+                module.enable_forecast_snapshots(args.forecast_dir)
+            except OSError as e:
+                logging.warning("Forecast snapshots not available: %s", e)
+
+    # --- Background weather cache (keeps the API call off the reading path) ---
+    if args.weather_ttl > 0:
+        with report.phase("weather cache"):
+            module.enable_weather_cache(ttl_seconds=args.weather_ttl)
+        logging.info("Weather cache enabled (refresh every %.0fs)", args.weather_ttl)
+
+    # --- Durable watering state, restored before the first AI decision ---
+    if args.state_db:
+        with report.phase("state restore"):
+            module.enable_state_store(args.state_db)
+        farm = module.get_farm(GOVERNORATE, CROP_TYPE)
+        logging.info("Watering state of each zone is restored from %s when its node first reports "
+                     "(%s: %.2fL today, last watering %s)",
+                     args.state_db, module.zone_id_for(GOVERNORATE, CROP_TYPE),
+                     farm.daily_water_total, farm.last_watering)
+
+    with report.phase("farm"):
+        farm = module.get_farm(GOVERNORATE, CROP_TYPE)
+        if module.get_weather_cache() is not None:
+            farm.get_weather_snapshot()  # Registers the governorate: first fetch starts now
+
+    if args.inference_workers == 0:
+        with report.phase("model load"):
+            try:
+                module.load_model(MODEL_PATH)
+            except Exception as e:
+                logging.error("Could not load the model from %s: %s", MODEL_PATH, e)
+
+    # --- Optional precomputed prediction table (built here once, even for
+    # the inference workers, so they don't each evaluate and write it) ---
+    if args.prediction_table:
+        with report.phase("prediction table"):
+            try:
+                module.enable_prediction_table(MODEL_PATH, args.prediction_table_file)
+            except Exception as e:
+                logging.error("Could not build the prediction table, using the model directly: %s", e)
+
+    if args.inference_workers > 0:
+        # --- Out-of-process inference workers (each loads the model itself) ---
+        with report.phase("inference workers"):
+            inference_pool = InferenceWorkerPool(
+                args.inference_workers,
+                MODULE_PATH,
+                MODEL_PATH,
+                options={
+                    "weather_ttl": args.weather_ttl,
+                    "forecast_dir": args.forecast_dir,
+                    "prediction_table": module.prediction_table_snapshot(),
+                    "log_level": logging.getLogger().level,
+                },
+            )
+        logging.info("Started %d inference worker processes.", args.inference_workers)
+
+    # --- Optional micro-batching of predictions across connections ---
+    if args.batch_window_ms > 0:
+        prediction_batcher = PredictionBatcher(args.batch_window_ms, args.batch_max_size)
+        logging.info("Batching predictions: %.1f ms window, up to %d readings",
+                     args.batch_window_ms, args.batch_max_size)
+
+    irrigation_module = module  # From here on readings take the AI path
+    report.log()
+
+
 # --------------------------- CLI and main ----------------------------------
 
 def main() -> int:
+    global MODULE_PATH, MODEL_PATH
+    global BLE_COALESCE_SECONDS, BLE_MIN_INTERVAL_SECONDS, BLE_MAX_INTERVAL_SECONDS, BLE_ADV_ROTATE_SECONDS
+    global BLE_ZONE_EXPIRY_SECONDS
     parser = argparse.ArgumentParser(description="Raspberry Pi TCP and BLE server for Arduino moisture sensor.")
-    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase logging verbosity (-v)")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="Increase logging verbosity (-v, -vv for debug)")
+    parser.add_argument("--module-path", default=MODULE_PATH,
+                        help="Irrigation AI module (default: model_AI/ next to this script, or $IRRIGATION_MODULE_PATH)")
+    parser.add_argument("--model-path", default=MODEL_PATH,
+                        help="Trained model file (default: model_AI/ next to this script, or $IRRIGATION_MODEL_PATH)")
+    parser.add_argument("--prediction-table", action="store_true",
+                        help="Precompute the model over every input combination and answer predictions by lookup")
+    parser.add_argument("--prediction-table-file", default=None,
+                        help="Load/save the precomputed prediction table from/to this .npz file")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads",
+                        help="TCP server engine: one thread per client, or all clients on one asyncio event loop")
+    parser.add_argument("--inference-threads", type=int, default=4,
+                        help="Executor threads running watering decisions for the asyncio engine")
+    parser.add_argument("--inference-workers", type=int, default=0,
+                        help="Run AI predictions in N worker processes (0 = in the server process)")
+    parser.add_argument("--batch-window-ms", type=float, default=0,
+                        help="Collect predictions for up to N ms and score them in one model call (0 = off)")
+    parser.add_argument("--batch-max-size", type=int, default=32,
+                        help="Score a batch as soon as this many readings are waiting")
+    parser.add_argument("--store-dir", default=None,
+                        help="Keep the history of readings and decisions in memory-mapped segment files here")
+    parser.add_argument("--store-segment-records", type=int, default=262144,
+                        help="Records per history segment file")
+    parser.add_argument("--store-max-segments", type=int, default=0,
+                        help="Delete the oldest history segment files beyond this many (0 = keep everything)")
+    parser.add_argument("--state-db", default=None,
+                        help="Persist per-zone watering state (daily total, last watering) in this SQLite file")
+    parser.add_argument("--weather-ttl", type=float, default=600,
+                        help="Refresh cached weather in the background every N seconds (0 = call the API on every reading)")
+    parser.add_argument("--forecast-dir", default=None,
+                        help="Save the hourly forecast here and reuse it after a restart or while the API is unreachable")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Serve Prometheus metrics on http://HOST:N/metrics (0 = off)")
+    parser.add_argument("--metrics-host", default="127.0.0.1",
+                        help="Address for the metrics endpoint (0.0.0.0 to scrape from another machine)")
+    parser.add_argument("--profile", choices=profiling.MODES, default=None,
+                        help="Profile the request path: cprofile (.pstats) or sampling (collapsed stacks for flame graphs)")
+    parser.add_argument("--profile-seconds", type=float, default=60,
+                        help="Stop profiling after N seconds (0 = no time limit)")
+    parser.add_argument("--profile-requests", type=int, default=0,
+                        help="Stop profiling after N requests (0 = no request limit)")
+    parser.add_argument("--profile-output", default=None,
+                        help="Profile output file (default profile-<time>.pstats or .collapsed)")
+    parser.add_argument("--profile-interval-ms", type=float, default=5,
+                        help="Stack sampling interval for --profile sampling")
+    parser.add_argument("--slow-request-ms", type=float, default=0,
+                        help="Log a per-stage breakdown of replies slower than N ms (0 = off)")
+    parser.add_argument("--ble-coalesce-ms", type=float, default=BLE_COALESCE_SECONDS * 1000,
+                        help="Gather BLE changes for N ms before publishing them together")
+    parser.add_argument("--ble-min-interval", type=float, default=BLE_MIN_INTERVAL_SECONDS,
+                        help="Publish BLE updates at most every N seconds")
+    parser.add_argument("--ble-max-interval", type=float, default=BLE_MAX_INTERVAL_SECONDS,
+                        help="Re-notify BLE values at least every N seconds even if unchanged (0 = only on change)")
+    parser.add_argument("--ble-rotate-seconds", type=float, default=BLE_ADV_ROTATE_SECONDS,
+                        help="Advertise the next group of zones every N seconds when they don't fit in one advertisement")
+    parser.add_argument("--ble-zone-expiry", type=float, default=BLE_ZONE_EXPIRY_SECONDS,
+                        help="Stop advertising a zone after N seconds without a reading (0 = never)")
+    parser.add_argument("--w1-dir", default=onewire.DEFAULT_BASE_DIR,
+                        help="1-Wire device directory to scan for DS18B20 probes (e.g. a fake sysfs tree for testing)")
+    parser.add_argument("--probe-zone", action="append", default=[], metavar="PROBE_ID=ZONE",
+                        help="Use this probe's temperature for the zone (node id); repeat for each probe")
+    parser.add_argument("--temp-interval", type=float, default=30,
+                        help="Seconds between temperature readings of all probes")
+    parser.add_argument("--temp-max-age", type=float, default=300,
+                        help="Ignore probe readings older than N seconds (0 = keep the last value forever)")
     args = parser.parse_args()
+    try:
+        zone_map = onewire.parse_zone_map(args.probe_zone)
+    except ValueError as e:
+        parser.error(str(e))
     
+    startup = StartupReport("Startup")
+    startup.add("imports", startup.started_at - _IMPORTS_STARTED_AT)
     setup_logging(args.verbose)
 
+    MODULE_PATH = args.module_path
+    MODEL_PATH = args.model_path
+
+    BLE_COALESCE_SECONDS = max(0.0, args.ble_coalesce_ms / 1000.0)
+    BLE_MIN_INTERVAL_SECONDS = max(0.0, args.ble_min_interval)
+    BLE_MAX_INTERVAL_SECONDS = max(0.0, args.ble_max_interval)
+    BLE_ADV_ROTATE_SECONDS = max(0.1, args.ble_rotate_seconds)
+    BLE_ZONE_EXPIRY_SECONDS = max(0.0, args.ble_zone_expiry)
+
+    # --- Per-stage timings and counters, served for Prometheus ---
+    metrics_server = None
+    if args.metrics_port > 0:
+        try:
+            metrics_server = metrics.MetricsServer(metrics_registry, args.metrics_host, args.metrics_port).start()
+            logging.info("Metrics available at http://%s:%d/metrics", args.metrics_host, args.metrics_port)
+        except OSError as e:
+            logging.error("Could not start the metrics endpoint: %s", e)
+
+    # --- Optional profiling of the request path and slow-reply tagging ---
+    global request_profiler, SLOW_REQUEST_SECONDS
+    if args.slow_request_ms > 0:
+        SLOW_REQUEST_SECONDS = args.slow_request_ms / 1000.0
+    if args.profile:
+        request_profiler = profiling.RequestProfiler(
+            args.profile,
+            args.profile_output or profiling.default_output_path(args.profile),
+            duration_seconds=args.profile_seconds,
+            max_requests=args.profile_requests,
+            interval_seconds=args.profile_interval_ms / 1000.0,
+        ).start()
+
+    # --- Optional history of readings and decisions (opened before the first reading) ---
+    global decision_store, reading_store
+    if args.store_dir:
+        with startup.phase("reading store"):
+            try:
+                import reading_store
+                decision_store = reading_store.ReadingStore(
+                    args.store_dir,
+                    segment_records=args.store_segment_records,
+                    max_segments=args.store_max_segments or None,
+                )
+                logging.info("Recording readings to %s", args.store_dir)
+            except Exception as e:
+                logging.warning("Reading store not available: %s", e)
+
     # --- Start Temperature Monitor ---
-    sensor_path = find_temp_sensor()
-    # Always start the temperature monitor. If no sensor is present, it runs in SIMULATION mode
-    temp_thread = threading.Thread(
-        target=temperature_monitor_thread,
-        args=(sensor_path,),
-        daemon=True
-    )
-    temp_thread.start()
+    global temperature_probes
+    with startup.phase("temperature sensor"):
+        probes = find_temp_sensors(args.w1_dir)
+    if probes:
+        # Every probe is read concurrently in the background; readings never wait on sysfs
+        temperature_probes = onewire.ProbeReader(
+            args.w1_dir, zone_map, args.temp_interval, args.temp_max_age).start()
+        logging.info("Reading %d temperature probe(s) every %.0fs", len(probes), args.temp_interval)
+    else:
+        # If no sensor is present, the monitor runs in SIMULATION mode
+        temp_thread = threading.Thread(
+            target=temperature_monitor_thread,
+            args=(args.temp_interval,),
+            daemon=True
+        )
+        temp_thread.start()
     
     # --- Start Servers ---
     stop_main_event = threading.Event()
@@ -509,12 +1917,26 @@ def main() -> int:
     logging.info("BLE server thread started.")
 
     # Start the TCP server in a separate thread
-    tcp_thread = threading.Thread(target=run_tcp_server, args=(HOST, PORT, stop_main_event), daemon=True)
-    tcp_thread.start()
-    logging.info("TCP server thread started.")
+    tcp_ready = threading.Event()
+    with startup.phase("tcp listen"):
+        if args.engine == "asyncio":
+            tcp_thread = threading.Thread(
+                target=asyncio_tcp_server_thread,
+                args=(HOST, PORT, stop_main_event, args.inference_threads, tcp_ready),
+                daemon=True,
+            )
+        else:
+            tcp_thread = threading.Thread(target=run_tcp_server, args=(HOST, PORT, stop_main_event, tcp_ready), daemon=True)
+        tcp_thread.start()
+        tcp_ready.wait(timeout=10)
+    logging.info("TCP server thread started (%s engine).", args.engine)
+
+    # Heavy AI imports and model loading happen now that the socket is accepting
+    threading.Thread(target=warm_up_ai, args=(args,), name="ai-warmup", daemon=True).start()
 
     print(f"Servers started. Listening for Arduino on {HOST}:{PORT}...")
     print(f"Broadcasting BLE as 'Pi-Irrigation'.")
+    startup.log()
     print("Press Ctrl+C to exit.")
 
     try:
@@ -526,12 +1948,27 @@ def main() -> int:
     finally:
         logging.info("Shutting down all services...")
         stop_main_event.set() # Signal all threads to stop
+        ble_changed.set()     # Wake the BLE thread if it is waiting for a change
         
         # Wait for threads to finish
         if tcp_thread.is_alive():
             tcp_thread.join()
         if ble_thread.is_alive():
             ble_thread.join()
+        if prediction_batcher is not None:
+            prediction_batcher.close()
+        if inference_pool is not None:
+            inference_pool.close()
+        if decision_store is not None:
+            decision_store.close()
+        if irrigation_module and irrigation_module.get_state_store() is not None:
+            irrigation_module.get_state_store().close()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if request_profiler is not None:
+            request_profiler.finish()
+        if temperature_probes is not None:
+            temperature_probes.stop()
         
         logging.info("All threads closed. Exiting.")
     
@@ -0,0 +1,312 @@
+"""
+Append-only time-series store for sensor readings and pump decisions.
+
+Every decision made by raspberry.py is appended as one fixed-width NumPy
+record. The most recent records are kept in an in-memory ring buffer; all
+records are also written to memory-mapped segment files on disk, so months
+of history stay on the SD card while RAM use stays bounded (the OS pages
+segments in and out as needed).
+
+Range scans return NumPy views straight into the memory-mapped segments,
+without copying (except for a segment written while the clock stepped
+back, which is filtered instead).
+
+Inspect a store from the command line:
+  python3 reading_store.py /var/lib/irrigation/readings --last 20
+  python3 reading_store.py /var/lib/irrigation/readings --hours 24 --csv
+"""
+import argparse
+import glob
+import os
+import threading
+import time
+
+import numpy as np
+
+# Decision sources
+DECISION_FALLBACK = 0
+DECISION_AI = 1
+DECISION_SOURCES = {DECISION_FALLBACK: "fallback", DECISION_AI: "ai"}
+
+NO_NODE = -1  # Node ID stored for text-protocol nodes, which send none
+
+READING_DTYPE = np.dtype([
+    ("timestamp", "<f8"),          # Unix time in seconds (0 = unused slot)
+    ("node", "<i4"),               # Node ID, NO_NODE if unknown
+    ("raw_moisture", "<i4"),       # Moisture value the decision used
+    ("temperature_c", "<f4"),      # NaN when no temperature was available
+    ("predicted_litres", "<f4"),   # NaN when the fallback rule decided
+    ("pump_ms", "<u4"),            # Pump command sent to the node
+    ("source", "u1"),              # DECISION_AI or DECISION_FALLBACK
+])
+
+SEGMENT_PATTERN = "segment-%06d.npy"
+
+
+class ReadingStore:
+    """
+    Ring buffer + memory-mapped segment files of READING_DTYPE records.
+
+    Segments are .npy files preallocated with a fixed number of records, so
+    they can be opened with numpy.load(mmap_mode="r") by other tools too.
+    Unused slots at the end of the newest segment have timestamp 0.
+    """
+
+    def __init__(self, directory: str, segment_records: int = 262144,
+                 ring_records: int = 4096, max_segments: int | None = None,
+                 read_only: bool = False):
+        """
+        Args:
+            directory: Where the segment files live (created if missing).
+            segment_records: Records per segment file.
+            ring_records: Records kept in the in-memory ring buffer.
+            max_segments: Delete the oldest segments beyond this many (None = keep all).
+            read_only: Only read what is on disk: nothing is created or
+                opened for writing (safe next to a running raspberry.py).
+        """
+        self.directory = directory
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._ring = np.zeros(ring_records, dtype=READING_DTYPE)
+        self._ring_next = 0
+        self._ring_count = 0
+        self._sorted_segments = {}  # Closed segment id -> timestamps never go backwards
+
+        self._segment_ids = self._list_segment_ids()
+        if self._segment_ids:
+            self._segment_id = self._segment_ids[-1]
+            path = self._segment_path(self._segment_id)
+            if read_only:
+                self._segment = np.load(path, mmap_mode="r")
+            else:
+                self._segment = np.lib.format.open_memmap(path, mode="r+")
+            self._segment_count = self._used_records(self._segment)
+            self._segment_sorted = self._is_sorted(self._segment["timestamp"][:self._segment_count])
+            self._load_ring_from_disk()
+        elif read_only:
+            self._segment_id = None
+            self._segment = np.zeros(0, dtype=READING_DTYPE)
+            self._segment_count = 0
+            self._segment_sorted = True
+        else:
+            self._open_new_segment(0)
+
+    # --- Segment files -----------------------------------------------------
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, SEGMENT_PATTERN % segment_id)
+
+    def _list_segment_ids(self) -> list[int]:
+        ids = []
+        for path in glob.glob(os.path.join(self.directory, "segment-*.npy")):
+            try:
+                ids.append(int(os.path.basename(path)[8:-4]))
+            except ValueError:
+                continue
+        return sorted(ids)
+
+    @staticmethod
+    def _is_sorted(timestamps: np.ndarray) -> bool:
+        return bool(np.all(timestamps[1:] >= timestamps[:-1]))
+
+    @staticmethod
+    def _used_records(segment: np.ndarray) -> int:
+        """Written records form a prefix; binary-search where the zero timestamps start."""
+        timestamps = segment["timestamp"]
+        lo, hi = 0, len(timestamps)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if timestamps[mid] > 0:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _open_new_segment(self, segment_id: int) -> None:
+        self._segment = np.lib.format.open_memmap(
+            self._segment_path(segment_id),
+            mode="w+",
+            dtype=READING_DTYPE,
+            shape=(self.segment_records,),
+        )
+        self._segment_id = segment_id
+        self._segment_count = 0
+        self._segment_sorted = True
+        if segment_id not in self._segment_ids:
+            self._segment_ids.append(segment_id)
+        self._enforce_retention()
+
+    def _enforce_retention(self) -> None:
+        if self.max_segments is None:
+            return
+        while len(self._segment_ids) > self.max_segments:
+            oldest = self._segment_ids.pop(0)
+            try:
+                os.remove(self._segment_path(oldest))
+            except OSError:
+                pass
+
+    def _load_ring_from_disk(self) -> None:
+        """Warm the ring buffer with the newest records after a restart."""
+        tail = self._segment[max(0, self._segment_count - len(self._ring)):self._segment_count]
+        self._ring[:len(tail)] = tail
+        self._ring_count = len(tail)
+        self._ring_next = len(tail) % len(self._ring)
+
+    # --- Writing -----------------------------------------------------------
+
+    def append(self, node: int | None, raw_moisture: int, temperature_c: float | None,
+               predicted_litres: float | None, pump_ms: int, source: int,
+               timestamp: float | None = None) -> None:
+        """Append one decision record."""
+        if self.read_only:
+            raise ValueError(f"Reading store {self.directory} is open read-only")
+        record = (
+            time.time() if timestamp is None else timestamp,
+            NO_NODE if node is None else node,
+            raw_moisture,
+            np.nan if temperature_c is None else temperature_c,
+            np.nan if predicted_litres is None else predicted_litres,
+            max(0, pump_ms),
+            source,
+        )
+        with self._lock:
+            if self._segment_count >= self.segment_records:
+                self._segment.flush()
+                self._sorted_segments[self._segment_id] = self._segment_sorted
+                self._open_new_segment(self._segment_id + 1)
+            if self._segment_count and record[0] < self._segment[self._segment_count - 1]["timestamp"]:
+                self._segment_sorted = False  # The clock went backwards (e.g. an NTP correction)
+            self._segment[self._segment_count] = record
+            self._segment_count += 1
+
+            self._ring[self._ring_next] = record
+            self._ring_next = (self._ring_next + 1) % len(self._ring)
+            self._ring_count = min(self._ring_count + 1, len(self._ring))
+
+    def flush(self) -> None:
+        """Ask the OS to write the current segment to disk."""
+        if self.read_only:
+            return
+        with self._lock:
+            self._segment.flush()
+
+    def close(self) -> None:
+        self.flush()
+
+    # --- Reading -----------------------------------------------------------
+
+    def recent(self, count: int | None = None) -> np.ndarray:
+        """The newest records from the ring buffer, oldest first (a copy)."""
+        with self._lock:
+            n = self._ring_count if count is None else min(count, self._ring_count)
+            start = (self._ring_next - n) % len(self._ring)
+            if start + n <= len(self._ring):
+                return self._ring[start:start + n].copy()
+            return np.concatenate((self._ring[start:], self._ring[:self._ring_next]))
+
+    def scan(self, start: float | None = None, end: float | None = None) -> list[np.ndarray]:
+        """
+        Records with start <= timestamp < end, as a list of arrays (one per
+        segment that overlaps the range), in the order they were written.
+
+        Segments whose timestamps never go backwards are binary-searched and
+        returned as zero-copy views. If the clock stepped back while a
+        segment was written, that segment is filtered with a linear scan
+        instead (and returned as a copy).
+        """
+        with self._lock:
+            segment_ids = list(self._segment_ids)
+            current_id = self._segment_id
+            current_count = self._segment_count
+            current_sorted = self._segment_sorted
+            current = self._segment
+
+        views = []
+        for segment_id in segment_ids:
+            if segment_id == current_id:
+                segment = current[:current_count]
+                is_sorted = current_sorted
+            else:
+                try:
+                    segment = np.load(self._segment_path(segment_id), mmap_mode="r")
+                except (OSError, ValueError):
+                    continue
+                segment = segment[:self._used_records(segment)]
+                is_sorted = self._sorted_segments.get(segment_id)
+                if is_sorted is None:
+                    is_sorted = self._sorted_segments[segment_id] = self._is_sorted(segment["timestamp"])
+            if not len(segment):
+                continue
+            timestamps = segment["timestamp"]
+            if not is_sorted:
+                mask = np.ones(len(segment), dtype=bool)
+                if start is not None:
+                    mask &= timestamps >= start
+                if end is not None:
+                    mask &= timestamps < end
+                if mask.any():
+                    views.append(segment[mask])
+                continue
+            if end is not None and timestamps[0] >= end:
+                continue
+            if start is not None and timestamps[-1] < start:
+                continue
+            lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+            hi = len(segment) if end is None else int(np.searchsorted(timestamps, end, side="left"))
+            if hi > lo:
+                views.append(segment[lo:hi])
+        return views
+
+    def count(self) -> int:
+        """Total number of records on disk."""
+        return sum(len(view) for view in self.scan())
+
+
+def _format_record(record) -> str:
+    ts = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(float(record["timestamp"])))
+    return ",".join([
+        ts,
+        str(int(record["node"])),
+        str(int(record["raw_moisture"])),
+        f"{float(record['temperature_c']):.2f}",
+        f"{float(record['predicted_litres']):.3f}",
+        str(int(record["pump_ms"])),
+        DECISION_SOURCES.get(int(record["source"]), "?"),
+    ])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Inspect a reading store written by raspberry.py.")
+    parser.add_argument("directory")
+    parser.add_argument("--last", type=int, default=None, help="Only show the last N records")
+    parser.add_argument("--hours", type=float, default=None, help="Only show the last N hours")
+    parser.add_argument("--csv", action="store_true", help="Print records as CSV")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+    store = ReadingStore(args.directory, read_only=True)
+    start = time.time() - args.hours * 3600 if args.hours is not None else None
+    views = store.scan(start=start)
+    total = sum(len(v) for v in views)
+    print(f"{total} records in {len(views)} segment(s)")
+    if not args.csv and args.last is None:
+        return 0
+
+    records = np.concatenate(views) if views else np.zeros(0, dtype=READING_DTYPE)
+    if args.last is not None:
+        records = records[-args.last:]
+    print("timestamp,node,raw_moisture,temperature_c,predicted_litres,pump_ms,source")
+    for record in records:
+        print(_format_record(record))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Faster-than-real-time replay of recorded sensor logs through the decision rules.
+
+Each recorded reading moves a ManualClock to the time it was taken and goes
+through the same pipeline as a live reading: generate_model_input() (soil,
+temperature and weather classification), the model (answered from the
+precomputed prediction table), decide_watering() and record_watering().
+Nothing waits on the wall clock or the network, so a season of readings is
+replayed in seconds and a rule change can be compared against the last one.
+
+Inputs:
+  - a reading store directory (raspberry.py --store-dir) or a CSV with
+    timestamp, raw_moisture (0..--raw-max) or moisture (%), temperature_c
+    and optionally node / pump_ms columns (reading_store.py --csv works);
+  - optionally --weather: JSON lines {"timestamp": ..., "precipitation": ...,
+    "precipitation_6h": ..., "weather_code": ..., "wind_speed": ...,
+    "humidity": ...}, each used from its timestamp until the next one;
+  - or --synthetic-days N to generate a season without any recording.
+
+Usage:
+  python3 replay.py /var/lib/irrigation/readings --weather weather.jsonl
+  python3 replay.py readings.csv --governorate SFAX --crop TOMATO --json report.json
+  python3 replay.py --synthetic-days 120
+"""
+import argparse
+import bisect
+import csv
+import importlib.util
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODULE_PATH = os.path.join(SCRIPT_DIR, "model_AI", "import requests.py")
+MODEL_PATH = os.path.join(SCRIPT_DIR, "model_AI", "crop_water_requirement_model (1).pkl")
+
+# Used for any field a weather record leaves out
+WEATHER_DEFAULTS = {
+    "temperature_api": None,
+    "humidity": 60,
+    "precipitation": 0.0,
+    "precipitation_6h": 0.0,
+    "weather_code": 1,
+    "wind_speed": 0.0,
+}
+
+
+def load_module(name: str, path: str):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def parse_timestamp(value: str, tz) -> float:
+    """Epoch seconds from a number, an ISO datetime or 'YYYY-MM-DD HH:MM:SS' (naive times are in tz)."""
+    try:
+        return float(value)
+    except ValueError:
+        when = datetime.fromisoformat(value.strip())
+        if when.tzinfo is None:
+            when = tz.localize(when)
+        return when.timestamp()
+
+
+def _optional_float(value) -> float | None:
+    if value is None or value == "":
+        return None
+    value = float(value)
+    return None if math.isnan(value) else value
+
+
+# ------------------------------ Inputs ---------------------------------------
+# A reading is (timestamp, node, moisture %, temperature °C or None, recorded pump ms or None)
+
+def readings_from_store(directory: str, raw_max: float) -> list[tuple]:
+    import numpy as np
+    import reading_store
+
+    store = reading_store.ReadingStore(directory, read_only=True)
+    try:
+        views = store.scan()
+        records = np.concatenate(views) if views else np.zeros(0, dtype=reading_store.READING_DTYPE)
+        return [
+            (
+                float(r["timestamp"]),
+                None if int(r["node"]) == reading_store.NO_NODE else int(r["node"]),
+                float(r["raw_moisture"]) / raw_max * 100.0,
+                _optional_float(r["temperature_c"]),
+                int(r["pump_ms"]),
+            )
+            for r in records
+        ]
+    finally:
+        store.close()
+
+
+def readings_from_csv(path: str, raw_max: float, tz) -> list[tuple]:
+    readings = []
+    with open(path, newline="") as f:
+        lines = list(f)
+    # reading_store.py --csv prints a summary line before the header
+    header = next((i for i, line in enumerate(lines) if line.startswith("timestamp")), 0)
+    for row in csv.DictReader(lines[header:]):
+        if row.get("moisture") not in (None, ""):
+            moisture = float(row["moisture"])
+        else:
+            moisture = float(row["raw_moisture"]) / raw_max * 100.0
+        node = row.get("node")
+        readings.append((
+            parse_timestamp(row["timestamp"], tz),
+            None if node in (None, "", "-1") else int(node),
+            moisture,
+            _optional_float(row.get("temperature_c", row.get("temperature"))),
+            int(row["pump_ms"]) if row.get("pump_ms") not in (None, "") else None,
+        ))
+    return readings
+
+
+def synthetic_readings(days: float, interval_minutes: float, tz, seed: int = 0) -> list[tuple]:
+    """A season of readings in tz: daily temperature cycle, soil drying faster when hot, random rain."""
+    rng = random.Random(seed)
+    start = tz.localize(datetime(datetime.now(tz).year, 6, 1)).timestamp()
+    step = interval_minutes * 60
+    moisture = 60.0
+    readings = []
+    for i in range(int(days * 86400 / step)):
+        t = start + i * step
+        local = datetime.fromtimestamp(t, tz)
+        hour = local.hour + local.minute / 60
+        temperature = 27 + 7 * math.sin((hour - 9) / 24 * 2 * math.pi) + rng.gauss(0, 0.5)
+        moisture -= (0.3 + 0.02 * max(0.0, temperature - 20)) * step / 3600
+        if moisture < 10 or rng.random() < step / (86400 * 6):
+            moisture = rng.uniform(55, 75)  # Rain (or a manual watering) every ~6 days
+        readings.append((t, None, max(0.0, moisture + rng.gauss(0, 0.5)), temperature, None))
+    return readings
+
+
+def weather_from_jsonl(path: str, tz) -> list[tuple[float, dict]]:
+    snapshots = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            timestamp = parse_timestamp(str(record.pop("timestamp")), tz)
+            snapshots.append((timestamp, dict(WEATHER_DEFAULTS, **record)))
+    snapshots.sort(key=lambda item: item[0])
+    return snapshots
+
+
+class ReplayWeather:
+    """Recorded weather served through the WeatherCache interface (register/get) at the replay time."""
+
+    def __init__(self, snapshots: list[tuple[float, dict]], clock):
+        self.times = [t for t, _ in snapshots]
+        self.snapshots = snapshots
+        self.clock = clock
+
+    def register(self, governorate, fetcher):
+        pass
+
+    def get(self, governorate):
+        now = self.clock().timestamp()
+        i = bisect.bisect_right(self.times, now) - 1
+        if i < 0:
+            return None, None
+        taken_at, weather = self.snapshots[i]
+        return weather, now - taken_at
+
+
+# ------------------------------ Replay ---------------------------------------
+
+def _reason_label(reason: str) -> str:
+    """Decision reason without its numbers, so equal rules count together."""
+    return re.sub(r"\d+(\.\d+)?", "N", reason)
+
+
+def replay(irrigation, readings: list[tuple], weather: list[tuple[float, dict]], tz, args) -> dict:
+    # The clock is passed in so the farm starts its day (daily total reset) at the first reading
+    clock = irrigation.ManualClock(tz, readings[0][0] if readings else None)
+    farm = irrigation.TunisiaIrrigationSystem(args.governorate, args.crop, clock=clock)
+    farm.weather_cache = ReplayWeather(weather, clock)
+    irrigation.enable_prediction_table(args.model)
+
+    decisions = Counter()
+    reasons = Counter()
+    litres_per_day = defaultdict(float)
+    litres_total = 0.0
+    skipped = 0
+    recorded_pump_ms = 0
+
+    started = time.perf_counter()
+    for timestamp, node, moisture, temperature, pump_ms in readings:
+        clock.set(timestamp)
+        if pump_ms is not None:
+            recorded_pump_ms += pump_ms
+        farm.record_moisture(moisture, zone=node)
+        if temperature is None:
+            skipped += 1  # Live, this reading would have used the fallback rule
+            continue
+
+        model_input, context = farm.generate_model_input(temperature, moisture, zone=node)
+        features = (model_input["CROP_TYPE"], model_input["SOIL_TYPE"], model_input["REGION"],
+                    model_input["TEMPERATURE"], model_input["WEATHER_CONDITION"])
+        water_requirement = irrigation.lookup_prediction(args.model, *features)
+        if water_requirement is None:
+            water_requirement = irrigation.predict_water_requirement(args.model, *features)
+
+        should_water, amount, reason = farm.decide_watering(float(water_requirement), moisture, context)
+        decisions["water" if should_water else "skip"] += 1
+        reasons[_reason_label(reason)] += 1
+        if should_water:
+            farm.record_watering(amount, context["timestamp"])
+            litres_total += amount
+            litres_per_day[context["timestamp"].date().isoformat()] += amount
+    elapsed = time.perf_counter() - started
+
+    simulated = readings[-1][0] - readings[0][0] if readings else 0.0
+    report = {
+        "governorate": farm.governorate,
+        "crop": farm.crop_type,
+        "readings": len(readings),
+        "skipped_no_temperature": skipped,
+        "simulated_days": round(simulated / 86400, 2),
+        "elapsed_s": round(elapsed, 3),
+        "readings_per_s": round(len(readings) / elapsed, 1) if elapsed > 0 else 0.0,
+        "speedup": round(simulated / elapsed) if elapsed > 0 else 0,
+        "decisions": dict(decisions),
+        "reasons": dict(reasons.most_common()),
+        "litres_total": round(litres_total, 2),
+        "litres_per_day": {day: round(v, 2) for day, v in sorted(litres_per_day.items())},
+    }
+    if recorded_pump_ms:
+        report["recorded_pump_ms_total"] = recorded_pump_ms
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Replay recorded readings through the irrigation decision rules.")
+    parser.add_argument("input", nargs="?", help="Reading store directory or CSV file")
+    parser.add_argument("--weather", default=None, help="JSON-lines weather snapshots")
+    parser.add_argument("--synthetic-days", type=float, default=None,
+                        help="Replay N days of generated readings instead of an input")
+    parser.add_argument("--interval-minutes", type=float, default=10, help="Reading interval for --synthetic-days")
+    parser.add_argument("--governorate", default="ZAGHOUAN")
+    parser.add_argument("--crop", default="TOMATO")
+    parser.add_argument("--model", default=MODEL_PATH, help="Model (.pkl, or .npz from export_model.py)")
+    parser.add_argument("--raw-max", type=float, default=1023, help="Raw moisture value that means 100%%")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args()
+
+    if args.synthetic_days is None and args.input is None:
+        parser.error("give a reading store directory or CSV file, or --synthetic-days")
+
+    import pytz
+    irrigation = load_module("irrigation_module", MODULE_PATH)
+    tz = pytz.timezone(irrigation.TUNISIA_TIMEZONE)  # The farm's local time
+    if args.synthetic_days is not None:
+        readings = synthetic_readings(args.synthetic_days, args.interval_minutes, tz)
+    elif os.path.isdir(args.input):
+        readings = readings_from_store(args.input, args.raw_max)
+    else:
+        readings = readings_from_csv(args.input, args.raw_max, tz)
+    readings.sort(key=lambda reading: reading[0])
+    weather = weather_from_jsonl(args.weather, tz) if args.weather else []
+
+    print(f"Replaying {len(readings)} readings ({len(weather)} weather snapshots)...", file=sys.stderr)
+    report = replay(irrigation, readings, weather, tz, args)
+    print(f"{report['readings']} readings over {report['simulated_days']} days in {report['elapsed_s']}s "
+          f"({report['readings_per_s']}/s, {report['speedup']}x real time): "
+          f"{report['decisions'].get('water', 0)} waterings, {report['litres_total']} L", file=sys.stderr)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    print(text)
+    if args.json:
+        with open(args.json, "w") as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
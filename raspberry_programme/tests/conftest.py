@@ -0,0 +1,44 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+# The modules are scripts next to raspberry.py, not an installed package
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+from open_meteo_standin import OpenMeteoStandIn  # noqa: E402
+
+MODULE_PATH = os.path.join(PACKAGE_DIR, "model_AI", "import requests.py")
+MODEL_PATH = os.path.join(PACKAGE_DIR, "model_AI", "crop_water_requirement_model (1).pkl")
+
+
+@pytest.fixture
+def irrigation():
+    """A fresh copy of the AI module (its registry, caches and stores are module globals)."""
+    spec = importlib.util.spec_from_file_location("irrigation_module", MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module
+    if module.get_weather_cache() is not None:
+        module.get_weather_cache().stop()
+    if module.get_state_store() is not None:
+        module.get_state_store().close()
+
+
+@pytest.fixture
+def standin(irrigation):
+    """OpenMeteoStandIn on a free port, with the module's weather calls pointed at it."""
+    with OpenMeteoStandIn() as standin:
+        irrigation.OPEN_METEO_URL = standin.url
+        yield standin
+
+
+@pytest.fixture
+def export_model():
+    """model_AI/export_model.py (turns the .pkl into a NumPy-only .npz; needs scikit-learn)."""
+    spec = importlib.util.spec_from_file_location("export_model", os.path.join(PACKAGE_DIR, "model_AI", "export_model.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
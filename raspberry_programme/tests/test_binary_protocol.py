@@ -0,0 +1,88 @@
+import struct
+
+from raspberry import BinaryFrameDecoder, SensorProtocol, SensorReading
+
+# Written out again here so a change to the server's layout shows up as a failure
+FRAME = struct.Struct("<BBBHHHHH")
+TIMESTAMP = struct.Struct("<I")
+REPLY = struct.Struct("<BBHHI")
+
+
+def frame(node_id, seq, probes, node_timestamp=None, version=1):
+    flags = 0x01 if node_timestamp is not None else 0x00
+    data = FRAME.pack(0xA5, version, flags, node_id, seq, *probes)
+    if node_timestamp is not None:
+        data += TIMESTAMP.pack(node_timestamp)
+    return data
+
+
+def test_frame_without_timestamp():
+    decoder = BinaryFrameDecoder()
+    readings = decoder.feed(frame(7, 12, (300, 330, 360)))
+    assert readings == [SensorReading(330, node_id=7, seq=12, probes=(300, 330, 360))]
+    assert decoder.buffered == 0
+
+
+def test_frame_with_timestamp():
+    decoder = BinaryFrameDecoder()
+    (reading,) = decoder.feed(frame(7, 13, (1, 2, 4), node_timestamp=0xDEADBEEF))
+    assert reading.value == 2
+    assert reading.node_timestamp == 0xDEADBEEF
+
+
+def test_frames_split_across_reads_and_pipelined():
+    data = frame(1, 1, (10, 10, 10)) + frame(2, 1, (20, 20, 20), node_timestamp=5) + frame(3, 1, (30, 30, 30))
+    decoder = BinaryFrameDecoder()
+    readings = []
+    for i in range(0, len(data), 5):
+        readings += decoder.feed(data[i:i + 5])
+    assert [(r.node_id, r.value, r.node_timestamp) for r in readings] == [(1, 10, None), (2, 20, 5), (3, 30, None)]
+    assert decoder.buffered == 0
+    assert decoder.malformed == 0
+
+
+def test_waits_for_the_timestamp():
+    data = frame(1, 1, (10, 10, 10), node_timestamp=99)
+    decoder = BinaryFrameDecoder()
+    assert decoder.feed(data[:FRAME.size]) == []
+    assert decoder.buffered == FRAME.size
+    assert decoder.feed(data[FRAME.size:])[0].node_timestamp == 99
+
+
+def test_resyncs_after_garbage_and_bad_versions():
+    decoder = BinaryFrameDecoder()
+    data = b"\x00\x01" + frame(1, 1, (0, 0, 0), version=2) + frame(2, 9, (5, 5, 5))
+    readings = decoder.feed(data)
+    assert [(r.node_id, r.seq) for r in readings] == [(2, 9)]
+    assert decoder.malformed >= 2
+
+
+def test_first_byte_selects_binary():
+    protocol = SensorProtocol()
+    assert protocol.feed(b"") == []
+    assert protocol.mode is None
+    readings = protocol.feed(frame(4, 2, (100, 200, 300), node_timestamp=1))
+    assert protocol.mode == "binary"
+    assert readings[0].node_id == 4
+    assert protocol.format_replies(readings, [1500]) == REPLY.pack(0xA5, 1, 4, 2, 1500)
+
+
+def test_first_byte_selects_text():
+    protocol = SensorProtocol()
+    readings = protocol.feed(b"350\n42")
+    assert protocol.mode == "text"
+    assert readings == [SensorReading(350)]
+    assert protocol.buffered == 2
+    assert protocol.feed(b"\n") == [SensorReading(42)]
+    # Once negotiated, a 0xA5 byte is just a malformed text line
+    assert protocol.feed(frame(1, 1, (0, 0, 0)) + b"\n") == []
+    assert protocol.mode == "text"
+    assert protocol.malformed == 1
+    assert protocol.format_replies(readings, [1500]) == b"1500\n"
+
+
+def test_binary_replies_clamp_pump_time():
+    protocol = SensorProtocol()
+    readings = protocol.feed(frame(1, 1, (0, 0, 0)) + frame(1, 2, (0, 0, 0)))
+    replies = protocol.format_replies(readings, [-5, 1 << 40])
+    assert [REPLY.unpack_from(replies, i * REPLY.size)[4] for i in range(2)] == [0, 0xFFFFFFFF]
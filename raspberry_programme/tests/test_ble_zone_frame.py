@@ -0,0 +1,49 @@
+import pytest
+
+import raspberry
+from raspberry import BLE_ADV_MAX_PAYLOAD, BLE_ZONES_PER_FRAME, build_ble_zone_frame, ble_zone_frame_count
+
+# The scanner decodes the same layout independently; it imports bleak at the top
+pytest.importorskip("bleak")
+import ble_scan_verify  # noqa: E402
+
+
+def zones(n):
+    return [(zone, 300 + zone, 1000 * zone) for zone in range(1, n + 1)]
+
+
+@pytest.mark.parametrize("count", [1, 2, BLE_ZONES_PER_FRAME, BLE_ZONES_PER_FRAME + 1, 10])
+def test_scanner_reassembles_the_zone_table(count):
+    table = ble_scan_verify.ZoneTable()
+    for frame_index in range(ble_zone_frame_count(count)):
+        data = build_ble_zone_frame(zones(count), frame_index, seq=frame_index)
+        assert len(data) <= BLE_ADV_MAX_PAYLOAD
+        assert len(data) != raspberry.BLE_LEGACY_PAYLOAD_SIZE
+        seq, zone_count, first, records = ble_scan_verify.decode_zone_frame(data)
+        assert (seq, zone_count, first) == (frame_index, count, frame_index * BLE_ZONES_PER_FRAME)
+        table.add(seq, zone_count, first, records)
+    assert table.complete()
+    assert table.table() == zones(count)
+
+
+def test_frame_index_wraps_around():
+    frames = ble_zone_frame_count(5)
+    assert build_ble_zone_frame(zones(5), frames + 1, seq=1) == build_ble_zone_frame(zones(5), 1, seq=1)
+
+
+def test_fields_are_clamped_to_their_width():
+    data = build_ble_zone_frame([(0x1_0002, 0x1_0003, 1 << 30)], 0, seq=0x1FF)
+    seq, zone_count, first, records = ble_scan_verify.decode_zone_frame(data)
+    assert (seq, zone_count, first) == (0xFF, 1, 0)
+    assert records == [(2, 3, 0xFFFFFF)]
+    data = build_ble_zone_frame([(1, 300, -5)], 0, seq=0)
+    assert ble_scan_verify.decode_zone_frame(data)[3] == [(1, 300, 0)]
+
+
+def test_too_many_zones():
+    with pytest.raises(ValueError):
+        build_ble_zone_frame([(0, 0, 0)] * (raspberry.BLE_MAX_ZONES + 1), 0, seq=0)
+
+
+def test_legacy_payload_is_not_a_zone_frame():
+    assert ble_scan_verify.decode_zone_frame(b"\x00" * raspberry.BLE_LEGACY_PAYLOAD_SIZE) is None
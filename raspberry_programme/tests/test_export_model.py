@@ -0,0 +1,37 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from conftest import MODEL_PATH
+
+pytest.importorskip("sklearn")
+
+
+def full_grid(irrigation):
+    return list(itertools.product(
+        irrigation.CROP_TYPES, irrigation.SOIL_TYPES, irrigation.REGIONS,
+        irrigation.TEMPERATURE_BUCKETS, irrigation.WEATHER_CONDITIONS,
+    ))
+
+
+def test_exported_model_matches_sklearn_on_the_full_grid(irrigation, export_model, tmp_path):
+    npz_path = str(tmp_path / "model.npz")
+    export_model.export(irrigation, MODEL_PATH, npz_path)
+
+    rows = full_grid(irrigation)
+    assert len(rows) == 2688
+    features = irrigation.encode_features(rows)
+    expected = np.asarray(irrigation.predict_features(irrigation._load_model_file(MODEL_PATH), features))
+    actual = irrigation.ExportedModel.load(npz_path).predict(features)
+    np.testing.assert_array_equal(actual, expected)
+    assert export_model.verify(irrigation, MODEL_PATH, npz_path)
+
+
+def test_module_predicts_the_same_from_pkl_and_npz(irrigation, export_model, tmp_path):
+    npz_path = str(tmp_path / "model.npz")
+    export_model.export(irrigation, MODEL_PATH, npz_path)
+
+    rows = full_grid(irrigation)
+    np.testing.assert_array_equal(irrigation.predict_water_requirement_batch(npz_path, rows),
+                                  irrigation.predict_water_requirement_batch(MODEL_PATH, rows))
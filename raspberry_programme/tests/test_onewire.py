@@ -0,0 +1,74 @@
+import threading
+import time
+
+import onewire
+
+W1_SLAVE = "72 01 4b 46 7f ff 0e 10 57 : crc=57 YES\n72 01 4b 46 7f ff 0e 10 57 t={}\n"
+READ_SECONDS = 0.2
+
+
+def add_probe(base_dir, probe_id, millidegrees):
+    device = base_dir / probe_id
+    device.mkdir()
+    (device / "w1_slave").write_text(W1_SLAVE.format(millidegrees))
+
+
+def slow_read(monkeypatch):
+    """Make every read take READ_SECONDS (like a real conversion) and track how many overlap."""
+    state = {"active": 0, "peak": 0}
+    lock = threading.Lock()
+    real_read = onewire.read_probe
+
+    def read(device_dir):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep(READ_SECONDS)
+        with lock:
+            state["active"] -= 1
+        return real_read(device_dir)
+
+    monkeypatch.setattr(onewire, "read_probe", read)
+    return state
+
+
+def test_reads_fake_sysfs(tmp_path):
+    add_probe(tmp_path, "28-000000000001", 23125)
+    add_probe(tmp_path, "28-000000000002", 25000)
+    (tmp_path / "28-000000000003").mkdir()
+    (tmp_path / "28-000000000003" / "w1_slave").write_text("00 : crc=00 NO\n00 t=85000\n")
+
+    reader = onewire.ProbeReader(str(tmp_path), zone_map={"28-000000000001": 3})
+    try:
+        reader.discover()
+        readings = reader.read_all()
+    finally:
+        reader.stop()
+
+    assert set(readings) == {"28-000000000001", "28-000000000002"}
+    assert readings["28-000000000001"].temperature_c == 23.125
+    assert reader.temperature(3) == 23.125
+    assert reader.temperature(7) == (23.125 + 25.0) / 2
+
+
+def test_hot_plugged_probes_are_read_in_parallel(tmp_path, monkeypatch):
+    state = slow_read(monkeypatch)
+    add_probe(tmp_path, "28-000000000001", 20000)
+    reader = onewire.ProbeReader(str(tmp_path), max_workers=8)
+    try:
+        reader.discover()
+        reader.read_all()  # The executor is created while only one probe exists
+
+        for i in range(2, 6):
+            add_probe(tmp_path, f"28-00000000000{i}", 20000 + i * 1000)
+        reader.discover()
+        state["peak"] = 0
+        started = time.monotonic()
+        readings = reader.read_all()
+        elapsed = time.monotonic() - started
+    finally:
+        reader.stop()
+
+    assert len(readings) == 5
+    assert state["peak"] == 5
+    assert elapsed < 3 * READ_SECONDS
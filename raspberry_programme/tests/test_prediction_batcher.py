@@ -0,0 +1,83 @@
+import concurrent.futures
+import threading
+import time
+
+import pytest
+
+import raspberry
+from raspberry import PredictionBatcher
+
+
+@pytest.fixture
+def scored(monkeypatch):
+    """Replaces the model call; records each batch and returns row * 10 per row."""
+    batches = []
+    lock = threading.Lock()
+
+    def predict_rows(rows):
+        with lock:
+            batches.append(list(rows))
+        future = concurrent.futures.Future()
+        future.set_result([row * 10 for row in rows])
+        return future
+
+    monkeypatch.setattr(raspberry, "_predict_rows", predict_rows)
+    return batches
+
+
+def test_full_batch_is_scored_without_waiting_for_the_window(scored):
+    batcher = PredictionBatcher(window_ms=10_000, max_batch=4)
+    try:
+        started = time.monotonic()
+        futures = [batcher.submit(i) for i in range(4)]
+        assert [f.result(timeout=2) for f in futures] == [0, 10, 20, 30]
+        assert time.monotonic() - started < 2
+        assert scored == [[0, 1, 2, 3]]
+    finally:
+        batcher.close()
+
+
+def test_partial_batch_is_scored_at_the_deadline(scored):
+    batcher = PredictionBatcher(window_ms=100, max_batch=32)
+    try:
+        started = time.monotonic()
+        futures = [batcher.submit(i) for i in range(3)]
+        assert [f.result(timeout=2) for f in futures] == [0, 10, 20]
+        assert time.monotonic() - started >= 0.09
+        assert scored == [[0, 1, 2]]
+        assert batcher.stats() == {"batches": 1, "rows": 3, "avg_batch": 3.0, "largest_batch": 3}
+    finally:
+        batcher.close()
+
+
+def test_batches_never_exceed_max_batch(scored):
+    batcher = PredictionBatcher(window_ms=50, max_batch=4)
+    try:
+        futures = [batcher.submit(i) for i in range(10)]
+        assert [f.result(timeout=2) for f in futures] == [i * 10 for i in range(10)]
+        assert max(len(batch) for batch in scored) <= 4
+        assert [row for batch in scored for row in batch] == list(range(10))
+    finally:
+        batcher.close()
+
+
+def test_model_error_reaches_every_reader(monkeypatch):
+    def predict_rows(rows):
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(raspberry, "_predict_rows", predict_rows)
+    batcher = PredictionBatcher(window_ms=10, max_batch=2)
+    try:
+        futures = [batcher.submit(i) for i in range(2)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="model unavailable"):
+                future.result(timeout=2)
+    finally:
+        batcher.close()
+
+
+def test_closed_batcher_refuses_rows(scored):
+    batcher = PredictionBatcher(window_ms=10)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(1)
@@ -0,0 +1,51 @@
+import os
+
+import numpy as np
+import pytest
+
+from conftest import MODEL_PATH
+
+pytest.importorskip("sklearn")
+
+ROW = ("TOMATO", "HUMID", "SEMI ARID", "20-30", "SUNNY")
+
+
+@pytest.fixture
+def model_npz(irrigation, export_model, tmp_path):
+    path = str(tmp_path / "model.npz")
+    export_model.export(irrigation, MODEL_PATH, path)
+    return path
+
+
+def replace_with_doubled_model(path, tmp_path):
+    """Swap the model file for one that predicts twice as much."""
+    with np.load(path) as data:
+        arrays = {key: data[key] for key in data.files}
+    arrays["value"] = arrays["value"] * 2
+    new_path = str(tmp_path / "new.npz")
+    np.savez(new_path, **arrays)
+    os.replace(new_path, path)
+
+
+def test_lookups_do_not_stat_the_model_file(irrigation, model_npz, monkeypatch):
+    irrigation.enable_prediction_table(model_npz)
+    stat_calls = []
+    signature = irrigation._file_signature
+    monkeypatch.setattr(irrigation, "_file_signature", lambda path: stat_calls.append(path) or signature(path))
+
+    expected = irrigation.predict_water_requirement(model_npz, *ROW)
+    stat_calls.clear()
+    for _ in range(1000):
+        assert irrigation.lookup_prediction(model_npz, *ROW) == expected
+    assert stat_calls == []
+
+
+def test_changed_model_is_picked_up_on_the_next_check(irrigation, model_npz, monkeypatch, tmp_path):
+    irrigation.enable_prediction_table(model_npz)
+    before = irrigation.lookup_prediction(model_npz, *ROW)
+
+    replace_with_doubled_model(model_npz, tmp_path)
+    assert irrigation.lookup_prediction(model_npz, *ROW) == before    # Not checked yet
+
+    monkeypatch.setattr(irrigation, "PREDICTION_TABLE_CHECK_SECONDS", 0.0)
+    assert irrigation.lookup_prediction(model_npz, *ROW) == pytest.approx(2 * before)
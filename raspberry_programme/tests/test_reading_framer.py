@@ -0,0 +1,51 @@
+import raspberry
+from raspberry import ReadingFramer
+
+
+def test_pipelined_readings_in_one_chunk():
+    framer = ReadingFramer()
+    assert framer.feed(b"350\n420\n99\n") == [350, 420, 99]
+    assert framer.buffered == 0
+
+
+def test_partial_reading_waits_for_its_newline():
+    framer = ReadingFramer()
+    assert framer.feed(b"35") == []
+    assert framer.buffered == 2
+    assert framer.feed(b"0\n4") == [350]
+    assert framer.feed(memoryview(b"20\n")) == [420]
+    assert framer.buffered == 0
+
+
+def test_crlf_blank_lines_and_whitespace_are_ignored():
+    framer = ReadingFramer()
+    assert framer.feed(b" 350\r\n\r\n\n420 \r\n") == [350, 420]
+    assert framer.malformed == 0
+
+
+def test_malformed_line_is_counted_and_skipped():
+    framer = ReadingFramer()
+    assert framer.feed(b"350\nabc\n420\n") == [350, 420]
+    assert framer.malformed == 1
+
+
+def test_line_over_max_bytes_is_dropped():
+    framer = ReadingFramer()
+    limit = ReadingFramer.MAX_LINE_BYTES
+    assert framer.feed(b"1" * limit) == []
+    assert framer.buffered == limit           # Still within the limit
+    assert framer.feed(b"1") == []
+    assert framer.buffered == 0               # One byte over: dropped
+    assert framer.malformed == 1
+    assert framer.feed(b"\n350\n") == [350]
+
+
+def test_complete_lines_before_garbage_are_kept():
+    framer = ReadingFramer()
+    assert framer.feed(b"350\n" + b"x" * (ReadingFramer.MAX_LINE_BYTES + 1)) == [350]
+    assert framer.malformed == 1
+    assert framer.buffered == 0
+
+
+def test_text_replies_are_one_line_per_reading():
+    assert raspberry.format_replies([0, 1500, 42]) == b"0\n1500\n42\n"
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+
+import reading_store
+
+
+def append(store, timestamps):
+    for t in timestamps:
+        store.append(node=1, raw_moisture=500, temperature_c=25.0, predicted_litres=None,
+                     pump_ms=0, source=reading_store.DECISION_FALLBACK, timestamp=t)
+
+
+def scanned(store, start=None, end=None):
+    views = store.scan(start, end)
+    return np.concatenate(views)["timestamp"].tolist() if views else []
+
+
+def test_scan_with_the_clock_stepping_back(tmp_path):
+    store = reading_store.ReadingStore(str(tmp_path), segment_records=4)
+    # Second segment: the clock steps back by 50 s (an NTP correction)
+    timestamps = [100, 110, 120, 130, 140, 150, 100, 105, 160, 170]
+    append(store, timestamps)
+
+    for start, end in [(None, None), (100, 106), (105, 145), (140, None), (None, 101), (200, None)]:
+        expected = [t for t in timestamps if (start is None or t >= start) and (end is None or t < end)]
+        assert scanned(store, start, end) == expected
+    store.close()
+
+
+def test_read_only_store_does_not_write(tmp_path):
+    directory = tmp_path / "readings"
+    reader = reading_store.ReadingStore(str(directory), read_only=True)
+    assert not directory.exists()
+    assert scanned(reader) == []
+
+    writer = reading_store.ReadingStore(str(directory), segment_records=8)
+    append(writer, [100, 110, 120])
+    writer.close()
+    segment = directory / (reading_store.SEGMENT_PATTERN % 0)
+    before = (os.listdir(directory), segment.stat().st_mtime_ns, segment.read_bytes())
+
+    reader = reading_store.ReadingStore(str(directory), segment_records=2, read_only=True)
+    assert scanned(reader, 105) == [110, 120]
+    assert reader.recent(2)["timestamp"].tolist() == [110, 120]
+    reader.close()
+    assert (os.listdir(directory), segment.stat().st_mtime_ns, segment.read_bytes()) == before
+
+
+def test_oldest_segments_beyond_max_segments_are_deleted(tmp_path):
+    store = reading_store.ReadingStore(str(tmp_path), segment_records=4, max_segments=2)
+    append(store, range(100, 112))
+    assert sorted(os.listdir(tmp_path)) == [reading_store.SEGMENT_PATTERN % i for i in (1, 2)]
+    assert scanned(store) == list(range(104, 112))
+    store.close()
@@ -0,0 +1,137 @@
+import math
+import random
+
+import pytest
+
+
+@pytest.fixture
+def farm(irrigation):
+    return irrigation.TunisiaIrrigationSystem("ZAGHOUAN", "TOMATO")
+
+
+# ----------------------------------------------------------------------------
+# SoilMoistureStats / _MonotonicQueue
+# ----------------------------------------------------------------------------
+
+def test_rolling_min_max_mean_match_the_window(irrigation):
+    stats = irrigation.SoilMoistureStats(window_seconds=100.0, capacity=100)
+    rng = random.Random(22)
+    values = []
+    for t in range(500):
+        x = rng.uniform(0, 100)
+        values.append(x)
+        stats.add(x, timestamp=float(t))
+        window = values[-100:]
+        assert stats.count == len(window)
+        assert stats.minimum() == min(window)
+        assert stats.maximum() == max(window)
+        assert stats.mean() == pytest.approx(sum(window) / len(window))
+
+
+def test_old_samples_leave_the_window(irrigation):
+    stats = irrigation.SoilMoistureStats(window_seconds=100.0, capacity=100)
+    stats.add(5.0, timestamp=0.0)
+    stats.add(90.0, timestamp=50.0)
+    stats.add(40.0, timestamp=120.0)    # 5.0 is now older than the window
+    assert stats.count == 2
+    assert stats.minimum() == 40.0
+    assert stats.maximum() == 90.0
+
+
+def test_ewma_uses_the_time_constant(irrigation):
+    stats = irrigation.SoilMoistureStats(ewma_seconds=3600.0)
+    stats.add(40.0, timestamp=0.0)
+    assert stats.ewma == 40.0
+    stats.add(60.0, timestamp=3600.0)
+    assert stats.ewma == pytest.approx(40.0 + (1 - math.exp(-1)) * 20.0)
+    # A sample at the same instant does not move the average
+    stats.add(0.0, timestamp=3600.0)
+    assert stats.ewma == pytest.approx(40.0 + (1 - math.exp(-1)) * 20.0)
+    assert stats.last_value == 0.0
+
+
+def test_slope_and_drying_rate(irrigation):
+    stats = irrigation.SoilMoistureStats()
+    for minute in range(0, 6 * 60 + 1, 10):
+        stats.add(80.0 - 2.0 * minute / 60.0, timestamp=minute * 60.0)
+    assert stats.span_hours() == pytest.approx(6.0)
+    assert stats.slope_per_hour() == pytest.approx(-2.0)
+    assert stats.drying_rate_per_hour(min_span_hours=6.0) == pytest.approx(2.0)
+    assert stats.drying_rate_per_hour(min_span_hours=7.0) is None
+
+
+def test_slope_needs_history(irrigation):
+    stats = irrigation.SoilMoistureStats()
+    assert stats.slope_per_hour() is None
+    stats.add(50.0, timestamp=0.0)
+    stats.add(49.0, timestamp=1800.0)
+    assert stats.slope_per_hour() is None    # Only half an hour
+
+
+def test_memory_is_bounded(irrigation):
+    stats = irrigation.SoilMoistureStats(window_seconds=100.0, capacity=10)
+    for t in range(10_000):
+        stats.add(float(t % 37), timestamp=float(t))
+    assert stats.samples_seen == 10_000
+    assert stats.count == 10
+    assert len(stats._times) == len(stats._values) == 10
+    assert len(stats._min.seqs) == len(stats._max.seqs) == 10
+    assert stats._min.tail - stats._min.head <= 10
+    assert stats._max.tail - stats._max.head <= 10
+
+
+def test_close_samples_only_update_ewma_and_latest(irrigation):
+    stats = irrigation.SoilMoistureStats(window_seconds=100.0, capacity=10)    # One slot per 10s
+    stats.add(50.0, timestamp=0.0)
+    stats.add(10.0, timestamp=5.0)
+    assert stats.count == 1
+    assert stats.minimum() == 50.0
+    assert stats.last_value == 10.0
+    assert stats.samples_seen == 2
+
+
+# ----------------------------------------------------------------------------
+# Soil type fed to the model
+# ----------------------------------------------------------------------------
+
+@pytest.mark.parametrize("moisture, expected", [
+    (0, "DRY"), (29.9, "DRY"),
+    (30, "HUMID"), (64.9, "HUMID"),
+    (65, "WET"), (100, "WET"),
+])
+def test_without_history_soil_type_follows_current_moisture(farm, moisture, expected):
+    assert farm.classify_soil_type_measured(moisture) == expected
+
+
+@pytest.mark.parametrize("moisture, expected", [
+    (70.1, "WET"), (100, "WET"),
+    (19.9, "DRY"), (0, "DRY"),
+])
+def test_saturation_and_dryness_override_the_measured_type(farm, moisture, expected):
+    assert farm.classify_soil_type_measured(moisture, drying_rate=1.0) == expected
+
+
+@pytest.mark.parametrize("drying_rate, expected", [
+    (2.0, "DRY"),       # 48% a day: sandy
+    (1.25, "HUMID"),    # 30% a day: loamy
+    (0.5, "WET"),       # 12% a day: clay
+])
+def test_measured_type_comes_from_the_drying_rate(farm, drying_rate, expected):
+    assert farm.classify_soil_type_measured(50, drying_rate=drying_rate) == expected
+
+
+def test_zone_statistics_decide_the_soil_type(farm):
+    # Six hours of fast drying in zone 3, nothing in zone 4
+    for minute in range(0, 6 * 60 + 1, 10):
+        farm.record_moisture(60.0 - 2.0 * minute / 60.0, timestamp=minute * 60.0, zone=3)
+    assert farm.classify_soil_type_measured(50, zone=3) == "DRY"
+    assert farm.classify_soil_type_measured(50, zone=4) == "HUMID"
+
+
+def test_model_input_uses_measured_soil_type(farm, standin):
+    model_input, context = farm.generate_model_input(25, 50, zone=1, drying_rate=0.5)
+    assert model_input["SOIL_TYPE"] == "WET"
+    assert context["exact_moisture"] == 50
+    assert context["zone"] == 1
+    model_input, _ = farm.generate_model_input(25, 50, zone=1)
+    assert model_input["SOIL_TYPE"] == "HUMID"
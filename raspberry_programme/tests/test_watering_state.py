@@ -0,0 +1,32 @@
+def test_each_zone_keeps_its_own_state(irrigation, tmp_path):
+    db_path = str(tmp_path / "state.db")
+    irrigation.enable_state_store(db_path)
+    zone_1 = irrigation.get_farm("ZAGHOUAN", "TOMATO", 1)
+    zone_2 = irrigation.get_farm("ZAGHOUAN", "TOMATO", 2)
+    assert zone_1 is not zone_2
+    assert irrigation.get_farm("zaghouan", "tomato", 1) is zone_1
+
+    zone_1.record_watering(4.5)
+    irrigation.get_state_store().flush()
+    assert zone_2.daily_water_total == 0
+
+    store = irrigation.WateringStateStore(db_path)
+    try:
+        assert store.load("ZAGHOUAN/TOMATO/1")["daily_water_total"] == 4.5
+        assert store.load("ZAGHOUAN/TOMATO/1")["last_reset_date"] == zone_1.now().date()
+        assert store.load("ZAGHOUAN/TOMATO/2") is None
+    finally:
+        store.close()
+
+
+def test_zone_state_is_restored(irrigation, tmp_path):
+    db_path = str(tmp_path / "state.db")
+    store = irrigation.WateringStateStore(db_path)
+    farm = irrigation.TunisiaIrrigationSystem("ZAGHOUAN", "TOMATO")
+    farm.attach_state_store(store, irrigation.zone_id_for("ZAGHOUAN", "TOMATO", 7))
+    farm.record_watering(3.0)
+    store.close()
+
+    irrigation.enable_state_store(db_path)
+    assert irrigation.get_farm("ZAGHOUAN", "TOMATO", 7).daily_water_total == 3.0
+    assert irrigation.get_farm("ZAGHOUAN", "TOMATO").daily_water_total == 0
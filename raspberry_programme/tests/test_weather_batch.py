@@ -0,0 +1,28 @@
+GOVERNORATES = ["TUNIS", "SFAX", "SOUSSE"]
+
+
+def test_one_request_for_every_governorate(irrigation, standin):
+    for governorate in GOVERNORATES:
+        irrigation.get_farm(governorate, "TOMATO")
+    irrigation.get_farm("SFAX", "POTATO")
+
+    results = irrigation.fetch_weather_batch(GOVERNORATES)
+
+    assert standin.request_count == 1
+    assert standin.locations_requested == 3
+    assert set(results) == set(GOVERNORATES)
+    assert all(weather is not None and "forecast_age_seconds" not in weather for weather in results.values())
+    # The second crop in SFAX shares the forecast of the first
+    assert irrigation.get_farm("SFAX", "POTATO").forecast is irrigation.get_farm("SFAX", "TOMATO").forecast
+
+
+def test_repeated_batches_reuse_the_connection(irrigation, standin):
+    for governorate in GOVERNORATES:
+        irrigation.get_farm(governorate, "TOMATO")
+
+    for _ in range(3):
+        irrigation.fetch_weather_batch(GOVERNORATES)
+
+    assert standin.request_count == 3
+    assert standin.locations_requested == 9
+    assert standin.connection_count == 1
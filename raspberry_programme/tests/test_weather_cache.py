@@ -0,0 +1,66 @@
+import time
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def start_cache(irrigation, ttl_seconds):
+    cache = irrigation.enable_weather_cache(ttl_seconds=ttl_seconds)
+    cache.retry_seconds = 0.1
+    farm = irrigation.get_farm("SFAX", "TOMATO")
+    assert farm.get_weather_snapshot() == (None, None)  # Registers; the first fetch runs in the background
+    assert wait_for(lambda: cache.get("SFAX")[0] is not None)
+    return cache, farm
+
+
+def test_background_refresh(irrigation, standin):
+    cache, farm = start_cache(irrigation, ttl_seconds=0.3)
+    weather, age = farm.get_weather_snapshot()
+    assert weather["temperature_api"] == 24.0
+    assert age < 0.3
+
+    standin.weather["temperature_2m"] = 31.0
+    assert wait_for(lambda: cache.get("SFAX")[0]["temperature_api"] == 31.0)
+    assert standin.request_count >= 2
+
+
+def test_age_grows_between_refreshes(irrigation, standin):
+    cache, farm = start_cache(irrigation, ttl_seconds=60)
+    first_age = cache.age("SFAX")
+    time.sleep(0.3)
+    weather, age = farm.get_weather_snapshot()
+    assert age >= first_age + 0.3
+    assert standin.request_count == 1  # Nothing refreshed before the TTL
+
+
+def test_failed_refresh_keeps_the_last_snapshot(irrigation, standin):
+    cache, farm = start_cache(irrigation, ttl_seconds=0.2)
+    fetched_at = time.time()
+    standin.fail = True
+    requests_before = standin.request_count
+    assert wait_for(lambda: standin.request_count >= requests_before + 2)  # Refreshes kept failing
+
+    weather, age = farm.get_weather_snapshot()
+    assert weather is not None
+    assert weather["temperature_api"] == 24.0
+    assert age >= time.time() - fetched_at - 0.1  # The real age, not a fresh one
+
+
+def test_failed_fetch_without_a_forecast_keeps_the_snapshot(irrigation):
+    answers = [{"temperature_api": 20.0}, None, None]
+    cache = irrigation.WeatherCache(ttl_seconds=0.05, retry_seconds=0.05)
+    cache.register("TUNIS", lambda: answers.pop(0) if answers else None)
+    cache.start()
+    try:
+        assert wait_for(lambda: not answers)
+        weather, age = cache.get("TUNIS")
+        assert weather == {"temperature_api": 20.0}
+        assert age > 0.05
+    finally:
+        cache.stop()
@@ -11,6 +11,10 @@ unsigned long lastPingMs = 0;
 #define hum2 A4 
 #define hum3 A3 
 #define pump 2
+// 1 = send compact binary frames (node ID, sequence, raw probes), 0 = text
+#define USE_BINARY_PROTOCOL 0
+const uint16_t NODE_ID = 1;      // Unique per zone when using the binary protocol
+uint16_t seqNo = 0;
 unsigned long myTime;
 void ensureWiFiConnected() {
   if (WiFi.status() == WL_CONNECTED) return;
@@ -34,6 +38,33 @@ void ensureWiFiConnected() {
     Serial.println(F("Failed to connect to WiFi."));
   }
 }
+// Binary frame v1, little-endian (see raspberry.py):
+// 0xA5 | version | flags | node_id u16 | seq u16 | A5 u16 | A4 u16 | A3 u16 | millis u32
+void putU16(uint8_t* p, uint16_t v) { p[0] = v & 0xFF; p[1] = v >> 8; }
+void putU32(uint8_t* p, uint32_t v) { putU16(p, v & 0xFFFF); putU16(p + 2, v >> 16); }
+void sendBinaryReading(int a, int b, int c) {
+  uint8_t frame[17];
+  frame[0] = 0xA5;  // magic
+  frame[1] = 1;     // version
+  frame[2] = 0x01;  // flags: node timestamp present
+  putU16(frame + 3, NODE_ID);
+  putU16(frame + 5, seqNo++);
+  putU16(frame + 7, a);
+  putU16(frame + 9, b);
+  putU16(frame + 11, c);
+  putU32(frame + 13, millis());
+  client.write(frame, sizeof(frame));
+}
+// Reply: 0xA5 | version | node_id u16 | seq u16 | pump_time_ms u32
+bool readBinaryReply(long* duration) {
+  if (client.available() < 10) return false;
+  uint8_t reply[10];
+  client.read(reply, sizeof(reply));
+  if (reply[0] != 0xA5) return false;
+  *duration = (long)((uint32_t)reply[6] | ((uint32_t)reply[7] << 8) |
+                     ((uint32_t)reply[8] << 16) | ((uint32_t)reply[9] << 24));
+  return true;
+}
 void setup() {
   pinMode(hum1,INPUT);
   pinMode(hum2,INPUT);
@@ -66,19 +97,27 @@ void loop() {
     myTime = micros();
     // Replace your block:
     if (client.connected() || client.connect(SERVER_IP, SERVER_PORT)) {
+#if USE_BINARY_PROTOCOL
+      sendBinaryReading(analogRead(hum1), analogRead(hum2), analogRead(hum3));
+#else
       moyen = (analogRead(hum1) + analogRead(hum2) + analogRead(hum3)) / 3;
     //client.print("GET /submit?v=");
-      client.print(moyen);
+      client.println(moyen); // newline-terminated so the Pi can frame readings
+#endif
     }
     while(myTime-micros()<5000){
        // Use a String to read the full number
       if (client.connected()) {
   // Read the response from the server until a newline is found
+#if USE_BINARY_PROTOCOL
+        if (readBinaryReply(&pump_duration)) h=true;
+#else
         if (client.available()){
           h=true;
           response = client.readStringUntil('\n');
           pump_duration = response.toInt(); // Convert the string to an integer
         }
+#endif
         
       }
     }